@@ -0,0 +1,241 @@
+"""
+End-to-end benchmark of the Niku turn pipeline against local stand-ins for
+Groq, Cohere, OpenWeatherMap and Edge TTS (see benchmarks/fakes.py).
+
+Scripted multi-turn conversations run through the real NikuSession turn logic
+(the same code main.py drives), the real DecisionEngine, tool registry and
+speech pipeline; only the network services are replaced. Reports per-stage and
+end-to-end p50/p95/p99 and throughput, and can save the results as JSON and
+compare them against a saved baseline.
+
+Run from the repository root:
+    python -m benchmarks.bench_e2e --conversations 40 --concurrency 8 --output logs/bench_e2e.json
+    python -m benchmarks.bench_e2e --baseline logs/bench_e2e.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks.fakes import FakeCohere, FakeWeatherServer, ServiceProfile, install_fake_groq, make_fake_tts
+from niku.decision_engine import DecisionEngine
+from niku.session import NikuServices, NikuSession
+from niku.session_store import SessionStore
+from niku.tracing import Tracer
+from niku.tts_worker import TTSWorker, SpeechJob
+
+CONVERSATIONS = [
+    ["Hello there!", "What can you do for me?", "Tell me a joke about cats", "What's the weather in Paris?", "Thanks, goodbye"],
+    ["Who are you?", "How's the weather in London and Tokyo?", "Tell me something interesting about space", "Why is that?"],
+    ["What's the weather like in Springfield?", "And what about Berlin?", "Can you tell me a funny joke?", "Explain how rainbows form"],
+    ["Good morning", "Summarize the plot of Hamlet in two sentences", "What time is it?", "Is it going to rain in Seattle?"],
+]
+
+class RecordingTracer(Tracer):
+    """A Tracer that also keeps every raw sample, for exact percentiles."""
+    def __init__(self):
+        super().__init__(enabled=True)
+        self.samples: dict[str, list[float]] = {}
+
+    def record(self, name: str, seconds: float, trace=None, error=None, started=None):
+        self.samples.setdefault(name, []).append(seconds)
+        super().record(name, seconds, trace, error=error, started=started)
+
+
+class NullAudioOutput:
+    """Discards synthesized audio; has the AudioOutput interface."""
+    def __init__(self):
+        self.bytes = 0
+
+    async def write(self, audio: bytes | memoryview):
+        self.bytes += len(audio)
+
+    async def close(self, abort: bool = False):
+        pass
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))]
+
+def summarize(values: list[float]) -> dict:
+    values_ms = [value * 1000 for value in values]
+    return {
+        "count": len(values_ms),
+        "mean": statistics.fmean(values_ms),
+        "p50": percentile(values_ms, 0.50),
+        "p95": percentile(values_ms, 0.95),
+        "p99": percentile(values_ms, 0.99),
+        "max": max(values_ms),
+    }
+
+async def run_conversation(index: int, services: NikuServices, store: SessionStore, samples: dict, counters: dict):
+    session_id = f"conversation-{index}"
+    session = NikuSession(store.session(session_id), services, session_id)
+    tts_worker = TTSWorker(services.synthesize, tracer=services.tracer) if services.synthesize else None
+    for user_input in CONVERSATIONS[index % len(CONVERSATIONS)]:
+        started = time.perf_counter()
+        first_token = None
+        speech_job = None
+        try:
+            async for event in session.respond(user_input):
+                if event.kind == "token":
+                    if first_token is None:
+                        first_token = time.perf_counter() - started
+                    if tts_worker is not None:
+                        if speech_job is None:
+                            speech_job = SpeechJob(NullAudioOutput(), trace=session.trace)
+                            await tts_worker.submit(speech_job)
+                        speech_job.feed(event.text)
+                elif event.kind == "error":
+                    counters["errors"] += 1
+        finally:
+            if speech_job is not None:
+                speech_job.finish()
+        samples["e2e_turn"].append(time.perf_counter() - started)
+        if first_token is not None:
+            samples["e2e_first_token"].append(first_token)
+        counters["turns"] += 1
+    if tts_worker is not None:
+        await tts_worker.drain(timeout=60)
+
+async def run(args) -> dict:
+    profiles = {
+        "groq": ServiceProfile(args.groq_latency, args.jitter, args.groq_errors, seed=args.seed),
+        "cohere": ServiceProfile(args.cohere_latency, args.jitter, args.cohere_errors, seed=args.seed + 1),
+        "weather": ServiceProfile(args.weather_latency, args.jitter, args.weather_errors, seed=args.seed + 2),
+        "tts": ServiceProfile(args.tts_latency, args.jitter, args.tts_errors, seed=args.seed + 3),
+    }
+    install_fake_groq(profiles["groq"], tokens_per_sec=args.groq_tokens_per_sec, stream_error_rate=args.groq_stream_errors)
+    os.environ.setdefault("COHERE_API_KEY", "fake-key")
+    decision_engine = DecisionEngine()
+    decision_engine.co = FakeCohere(profiles["cohere"])
+    weather_server = FakeWeatherServer(profiles["weather"]).start()
+
+    tracer = RecordingTracer()
+    services = NikuServices(
+        decision_engine,
+        speculate=not args.no_speculation,
+        synthesize=make_fake_tts(profiles["tts"]) if not args.no_tts else None,
+        tracer=tracer,
+    )
+    samples = {"e2e_turn": [], "e2e_first_token": []}
+    counters = {"turns": 0, "errors": 0}
+    slots = asyncio.Semaphore(args.concurrency)
+
+    async def limited(index: int):
+        async with slots:
+            await run_conversation(index, services, store, samples, counters)
+
+    with tempfile.TemporaryDirectory() as store_dir:
+        store = SessionStore(store_dir=store_dir)
+        started = time.perf_counter()
+        await asyncio.gather(*(limited(i) for i in range(args.conversations)))
+        elapsed = time.perf_counter() - started
+        store.close()
+    weather_server.stop()
+
+    samples.update(tracer.samples)
+    return {
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "summary": {
+            "conversations": args.conversations,
+            "turns": counters["turns"],
+            "errors": counters["errors"],
+            "elapsed_s": elapsed,
+            "throughput_turns_per_sec": counters["turns"] / elapsed,
+        },
+        "latency_ms": {name: summarize(values) for name, values in sorted(samples.items()) if values},
+        "services": {name: profile.to_dict() for name, profile in profiles.items()},
+        "speculation": repr(services.speculation_stats),
+        "routing": services.router.stats(),
+        "decision_engine": decision_engine.get_stats(),
+    }
+
+def print_results(results: dict):
+    summary = results["summary"]
+    print(f"{summary['conversations']} conversations, {summary['turns']} turns, {summary['errors']} errors "
+          f"in {summary['elapsed_s']:.2f} s -> {summary['throughput_turns_per_sec']:.1f} turns/sec")
+    print(f"{'stage':<18}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, stats in results["latency_ms"].items():
+        print(f"{name:<18}{stats['count']:>6}{stats['p50']:>10.1f}{stats['p95']:>10.1f}{stats['p99']:>10.1f}{stats['max']:>10.1f}")
+    print("Service calls: " + ", ".join(f"{name} {stats['calls']} ({stats['errors']} failed)"
+                                         for name, stats in results["services"].items()))
+    print(f"Speculation: {results['speculation']}")
+    print("Routing: " + ", ".join(f"{kind} {stats['decisions']}" for kind, stats in results["routing"].items()))
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    Compares percentiles and throughput with a baseline run.
+
+    Returns:
+        Descriptions of the metrics that regressed by more than `tolerance`.
+    """
+    regressions = []
+    print(f"\nComparison with baseline (tolerance {tolerance:.0%}):")
+    for name, stats in results["latency_ms"].items():
+        old = baseline.get("latency_ms", {}).get(name)
+        if old is None:
+            continue
+        changes = []
+        for key in ("p50", "p95", "p99"):
+            delta = stats[key] - old[key]
+            ratio = delta / old[key] if old[key] else 0.0
+            changes.append(f"{key} {old[key]:.1f}->{stats[key]:.1f} ({ratio:+.0%})")
+            if ratio > tolerance and delta > 1.0: # Ignore sub-millisecond noise
+                regressions.append(f"{name} {key} {ratio:+.0%}")
+        print(f"  {name:<18}" + "  ".join(changes))
+    old_throughput = baseline.get("summary", {}).get("throughput_turns_per_sec")
+    if old_throughput:
+        throughput = results["summary"]["throughput_turns_per_sec"]
+        ratio = (throughput - old_throughput) / old_throughput
+        print(f"  {'throughput':<18}{old_throughput:.1f}->{throughput:.1f} turns/sec ({ratio:+.0%})")
+        if ratio < -tolerance:
+            regressions.append(f"throughput {ratio:+.0%}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--conversations", type=int, default=24)
+    parser.add_argument("--concurrency", type=int, default=8, help="Conversations running at the same time")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--jitter", type=float, default=0.3, help="Log-normal sigma applied to every service latency")
+    parser.add_argument("--groq-latency", type=float, default=0.25, help="Seconds to the first token")
+    parser.add_argument("--groq-tokens-per-sec", type=float, default=300.0)
+    parser.add_argument("--groq-errors", type=float, default=0.0, help="Fraction of requests failing up front")
+    parser.add_argument("--groq-stream-errors", type=float, default=0.0, help="Fraction of streams failing midway")
+    parser.add_argument("--cohere-latency", type=float, default=0.15)
+    parser.add_argument("--cohere-errors", type=float, default=0.0)
+    parser.add_argument("--weather-latency", type=float, default=0.12)
+    parser.add_argument("--weather-errors", type=float, default=0.0)
+    parser.add_argument("--tts-latency", type=float, default=0.2, help="Seconds per synthesized sentence")
+    parser.add_argument("--tts-errors", type=float, default=0.0)
+    parser.add_argument("--no-speculation", action="store_true")
+    parser.add_argument("--no-tts", action="store_true")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare against results saved earlier with --output")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed relative regression before failing")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print_results(results)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("Regressions: " + ", ".join(regressions))
+            sys.exit(1)
+        print("No regressions.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Hit-rate and latency benchmark for local location extraction.
+
+Runs a corpus of weather queries through the bundled gazetteer and reports how
+many are resolved locally (and correctly) versus falling back to the LLM, plus
+build time and per-query latency. No network calls.
+
+Run from the repository root:
+    python -m benchmarks.bench_gazetteer
+"""
+import argparse
+import statistics
+import time
+
+from niku.gazetteer import DEFAULT_CITY_FILE, Gazetteer
+
+# (query, expected canonical location or None when the LLM fallback is expected)
+QUERY_CORPUS = [
+    ("What's the weather in London?", "London, GB"),
+    ("weather paris", "Paris, FR"),
+    ("Is it raining in New York City right now?", "New York, US"),
+    ("how hot is it in nyc", "New York, US"),
+    ("Will it snow in Moscow tomorrow?", "Moscow, RU"),
+    ("What's the temperature in San Francisco", "San Francisco, US"),
+    ("forecast for rio de janeiro", "Rio de Janeiro, BR"),
+    ("Do I need an umbrella in Seattle?", "Seattle, US"),
+    ("weather in Bombay", "Mumbai, IN"),
+    ("how cold is it in münchen today", "Munich, DE"),
+    ("Tell me the weather in Ho Chi Minh City", "Ho Chi Minh City, VN"),
+    ("what's it like outside in Buenos Aires", "Buenos Aires, AR"),
+    ("Temperature in Tokyo please", "Tokyo, JP"),
+    ("is it sunny in cape town", "Cape Town, ZA"),
+    ("weather in Washington DC", "Washington, US"),
+    ("How humid is Singapore right now?", "Singapore, SG"),
+    ("weather in Springfield, Illinois", None),
+    ("What's the weather like in my hometown?", None),
+    ("What is the weather like today?", None),
+    ("weather in Ulaanbaatar", None),
+]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=1000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    gazetteer = Gazetteer.from_file(DEFAULT_CITY_FILE)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    hits = correct = expected_hits = 0
+    for query, expected in QUERY_CORPUS:
+        location = gazetteer.extract(query)
+        hits += location is not None
+        expected_hits += expected is not None
+        correct += location == expected
+        if location != expected:
+            print(f"  mismatch: {query!r} -> {location!r} (expected {expected!r})")
+
+    timings = []
+    for _ in range(args.repeat):
+        for query, _ in QUERY_CORPUS:
+            start = time.perf_counter()
+            gazetteer.extract(query)
+            timings.append((time.perf_counter() - start) * 1e6)
+    timings.sort()
+
+    print(f"Build time: {build_ms:.1f} ms")
+    print(f"Resolved locally: {hits}/{len(QUERY_CORPUS)} queries "
+          f"({expected_hits} mention a bundled city); correct answers {correct}/{len(QUERY_CORPUS)}")
+    print(f"LLM fallbacks: {len(QUERY_CORPUS) - hits}")
+    print(f"Latency p50 {statistics.median(timings):.1f} us, p99 {timings[int(len(timings) * 0.99)]:.1f} us")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Accuracy and latency benchmark for the local intent classifier.
+
+Measures held-out (leave-one-out) accuracy on the DecisionEngine example sets,
+accuracy on a small labelled query corpus, and per-prediction latency. For both
+it reports what happens at the configured confidence threshold: how many inputs
+are answered locally rather than by Cohere, and the wrong-answer rate, i.e. the
+share of all inputs given a confident wrong label. That rate is what a user
+sees; it should stay near zero. No network calls.
+
+Run from the repository root:
+    python -m benchmarks.bench_intent_classifier
+"""
+import argparse
+import statistics
+import time
+
+from niku.decision_engine import DEFAULT_CONFIDENCE_THRESHOLD, DEFAULT_EXAMPLES
+from niku.intent_classifier import LocalIntentClassifier
+
+# The custom example set from niku/decision_engine.py's example usage.
+CUSTOM_EXAMPLES = [
+    {"text": "I'd like to hear a funny story.", "label": "tell_joke"},
+    {"text": "What's the forecast for tomorrow?", "label": "get_weather"},
+    {"text": "Just wanted to talk.", "label": "general_chat"},
+    {"text": "What is your name?", "label": "identity_query"},
+    {"text": "Can you help me with my homework?", "label": "assistance_request"},
+]
+
+QUERIES = [
+    ("Tell me something funny.", "tell_joke"),
+    ("What's the current temperature in London?", "get_weather"),
+    ("Hello, how are you doing?", "general_chat"),
+    ("Who built you?", "identity_query"),
+    ("Is it going to snow in Berlin?", "get_weather"),
+    ("weather in tokyo", "get_weather"),
+    ("do you know a joke about cats", "tell_joke"),
+    ("what time is it in new york", "get_time"),
+    ("current time please", "get_time"),
+    ("what's your name", "identity_query"),
+    ("Are you human?", "identity_query"),
+    ("I feel a bit lonely today", "general_chat"),
+    ("Let's talk about books", "general_chat"),
+    ("say something that will make me laugh", "tell_joke"),
+    ("How windy is it in Chicago right now?", "get_weather"),
+    # Near misses that share words with other intents
+    ("What is 2+2?", "general_chat"),
+    ("What's up?", "general_chat"),
+    ("What time does the store close?", "general_chat"),
+    ("Can you help me write an email?", "general_chat"),
+]
+
+def score(predictions: list[tuple[str, float, str]], threshold: float) -> dict:
+    """Scores (label, confidence, expected) triples, overall and at the confidence threshold."""
+    local = [(label, expected) for label, confidence, expected in predictions if confidence >= threshold]
+    wrong = sum(label != expected for label, expected in local)
+    return {
+        "count": len(predictions),
+        "accuracy": sum(label == expected for label, _, expected in predictions) / len(predictions),
+        "local": len(local),
+        "wrong": wrong,
+        "wrong_rate": wrong / len(predictions),
+    }
+
+def leave_one_out(examples: list[dict], threshold: float) -> dict | None:
+    """Predicts every example with a classifier built from the others."""
+    predictions = []
+    for i, example in enumerate(examples):
+        rest = examples[:i] + examples[i + 1:]
+        if not any(other["label"] == example["label"] for other in rest):
+            continue # Can't predict a label that has no remaining example
+        label, confidence = LocalIntentClassifier(rest).predict(example["text"])
+        predictions.append((label, confidence, example["label"]))
+    return score(predictions, threshold) if predictions else None
+
+def describe(result: dict, threshold: float) -> str:
+    return (f"accuracy {result['accuracy']:.0%} ({result['count']} inputs); at threshold {threshold}: "
+            f"{result['local']} answered locally, {result['count'] - result['local']} sent to Cohere, "
+            f"{result['wrong']} confidently wrong (wrong-answer rate {result['wrong_rate']:.0%})")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_CONFIDENCE_THRESHOLD)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    classifier = LocalIntentClassifier(DEFAULT_EXAMPLES)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    for name, examples in (("default", DEFAULT_EXAMPLES), ("custom", CUSTOM_EXAMPLES)):
+        result = leave_one_out(examples, args.threshold)
+        shown = describe(result, args.threshold) if result else "n/a (one example per label)"
+        print(f"Held-out ({name} examples, leave-one-out): {shown}")
+
+    predictions = [(*classifier.predict(text), expected) for text, expected in QUERIES]
+    print(f"Query corpus: {describe(score(predictions, args.threshold), args.threshold)}")
+
+    timings = []
+    for _ in range(args.repeat):
+        for text, _ in QUERIES:
+            start = time.perf_counter()
+            classifier.predict(text)
+            timings.append((time.perf_counter() - start) * 1e6)
+    timings.sort()
+    print(f"Build time: {build_ms:.1f} ms; predict latency p50 {statistics.median(timings):.0f} us, "
+          f"p99 {timings[int(len(timings) * 0.99)]:.0f} us")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Tail-latency benchmark of the Groq call path's timeouts, hedging and retries.
+
+Streams completions through the real Groq SDK and niku.groq_client from a
+local OpenAI-compatible server (benchmarks/fakes.py FakeGroqServer) whose
+latency has a slow tail and whose requests fail at a configurable rate. The
+same request sequence runs once with a plain policy (one attempt, no hedge,
+fixed timeout) and once with the adaptive policy niku uses, and time to first
+token p50/p95/p99 and the error count of each are reported.
+
+Before that it checks that a half-open circuit breaker whose trial call is
+cancelled lets the next call through instead of staying stuck.
+
+Run from the repository root:
+    python -m benchmarks.bench_resilience --requests 400 --slow-fraction 0.03 --errors 0.02
+    python -m benchmarks.bench_resilience --output logs/bench_resilience.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import niku.groq_client as groq_client
+from benchmarks.bench_e2e import summarize
+from benchmarks.fakes import FakeGroqServer, ServiceProfile
+from niku.groq_client import CompletionStats, stream_groq_completion
+from niku.resilience import CircuitBreaker, CircuitOpenError, ResiliencePolicy
+
+PROMPT = "Tell me something interesting about space"
+
+def make_policies(args) -> dict[str, ResiliencePolicy]:
+    return {
+        "plain": ResiliencePolicy("plain", initial_timeout=args.timeout, hedge=False, max_attempts=1,
+                                  min_samples=args.requests + args.warmup + 1), # Never adapts
+        "resilient": ResiliencePolicy("resilient", initial_timeout=args.timeout),
+    }
+
+async def check_cancelled_trial() -> bool:
+    """Returns whether the breaker recovers after its half-open trial is cancelled."""
+    policy = ResiliencePolicy("trial", hedge=False, max_attempts=1,
+                              breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0.05))
+
+    async def fail(request: int):
+        raise ConnectionError("down")
+
+    try:
+        await policy.call(fail)
+    except ConnectionError:
+        pass
+    await asyncio.sleep(0.06) # Past reset_timeout: the next call is the half-open trial
+    trial = asyncio.create_task(policy.call(lambda request: asyncio.sleep(10)))
+    await asyncio.sleep(0.01)
+    trial.cancel()
+    try:
+        await trial
+    except asyncio.CancelledError:
+        pass
+    try:
+        await policy.call(lambda request: asyncio.sleep(0, result="ok"))
+        return True
+    except CircuitOpenError:
+        return False
+    finally:
+        policy.close()
+
+async def run_policy(policy: ResiliencePolicy, args) -> dict:
+    profile = ServiceProfile(args.latency, args.jitter, args.errors, seed=args.seed,
+                             slow_fraction=args.slow_fraction, slow_latency=args.slow_latency)
+    server = FakeGroqServer(profile, tokens_per_sec=args.tokens_per_sec).start()
+    from groq import AsyncGroq
+    groq_client._async_client = AsyncGroq(api_key="fake-key", base_url=server.base_url, max_retries=0)
+    samples = {"first_token": [], "completion": []}
+    errors = 0
+    slots = asyncio.Semaphore(args.concurrency)
+
+    async def one(index: int):
+        nonlocal errors
+        async with slots:
+            stats = CompletionStats(groq_client.DEFAULT_MODEL)
+            async for _ in stream_groq_completion(PROMPT, stats=stats, policy=policy, hedge_model=args.hedge_model):
+                pass
+            if index < args.warmup:
+                return
+            if stats.error:
+                errors += 1
+            else:
+                samples["first_token"].append(stats.time_to_first_token)
+                samples["completion"].append(stats.total_time)
+
+    try:
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(args.warmup + args.requests)))
+        elapsed = time.perf_counter() - started
+    finally:
+        await groq_client.close_clients()
+        server.stop()
+    return {
+        "errors": errors,
+        "elapsed_s": elapsed,
+        "server_requests": profile.calls,
+        "latency_ms": {name: summarize(values) for name, values in samples.items() if values},
+        "policy": policy.to_dict(),
+    }
+
+async def run(args) -> dict:
+    results = {"config": {key: value for key, value in vars(args).items() if key != "output"}, "policies": {},
+               "cancelled_trial_recovers": await check_cancelled_trial()}
+    for name, policy in make_policies(args).items():
+        results["policies"][name] = await run_policy(policy, args)
+    return results
+
+def print_results(results: dict):
+    requests = results["config"]["requests"]
+    print(f"{'policy':<12}{'errors':>8}{'requests':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+          f"{'hedges':>8}{'retries':>9}")
+    for name, result in results["policies"].items():
+        ttft = result["latency_ms"].get("first_token")
+        percentiles = "".join(f"{ttft[key]:>10.1f}" for key in ("p50", "p95", "p99", "max")) if ttft else f"{'n/a':>40}"
+        policy = result["policy"]
+        print(f"{name:<12}{result['errors']:>8}{result['server_requests']:>10}{percentiles}"
+              f"{policy['hedges']:>8}{policy['retries']:>9}")
+    print(f"(time to first token over {requests} requests; 'requests' counts server requests including warm-up)")
+    print(f"Cancelled half-open trial: {'recovers' if results['cancelled_trial_recovers'] else 'BREAKER STUCK OPEN'}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--warmup", type=int, default=40, help="Requests run first to fill the latency window, not reported")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.08, help="Median seconds to the first chunk")
+    parser.add_argument("--jitter", type=float, default=0.3, help="Log-normal sigma of the latency")
+    parser.add_argument("--slow-fraction", type=float, default=0.03, help="Fraction of requests that stall")
+    parser.add_argument("--slow-latency", type=float, default=1.5, help="Seconds a stalled request takes")
+    parser.add_argument("--errors", type=float, default=0.02, help="Fraction of requests answered with 503")
+    parser.add_argument("--tokens-per-sec", type=float, default=500.0)
+    parser.add_argument("--timeout", type=float, default=10.0, help="Initial (and, for the plain policy, fixed) timeout")
+    parser.add_argument("--hedge-model", help="Model for hedged requests (the same model by default)")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print_results(results)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    if not results["cancelled_trial_recovers"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
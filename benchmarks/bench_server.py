@@ -0,0 +1,165 @@
+"""
+Load test for the multi-session server (niku.server) against local stub backends.
+
+Starts a NikuServer in-process with a fake intent classifier, a fake streaming
+LLM and (optionally) fake TTS, then drives it with many concurrent WebSocket or
+HTTP clients and reports turns/sec and turn latency percentiles.
+
+Run from the repository root:
+    python -m benchmarks.bench_server --sessions 200 --turns 5
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import tempfile
+import time
+
+import aiohttp
+from aiohttp import web
+
+from niku.decision_engine import IntentPrediction
+from niku.server import NikuServer
+from niku.session import NikuServices
+from niku.session_store import SessionStore
+from niku.tracing import Tracer
+
+REPLY = "Sure. Here is a short answer to your question, streamed a few words at a time. Anything else?"
+
+class StubDecisionEngine:
+    """Classifies everything as general chat after a fixed delay (runs in a worker thread)."""
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def classify_intent_detailed(self, text: str) -> IntentPrediction:
+        time.sleep(self.latency)
+        return IntentPrediction("general_chat", 0.9, "stub")
+
+def make_stub_llm(first_token_latency: float, tokens_per_sec: float):
+    async def stream_completion(prompt, model=None, stats=None, **sampling_params):
+        await asyncio.sleep(first_token_latency)
+        for word in REPLY.split(" "):
+            if stats is not None:
+                stats._on_token()
+            yield word + " "
+            await asyncio.sleep(1 / tokens_per_sec)
+        if stats is not None:
+            stats._finish()
+
+    async def complete(prompt, model=None, stats=None, cache=None, cache_ttl=None, **sampling_params):
+        return "".join([token async for token in stream_completion(prompt, model, stats)])
+    return stream_completion, complete
+
+def make_stub_tts(latency: float):
+    async def synthesize(sentence: str) -> bytes:
+        await asyncio.sleep(latency)
+        return b"\x00" * len(sentence)
+    return synthesize
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+async def websocket_client(http: aiohttp.ClientSession, base_url: str, session_id: str, args, results: dict):
+    url = f"{base_url}/sessions/{session_id}/ws" + ("?audio=1" if args.audio else "")
+    async with http.ws_connect(url) as ws:
+        for turn in range(args.turns):
+            started = time.perf_counter()
+            first_token = None
+            await ws.send_json({"text": f"Question {turn} from {session_id}"})
+            async for message in ws:
+                if message.type != aiohttp.WSMsgType.TEXT:
+                    continue
+                event = json.loads(message.data)
+                if event["type"] == "token" and first_token is None:
+                    first_token = time.perf_counter() - started
+                elif event["type"] == "error":
+                    results["errors"] += 1
+                    break
+                elif event["type"] == "done":
+                    results["latencies"].append(time.perf_counter() - started)
+                    results["first_tokens"].append(first_token or 0.0)
+                    break
+
+async def http_client(http: aiohttp.ClientSession, base_url: str, session_id: str, args, results: dict):
+    url = f"{base_url}/sessions/{session_id}/turns"
+    for turn in range(args.turns):
+        started = time.perf_counter()
+        first_token = None
+        async with http.post(url, json={"text": f"Question {turn} from {session_id}"}) as response:
+            if response.status != 200:
+                results["errors"] += 1
+                continue
+            async for line in response.content:
+                event = json.loads(line)
+                if event["type"] == "token" and first_token is None:
+                    first_token = time.perf_counter() - started
+                elif event["type"] == "done":
+                    results["latencies"].append(time.perf_counter() - started)
+                    results["first_tokens"].append(first_token or 0.0)
+
+async def run(args):
+    stream_completion, complete = make_stub_llm(args.llm_first_token, args.llm_tokens_per_sec)
+    services = NikuServices(
+        StubDecisionEngine(args.classify_latency),
+        stream_completion=stream_completion,
+        complete=complete,
+        synthesize=make_stub_tts(args.tts_latency) if args.audio else None,
+        tracer=Tracer(enabled=args.trace),
+    )
+    with tempfile.TemporaryDirectory() as store_dir:
+        store = SessionStore(store_dir=store_dir)
+        server = NikuServer(services, store, max_concurrent_turns=args.max_concurrent_turns,
+                            max_waiting_turns=args.max_waiting_turns)
+        runner = web.AppRunner(server.make_app())
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        base_url = f"http://127.0.0.1:{port}"
+
+        results = {"latencies": [], "first_tokens": [], "errors": 0}
+        client = websocket_client if args.transport == "ws" else http_client
+        connector = aiohttp.TCPConnector(limit=0)
+        async with aiohttp.ClientSession(connector=connector) as http:
+            started = time.perf_counter()
+            await asyncio.gather(*(client(http, base_url, f"user-{i}", args, results) for i in range(args.sessions)))
+            elapsed = time.perf_counter() - started
+
+        await runner.cleanup()
+        store.close()
+
+    latencies = [value * 1000 for value in results["latencies"]]
+    first_tokens = [value * 1000 for value in results["first_tokens"]]
+    print(f"{args.sessions} sessions x {args.turns} turns over {args.transport}, "
+          f"max {args.max_concurrent_turns} concurrent turns{', with audio' if args.audio else ''}")
+    print(f"Completed turns: {len(latencies)}  errors/rejected: {results['errors']}  in {elapsed:.2f} s")
+    print(f"Throughput: {len(latencies) / elapsed:.1f} turns/sec")
+    if latencies:
+        print(f"Turn latency (ms):  p50 {statistics.median(latencies):7.1f}  p95 {percentile(latencies, 0.95):7.1f}  "
+              f"p99 {percentile(latencies, 0.99):7.1f}")
+        print(f"First token (ms):   p50 {statistics.median(first_tokens):7.1f}  p95 {percentile(first_tokens, 0.95):7.1f}  "
+              f"p99 {percentile(first_tokens, 0.99):7.1f}")
+    print(f"Server: {server.stats()}")
+    print(f"Speculation: {services.speculation_stats}")
+    if args.trace:
+        print(f"Stage latencies:\n{services.tracer.summary()}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=100, help="Concurrent client sessions")
+    parser.add_argument("--turns", type=int, default=5, help="Turns per session")
+    parser.add_argument("--transport", choices=["ws", "http"], default="ws")
+    parser.add_argument("--audio", action="store_true", help="Request synthesized audio over WebSocket")
+    parser.add_argument("--trace", action="store_true", help="Record and print per-stage latencies")
+    parser.add_argument("--max-concurrent-turns", type=int, default=64)
+    parser.add_argument("--max-waiting-turns", type=int, default=1024)
+    parser.add_argument("--classify-latency", type=float, default=0.02, help="Seconds per intent classification")
+    parser.add_argument("--llm-first-token", type=float, default=0.15, help="Seconds to the first LLM token")
+    parser.add_argument("--llm-tokens-per-sec", type=float, default=400.0)
+    parser.add_argument("--tts-latency", type=float, default=0.05, help="Seconds per synthesized sentence")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
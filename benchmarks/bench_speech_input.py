@@ -0,0 +1,224 @@
+"""
+Offline benchmark of the speech input front end (niku/SpeechRecog.py).
+
+Writes a WAV fixture of synthetic speech: voiced, syllable-modulated harmonic
+bursts with known start and end times over background noise. It then runs it
+through AudioSource, the voice-activity segmenter and the stub recognizer,
+the same path main.py uses with NIKU_SPEECH_INPUT. Reports:
+- whether every utterance was found, and how far off its boundaries are (the
+  segmenter deliberately keeps --pad-ms of audio around speech; that is not an error);
+- the silence waited for (--end-ms) before each final transcript;
+- how early the first partial transcript arrived within each utterance;
+- processing speed relative to real time.
+
+A recorded WAV can be segmented instead with --wav (no boundary truth is known).
+With --check, the committed fixture in benchmarks/fixtures/ is segmented and
+every utterance must come out once, with its transcript and with boundaries
+within CHECK_TOLERANCE_MS of the labelled ones; the run exits non-zero otherwise.
+
+Run from the repository root:
+    python -m benchmarks.bench_speech_input --utterances 20 --noise-db -50 --output logs/bench_speech_input.json
+    python -m benchmarks.bench_speech_input --wav recording.wav
+    python -m benchmarks.bench_speech_input --check
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import wave
+
+import numpy as np
+
+from niku.SpeechRecog import AudioSource, SpeechInput, StubRecognizer, UtteranceSegmenter
+
+SAMPLE_RATE = 16000
+FIXTURE_FILE = os.path.join(os.path.dirname(__file__), 'fixtures', 'speech_input.json')
+CHECK_TOLERANCE_MS = 40 # The segmenter works in 20 ms frames
+
+def synthetic_speech(duration: float, rng: random.Random, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """Harmonic signal with a varying pitch and ~4 Hz syllable envelope, like voiced speech."""
+    t = np.arange(int(duration * sample_rate)) / sample_rate
+    f0 = rng.uniform(100, 220) * (1 + 0.1 * np.sin(2 * np.pi * rng.uniform(0.5, 1.5) * t))
+    phase = 2 * np.pi * np.cumsum(f0) / sample_rate
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 8))
+    syllables = 0.55 + 0.45 * np.sin(2 * np.pi * rng.uniform(3, 5) * t - np.pi / 2)
+    ramp = np.minimum(1.0, np.minimum(t, duration - t) / 0.02) # 20 ms fade in and out
+    return (0.15 * voiced * syllables * ramp).astype(np.float32)
+
+def write_fixture(path: str, utterances: int, noise_db: float, seed: int,
+                  sample_rate: int = SAMPLE_RATE) -> list[tuple[float, float]]:
+    """
+    Writes a mono 16-bit WAV fixture.
+
+    Returns:
+        The (start, end) seconds of every utterance in the file.
+    """
+    rng = random.Random(seed)
+    parts, bounds, position = [], [], 0.0
+    for _ in range(utterances):
+        gap, duration = rng.uniform(0.6, 1.5), rng.uniform(0.8, 3.0)
+        parts += [np.zeros(int(gap * sample_rate), dtype=np.float32), synthetic_speech(duration, rng, sample_rate)]
+        bounds.append((position + gap, position + gap + duration))
+        position += gap + duration
+    parts.append(np.zeros(sample_rate, dtype=np.float32))
+    audio = np.concatenate(parts)
+    audio += np.random.default_rng(seed).normal(0, 10 ** (noise_db / 20), len(audio)).astype(np.float32)
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes((np.clip(audio, -1, 1) * 32767).astype("<i2").tobytes())
+    return bounds
+
+async def transcribe(path: str, args, transcripts: list[str] | None = None) -> tuple[list, SpeechInput]:
+    source = await AudioSource.open(path)
+    speech_input = SpeechInput(source, StubRecognizer(transcripts),
+                               UtteranceSegmenter(source.sample_rate, end_ms=args.end_ms, pad_ms=args.pad_ms),
+                               partial_interval_ms=args.partial_interval_ms)
+    return [transcript async for transcript in speech_input.transcripts()], speech_input
+
+def summarize(values: list[float]) -> dict:
+    values_ms = sorted(value * 1000 for value in values)
+    return {
+        "count": len(values_ms),
+        "mean": statistics.fmean(values_ms),
+        "p50": values_ms[len(values_ms) // 2],
+        "max": values_ms[-1],
+    }
+
+def evaluate(transcripts: list, bounds: list[tuple[float, float]], end_ms: int, pad_ms: int) -> dict:
+    """Matches final transcripts to the true utterances by overlap."""
+    pad = pad_ms / 1000
+    finals = [transcript for transcript in transcripts if transcript.final]
+    first_partials = {}
+    for transcript in transcripts:
+        if not transcript.final:
+            first_partials.setdefault(transcript.utterance, transcript)
+    start_errors, end_errors, partial_leads = [], [], []
+    found = 0
+    for start, end in bounds:
+        match = next((final for final in finals if final.start < end and final.end > start), None)
+        if match is None:
+            continue
+        found += 1
+        start_errors.append(abs(match.start - max(0.0, start - pad)))
+        end_errors.append(abs(match.end - (end + pad)))
+        partial = first_partials.get(match.utterance)
+        if partial is not None:
+            partial_leads.append(end - partial.end) # Speech still to come when the first partial arrived
+    return {
+        "utterances": len(bounds),
+        "found": found,
+        "spurious": len(finals) - found,
+        "start_error_ms": summarize(start_errors) if start_errors else None,
+        "end_error_ms": summarize(end_errors) if end_errors else None,
+        "first_partial_lead_ms": summarize(partial_leads) if partial_leads else None,
+        "end_of_speech_latency_ms": end_ms, # Silence waited for before the final transcript
+    }
+
+def check_fixture(transcripts: list, fixture: dict) -> list[str]:
+    """
+    Compares the final transcripts of the fixture with its labels.
+
+    Returns:
+        A description of every mismatch; empty if the fixture passed.
+    """
+    pad = fixture["pad_ms"] / 1000
+    finals = [transcript for transcript in transcripts if transcript.final]
+    expected = fixture["utterances"]
+    failures = []
+    if len(finals) != len(expected):
+        failures.append(f"expected {len(expected)} utterances, got {len(finals)}")
+    for index, (label, final) in enumerate(zip(expected, finals)):
+        if final.text != label["text"]:
+            failures.append(f"utterance {index}: transcript {final.text!r}, expected {label['text']!r}")
+        for name, actual, wanted in (("start", final.start, max(0.0, label["start"] - pad)),
+                                     ("end", final.end, label["end"] + pad)):
+            error_ms = abs(actual - wanted) * 1000
+            if error_ms > CHECK_TOLERANCE_MS:
+                failures.append(f"utterance {index}: {name} {actual:.3f} s, expected {wanted:.3f} s ({error_ms:.0f} ms off)")
+    return failures
+
+async def run(args) -> dict:
+    if args.check:
+        with open(FIXTURE_FILE, encoding='utf-8') as f:
+            fixture = json.load(f)
+        args.end_ms, args.pad_ms = fixture["end_ms"], fixture["pad_ms"] # The labels assume these settings
+        path = os.path.join(os.path.dirname(FIXTURE_FILE), fixture["wav"])
+        transcripts, speech_input = await transcribe(path, args, [label["text"] for label in fixture["utterances"]])
+        return {
+            "config": {key: value for key, value in vars(args).items() if key != "output"},
+            "transcripts": [transcript.to_dict() for transcript in transcripts if transcript.final],
+            "check_failures": check_fixture(transcripts, fixture),
+            "stats": speech_input.stats.to_dict(),
+        }
+    if args.wav:
+        transcripts, speech_input = await transcribe(args.wav, args)
+        return {
+            "config": {key: value for key, value in vars(args).items() if key != "output"},
+            "transcripts": [transcript.to_dict() for transcript in transcripts if transcript.final],
+            "stats": speech_input.stats.to_dict(),
+        }
+    with tempfile.TemporaryDirectory() as fixture_dir:
+        path = os.path.join(fixture_dir, "speech.wav")
+        bounds = write_fixture(path, args.utterances, args.noise_db, args.seed)
+        script = [f"utterance number {i + 1} of the benchmark fixture" for i in range(args.utterances)]
+        transcripts, speech_input = await transcribe(path, args, script)
+    return {
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "segmentation": evaluate(transcripts, bounds, args.end_ms, args.pad_ms),
+        "stats": speech_input.stats.to_dict(),
+    }
+
+def print_results(results: dict):
+    stats = results["stats"]
+    print(f"{stats['audio_seconds']:.1f} s of audio in {stats['processing_seconds'] * 1000:.0f} ms "
+          f"({stats['audio_seconds'] / stats['processing_seconds']:.0f}x realtime), {stats['utterances']} utterances, "
+          f"{stats['discarded']} discarded, {stats['partials']} partials")
+    if "transcripts" in results:
+        for transcript in results["transcripts"]:
+            print(f"  {transcript['start']:7.2f}-{transcript['end']:7.2f} s  {transcript['text']}")
+        if "check_failures" in results:
+            for failure in results["check_failures"]:
+                print(f"FAIL: {failure}")
+            print("Fixture check " + ("failed" if results["check_failures"] else "passed"))
+        return
+    segmentation = results["segmentation"]
+    print(f"Found {segmentation['found']}/{segmentation['utterances']} utterances, {segmentation['spurious']} spurious")
+    for name in ("start_error_ms", "end_error_ms", "first_partial_lead_ms"):
+        values = segmentation[name]
+        if values:
+            print(f"  {name:<24}mean {values['mean']:7.1f}  p50 {values['p50']:7.1f}  max {values['max']:7.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--utterances", type=int, default=20)
+    parser.add_argument("--noise-db", type=float, default=-50.0, help="Background noise level in dBFS")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--end-ms", type=int, default=500, help="Silence that ends an utterance")
+    parser.add_argument("--pad-ms", type=int, default=200, help="Audio kept around detected speech")
+    parser.add_argument("--partial-interval-ms", type=int, default=400)
+    parser.add_argument("--wav", help="Segment this recording instead of a synthetic fixture")
+    parser.add_argument("--check", action="store_true",
+                        help="Check boundaries and transcripts of the committed fixture in benchmarks/fixtures/")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print_results(results)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    if "segmentation" in results and results["segmentation"]["found"] < results["segmentation"]["utterances"]:
+        sys.exit(1)
+    if results.get("check_failures"):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
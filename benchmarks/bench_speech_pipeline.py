@@ -0,0 +1,79 @@
+"""
+Time-to-first-audio benchmark for the sentence-pipelined LLM-to-speech stage.
+
+Compares the sequential flow (wait for the full completion, then synthesize the
+whole reply) with SentenceSpeechPipeline, using a local fake LLM and fake TTS.
+
+Run from the repository root:
+    python -m benchmarks.bench_speech_pipeline
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from niku.speech_pipeline import SentenceSpeechPipeline
+
+REPLY = (
+    "Large language models learn statistical patterns from huge amounts of text. "
+    "That lets them answer questions, summarize documents and hold a conversation. "
+    "They are not perfect, and they can be confidently wrong. "
+    "Still, they have become a core building block for assistants like me. "
+    "Is there anything specific you would like to know about them?"
+)
+
+async def fake_llm(text: str, first_token_latency: float, tokens_per_sec: float):
+    """Yields whitespace-delimited tokens at a fixed rate after an initial delay."""
+    await asyncio.sleep(first_token_latency)
+    for word in text.split(" "):
+        yield word + " "
+        await asyncio.sleep(1 / tokens_per_sec)
+
+def make_fake_tts(base_latency: float, per_char_latency: float):
+    """Returns a fake synthesize coroutine whose latency grows with text length."""
+    async def synthesize(text: str) -> bytes:
+        await asyncio.sleep(base_latency + per_char_latency * len(text))
+        return b"\x00" * len(text)
+    return synthesize
+
+async def run_sequential(args) -> tuple[float, float]:
+    synthesize = make_fake_tts(args.tts_base, args.tts_per_char)
+    start = time.perf_counter()
+    reply = "".join([token async for token in fake_llm(REPLY, args.ttft, args.tps)])
+    await synthesize(reply)
+    first_audio = time.perf_counter() - start
+    return first_audio, first_audio
+
+async def run_pipelined(args) -> tuple[float, float]:
+    pipeline = SentenceSpeechPipeline(make_fake_tts(args.tts_base, args.tts_per_char), max_pending=args.max_pending)
+    start = time.perf_counter()
+    async for _ in pipeline.run(fake_llm(REPLY, args.ttft, args.tps)):
+        pass
+    return pipeline.time_to_first_audio, time.perf_counter() - start
+
+def report(name: str, results: list[tuple[float, float]]):
+    first = [r[0] * 1000 for r in results]
+    total = [r[1] * 1000 for r in results]
+    print(f"{name:<12} first audio p50 {statistics.median(first):7.1f} ms   "
+          f"all audio p50 {statistics.median(total):7.1f} ms")
+    return statistics.median(first)
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--ttft", type=float, default=0.15, help="Fake LLM time to first token (s)")
+    parser.add_argument("--tps", type=float, default=150.0, help="Fake LLM tokens per second")
+    parser.add_argument("--tts-base", type=float, default=0.2, help="Fake TTS fixed latency per call (s)")
+    parser.add_argument("--tts-per-char", type=float, default=0.002, help="Fake TTS latency per character (s)")
+    parser.add_argument("--max-pending", type=int, default=3)
+    args = parser.parse_args()
+
+    sequential = [await run_sequential(args) for _ in range(args.runs)]
+    pipelined = [await run_pipelined(args) for _ in range(args.runs)]
+
+    seq_first = report("sequential", sequential)
+    pipe_first = report("pipelined", pipelined)
+    print(f"Time-to-first-audio speedup: {seq_first / pipe_first:.1f}x")
+
+if __name__ == "__main__":
+    asyncio.run(main())
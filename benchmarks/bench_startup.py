@@ -0,0 +1,142 @@
+"""
+Startup-time benchmark for the Niku console assistant.
+
+Measures, in fresh interpreter processes:
+- interpreter: `python -c pass`, the floor every other number includes.
+- import_main: `import main`, i.e. everything loaded before main_loop runs.
+- first_prompt: launching `main.py` until the first "You: " prompt is printed,
+  after which the assistant is told to quit.
+
+The API keys are set to placeholders, so no network request needs to succeed
+for the prompt to appear. Results can be saved as JSON and compared against a
+saved baseline.
+
+Run from the repository root:
+    python -m benchmarks.bench_startup --runs 10 --output logs/bench_startup.json
+    python -m benchmarks.bench_startup --baseline logs/bench_startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROMPT = b"You: "
+
+def child_env() -> dict:
+    env = dict(os.environ)
+    env.setdefault("GROQ_API_KEY", "fake-key")
+    env.setdefault("COHERE_API_KEY", "fake-key")
+    env.update(NIKU_SAVE_AUDIO="0", NIKU_LLM_CACHE="0", NIKU_TRACE="0")
+    return env
+
+def time_command(args: list[str], env: dict) -> float:
+    """Seconds for a command to run to completion."""
+    started = time.perf_counter()
+    subprocess.run(args, cwd=REPO_ROOT, env=env, check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - started
+
+def time_to_first_prompt(env: dict, timeout: float) -> float:
+    """Seconds from launching main.py until it prints the first prompt."""
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-u", "main.py"], cwd=REPO_ROOT, env=env,
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    output = b""
+    try:
+        while PROMPT not in output:
+            chunk = process.stdout.read1(4096)
+            if not chunk:
+                raise RuntimeError(f"main.py exited before prompting:\n{output.decode(errors='replace')}")
+            output += chunk
+            if time.perf_counter() - started > timeout:
+                raise TimeoutError(f"No prompt after {timeout:.0f} s")
+        elapsed = time.perf_counter() - started
+        process.communicate(b"quit\n", timeout=timeout)
+        return elapsed
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
+def summarize(values: list[float]) -> dict:
+    values_ms = [value * 1000 for value in values]
+    return {
+        "runs": len(values_ms),
+        "median": statistics.median(values_ms),
+        "min": min(values_ms),
+        "max": max(values_ms),
+    }
+
+def run(args) -> dict:
+    samples = {"interpreter": [], "import_main": [], "first_prompt": []}
+    env = child_env()
+    time_command([sys.executable, "-c", "import main"], env) # Warm the OS file cache and bytecode
+    for _ in range(args.runs):
+        samples["interpreter"].append(time_command([sys.executable, "-c", "pass"], env))
+        samples["import_main"].append(time_command([sys.executable, "-c", "import main"], env))
+        samples["first_prompt"].append(time_to_first_prompt(env, args.timeout))
+    return {
+        "config": {"runs": args.runs, "python": sys.version.split()[0]},
+        "startup_ms": {name: summarize(values) for name, values in samples.items()},
+    }
+
+def print_results(results: dict):
+    print(f"{'measurement':<14}{'runs':>6}{'median ms':>12}{'min ms':>10}{'max ms':>10}")
+    for name, stats in results["startup_ms"].items():
+        print(f"{name:<14}{stats['runs']:>6}{stats['median']:>12.1f}{stats['min']:>10.1f}{stats['max']:>10.1f}")
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    Compares median startup times with a baseline run.
+
+    Returns:
+        Descriptions of the measurements that regressed by more than `tolerance`.
+    """
+    regressions = []
+    print(f"\nComparison with baseline (tolerance {tolerance:.0%}):")
+    for name, stats in results["startup_ms"].items():
+        old = baseline.get("startup_ms", {}).get(name)
+        if old is None:
+            continue
+        delta = stats["median"] - old["median"]
+        ratio = delta / old["median"] if old["median"] else 0.0
+        print(f"  {name:<14}{old['median']:.1f}->{stats['median']:.1f} ms ({ratio:+.0%})")
+        if ratio > tolerance and delta > 5.0: # Ignore process-startup noise
+            regressions.append(f"{name} median {ratio:+.0%}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds to wait for the prompt")
+    parser.add_argument("--max-first-prompt-ms", type=float, help="Fail if the median time to first prompt exceeds this")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare against results saved earlier with --output")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed relative regression before failing")
+    args = parser.parse_args()
+
+    results = run(args)
+    print_results(results)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    failures = []
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            failures += compare(results, json.load(f), args.tolerance)
+    first_prompt = results["startup_ms"]["first_prompt"]["median"]
+    if args.max_first_prompt_ms is not None and first_prompt > args.max_first_prompt_ms:
+        failures.append(f"first_prompt median {first_prompt:.1f} ms > {args.max_first_prompt_ms:.1f} ms")
+    if failures:
+        print("Regressions: " + ", ".join(failures))
+        sys.exit(1)
+    if args.baseline:
+        print("No regressions.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+"""
+Local stand-ins for the services Niku calls, for reproducible benchmarks.
+
+Each fake has a ServiceProfile with configurable latency, jitter and error
+rate, and behaves like the real client closely enough for the production code
+paths to run unchanged:
+
+- FakeAsyncGroq / FakeGroq: streaming chat completions, installed as the pooled
+  clients of niku.groq_client.
+- FakeGroqServer: an OpenAI-compatible streaming chat completions HTTP server
+  on localhost, for driving the real Groq SDK over real connections.
+- FakeCohere: the `classify` call used by DecisionEngine.
+- FakeWeatherServer: an OpenWeatherMap-compatible HTTP server on localhost,
+  used by niku.tools.fetch_weather_data.
+- make_fake_tts: a synthesize coroutine in place of Edge TTS.
+"""
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlparse
+
+import niku.groq_client as groq_client
+import niku.tools as tools
+
+CHAT_REPLY = (
+    "That's a great question. Here is a short answer, streamed a few words at a time "
+    "so the speech pipeline has sentences to work with. Is there anything else you would like to know?"
+)
+
+class FakeServiceError(Exception):
+    """Raised by a fake client when its profile injects a failure."""
+
+
+class ServiceProfile:
+    """
+    Latency and failure behaviour of one fake service.
+
+    Latencies are log-normally distributed around `latency` so that `jitter`
+    (the sigma of the underlying normal) produces a realistic long tail. A
+    `slow_fraction` of calls additionally stalls for `slow_latency` seconds, like
+    a request stuck behind a busy replica.
+    """
+    def __init__(self, latency: float, jitter: float = 0.2, error_rate: float = 0.0, seed: int | None = None,
+                 slow_fraction: float = 0.0, slow_latency: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.slow_fraction = slow_fraction
+        self.slow_latency = slow_latency
+        self.calls = 0
+        self.errors = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self) -> float:
+        """Returns the latency of the next call in seconds."""
+        with self._lock:
+            self.calls += 1
+            if self.slow_fraction and self._rng.random() < self.slow_fraction:
+                return self.slow_latency
+            return self.latency * self._rng.lognormvariate(0, self.jitter) if self.jitter else self.latency
+
+    def fails(self) -> bool:
+        """Decides whether the next call fails."""
+        with self._lock:
+            failed = self._rng.random() < self.error_rate
+            self.errors += failed
+            return failed
+
+    def to_dict(self) -> dict:
+        return {"latency": self.latency, "jitter": self.jitter, "error_rate": self.error_rate,
+                "slow_fraction": self.slow_fraction, "slow_latency": self.slow_latency,
+                "calls": self.calls, "errors": self.errors}
+
+
+def fake_completion_text(messages: list[dict]) -> str:
+    """Chooses a reply that fits the prompt: JSON arguments for tool extraction, chat otherwise."""
+    prompt = messages[-1]["content"] if messages else ""
+    if "Respond with only a JSON list" in prompt:
+        query = re.search(r"User Query: '(.*)'", prompt)
+        words = [word for word in re.findall(r"[A-Z][a-z]+", query.group(1) if query else "")]
+        return json.dumps([{"location": words[-1]}]) if words else "[]"
+    return CHAT_REPLY
+
+def _chunk(content: str | None, completion_tokens: int | None = None):
+    usage = SimpleNamespace(completion_tokens=completion_tokens) if completion_tokens else None
+    return SimpleNamespace(
+        choices=[SimpleNamespace(delta=SimpleNamespace(content=content))],
+        x_groq=SimpleNamespace(usage=usage) if usage else None,
+    )
+
+
+class _FakeAsyncStream:
+    def __init__(self, text: str, tokens_per_sec: float, stream_error: bool):
+        self.words = text.split(" ")
+        self.interval = 1 / tokens_per_sec
+        self.stream_error = stream_error
+
+    async def __aiter__(self):
+        for i, word in enumerate(self.words):
+            if self.stream_error and i == len(self.words) // 2:
+                raise FakeServiceError("Stream interrupted")
+            yield _chunk(word if i == 0 else " " + word)
+            await asyncio.sleep(self.interval)
+        yield _chunk(None, completion_tokens=len(self.words))
+
+
+class FakeAsyncGroq:
+    """Stands in for groq.AsyncGroq: `chat.completions.create(..., stream=True)`."""
+    def __init__(self, profile: ServiceProfile, tokens_per_sec: float = 300.0, stream_error_rate: float = 0.0):
+        self.profile = profile
+        self.tokens_per_sec = tokens_per_sec
+        self.stream_error_rate = stream_error_rate
+        self.chat = SimpleNamespace(completions=self)
+        self._rng = random.Random(0)
+
+    async def create(self, messages: list[dict], model: str, stream: bool = True, **sampling_params):
+        await asyncio.sleep(self.profile.sample()) # Time to first token
+        if self.profile.fails():
+            raise FakeServiceError("503 Service Unavailable")
+        stream_error = self._rng.random() < self.stream_error_rate
+        return _FakeAsyncStream(fake_completion_text(messages), self.tokens_per_sec, stream_error).__aiter__()
+
+    async def close(self):
+        pass
+
+
+class FakeGroq:
+    """Synchronous counterpart of FakeAsyncGroq, for get_groq_completion."""
+    def __init__(self, profile: ServiceProfile, tokens_per_sec: float = 300.0):
+        self.profile = profile
+        self.tokens_per_sec = tokens_per_sec
+        self.chat = SimpleNamespace(completions=self)
+
+    def create(self, messages: list[dict], model: str, stream: bool = True, **sampling_params):
+        time.sleep(self.profile.sample())
+        if self.profile.fails():
+            raise FakeServiceError("503 Service Unavailable")
+        words = fake_completion_text(messages).split(" ")
+
+        def chunks():
+            for i, word in enumerate(words):
+                yield _chunk(word if i == 0 else " " + word)
+                time.sleep(1 / self.tokens_per_sec)
+            yield _chunk(None, completion_tokens=len(words))
+        return chunks()
+
+    def close(self):
+        pass
+
+def install_fake_groq(profile: ServiceProfile, tokens_per_sec: float = 300.0, stream_error_rate: float = 0.0):
+    """Makes niku.groq_client use fake pooled clients instead of the Groq API."""
+    groq_client._async_client = FakeAsyncGroq(profile, tokens_per_sec, stream_error_rate)
+    groq_client._client = FakeGroq(profile, tokens_per_sec)
+
+
+_INTENT_KEYWORDS = [
+    ("get_weather", ("weather", "temperature", "forecast", "rain")),
+    ("tell_joke", ("joke", "funny", "laugh")),
+    ("get_time", ("time", "clock")),
+    ("identity_query", ("who are you", "your name")),
+]
+
+class FakeCohere:
+    """Stands in for cohere.Client: `classify(model=, inputs=, examples=)` with keyword rules."""
+    def __init__(self, profile: ServiceProfile):
+        self.profile = profile
+
+    def classify(self, model: str, inputs: list[str], examples: list, request_options: dict | None = None):
+        time.sleep(self.profile.sample())
+        if self.profile.fails():
+            raise FakeServiceError("Cohere request failed")
+        classifications = []
+        for text in inputs:
+            lowered = text.lower()
+            label = next((label for label, words in _INTENT_KEYWORDS if any(word in lowered for word in words)), "general_chat")
+            classifications.append(SimpleNamespace(prediction=label, confidence=0.9))
+        return SimpleNamespace(classifications=classifications)
+
+
+class FakeWeatherServer:
+    """
+    OpenWeatherMap-compatible `/data/2.5/weather` endpoint on localhost.
+
+    Unknown cities are answered like the real API does for any non-empty name,
+    so every request exercises the full HTTP path.
+    """
+    def __init__(self, profile: ServiceProfile):
+        self.profile = profile
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1" # Keep-alive, like the real API
+
+            def do_GET(self):
+                time.sleep(server.profile.sample())
+                query = parse_qs(urlparse(self.path).query)
+                if server.profile.fails():
+                    self._send(500, {"cod": 500, "message": "Internal error"})
+                    return
+                city = query.get("q", [""])[0].split(",")[0].strip().title()
+                self._send(200, {
+                    "cod": 200,
+                    "name": city,
+                    "sys": {"country": "XX"},
+                    "weather": [{"description": "clear sky"}],
+                    "main": {"temp": 21.5, "feels_like": 21.0, "humidity": 40},
+                    "wind": {"speed": 3.2},
+                })
+
+            def _send(self, status: int, payload: dict):
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}/data/2.5/weather"
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-weather", daemon=True)
+
+    def start(self) -> "FakeWeatherServer":
+        """Starts serving and points niku.tools at this server."""
+        self._thread.start()
+        tools.OPENWEATHERMAP_API_URL = self.url
+        tools.WEATHER_API_KEY = tools.WEATHER_API_KEY or "fake-key"
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class FakeGroqServer:
+    """
+    OpenAI-compatible `/openai/v1/chat/completions` endpoint on localhost that
+    streams server-sent events, the way the Groq API does.
+
+    The profile's latency is the time to the first chunk; failures are answered
+    with 503 before anything is streamed. Clients that hang up early (a hedged
+    request that lost) are tolerated.
+    """
+    def __init__(self, profile: ServiceProfile, tokens_per_sec: float = 300.0):
+        self.profile = profile
+        self.tokens_per_sec = tokens_per_sec
+        self.disconnects = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                time.sleep(server.profile.sample())
+                if server.profile.fails():
+                    body = json.dumps({"error": {"message": "Service unavailable", "type": "internal_server_error"}})
+                    self.send_response(503)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body.encode('utf-8'))
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                words = re.findall(r"\S+\s*", fake_completion_text(request.get("messages", [])))
+                try:
+                    for index, word in enumerate(words):
+                        if index:
+                            time.sleep(1 / server.tokens_per_sec)
+                        self._event(self._chunk(request, {"content": word}, None))
+                    self._event(self._chunk(request, {}, "stop"))
+                    self._event("[DONE]")
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    server.disconnects += 1
+                    self.close_connection = True
+
+            @staticmethod
+            def _chunk(request: dict, delta: dict, finish_reason: str | None) -> str:
+                return json.dumps({
+                    "id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()),
+                    "model": request.get("model", ""),
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                })
+
+            def _event(self, data: str):
+                payload = f"data: {data}\n\n".encode('utf-8')
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(payload), payload))
+                self.wfile.flush()
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self._server.server_address[1]}"
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-groq", daemon=True)
+
+    def start(self) -> "FakeGroqServer":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def make_fake_tts(profile: ServiceProfile, bytes_per_char: int = 200):
+    """Returns a synthesize coroutine with the profile's latency, in place of Edge TTS."""
+    async def synthesize(sentence: str) -> bytes | None:
+        await asyncio.sleep(profile.sample())
+        if profile.fails():
+            return None # Matches the real wrapper, which reports the error and skips the sentence
+        return b"\x00" * (len(sentence) * bytes_per_char)
+    return synthesize
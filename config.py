@@ -1,7 +1,7 @@
 import os 
-from dotenv import load_dotenv
+from niku.env import load_env
 
-load_dotenv()
+load_env()
 class AppConfig:
     GEMINI_LIVE_MODEL_NAME = "models/gemini-2.5-flash-preview-native-audio-dialog"
     GEMINI_LIVE_SYSTEM_INSTRUCTION = "You are a helpful assistant. Be concise and friendly."
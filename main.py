@@ -1,16 +1,42 @@
 import asyncio
 import os
-from dotenv import load_dotenv
 from datetime import datetime # Added missing import
 
-from niku.groq_client import get_groq_completion
-from niku.tts_client import text_to_speech
+from niku.env import load_env
+from niku.groq_client import close_clients as close_groq_clients, completion_policy, warm_up as warm_up_groq
+from niku.tts_client import AudioOutput
+from niku.tts_worker import TTSWorker, SpeechJob
+from niku.console import ConsoleReader
+from niku.tts_cache import AudioCache
 from niku.memory_manager import ConversationHistory
-from niku.decision_engine import DecisionEngine # Uncommented
-from niku.tools import fetch_weather_data # Added import for weather tool
+from niku.llm_cache import CompletionCache
+from niku.session import NikuServices, NikuSession
+from niku.session_store import DEFAULT_RETENTION
+from niku.router import ModelRouter, SMALL_MODEL, DEFAULT_LATENCY_BUDGET
+from niku.tools import CANNED_PHRASES, warm_up_weather
+from niku.tracing import Tracer
 
 # Load environment variables from .env file
-load_dotenv()
+load_env()
+
+RECENT_HISTORY_SHOWN = 4 # Messages from the previous conversation printed at startup
+
+def create_decision_engine():
+    """Imports and builds the DecisionEngine (Cohere SDK, numpy); slow, so run it in a thread."""
+    from niku.decision_engine import DecisionEngine
+    return DecisionEngine()
+
+async def warm_up_services():
+    """
+    Prepares the network clients while the user types the first message:
+    creates the pooled Groq client and opens its connection, loads the Edge TTS
+    module and opens a keep-alive connection to the weather API.
+    """
+    def import_tts():
+        import edge_tts
+
+    await asyncio.gather(warm_up_groq(), asyncio.to_thread(import_tts), asyncio.to_thread(warm_up_weather),
+                         return_exceptions=True)
 
 async def main_loop():
     """
@@ -24,14 +50,10 @@ async def main_loop():
     log_dir = os.path.join(os.path.dirname(__file__), 'logs')
     os.makedirs(log_dir, exist_ok=True)
     conversation_log_path = os.path.join(log_dir, 'niku_chat_history.json')
-    history_manager = ConversationHistory(log_file=conversation_log_path, max_history_len=10)
-
-    try:
-        decision_engine = DecisionEngine() # Uncommented and initialized
-    except ValueError as e:
-        print(f"Error initializing Decision Engine: {e}")
-        print("Please ensure COHERE_API_KEY is set in your .env file.")
-        return
+    # The single REPL session keeps the same per-session retention as the server's store; the
+    # prompt window is chosen per turn by the ContextBuilder, not by trimming the history.
+    history_retention = int(os.getenv("NIKU_HISTORY_RETENTION", DEFAULT_RETENTION))
+    history_manager = ConversationHistory(log_file=conversation_log_path, max_history_len=history_retention)
 
     # --- Get API Keys ---
     groq_api_key = os.getenv("GROQ_API_KEY")
@@ -47,13 +69,86 @@ async def main_loop():
         # For now, we'll allow it to proceed but the classify_intent might fail if the key was needed at init.
         # The DecisionEngine class already raises ValueError if key is missing at init.
 
-    print("\\n--- Conversation History Loaded ---")
-    for msg in history_manager.get_history():
+    # Spoken input: a WAV/PCM file, "-" for stdin or tcp://host:port; typed input if unset
+    speech_source = os.getenv("NIKU_SPEECH_INPUT")
+    if speech_source:
+        from niku.SpeechRecog import SpeechReader, load_recognizer
+        recognizer_spec = os.getenv("NIKU_RECOGNIZER") # "module:factory" of a Recognizer, or "stub" for testing
+        if not recognizer_spec:
+            print("Error: NIKU_SPEECH_INPUT is set but NIKU_RECOGNIZER is not. Set it to the speech recognizer "
+                  "to use (\"module:factory\"), or to \"stub\" to try speech input without real recognition.")
+            return
+        try:
+            recognizer = load_recognizer(recognizer_spec)
+        except (ImportError, AttributeError, ValueError, TypeError) as e:
+            print(f"Error loading the speech recognizer: {e}")
+            return
+
+    # Heavy SDKs load and connections open in the background; the prompt appears right away
+    engine_task = asyncio.create_task(asyncio.to_thread(create_decision_engine))
+    warm_up_task = asyncio.create_task(warm_up_services())
+
+    # Audio is synthesized in memory; saving to disk and piping to a player are optional
+    save_audio = os.getenv("NIKU_SAVE_AUDIO", "1") != "0"
+    audio_player_command = os.getenv("NIKU_AUDIO_PLAYER") # e.g. "ffplay -nodisp -autoexit -loglevel quiet -"
+    # Deterministic LLM calls (tool argument extraction) are cached; chat replies never are
+    llm_cache = CompletionCache(cache_file=os.path.join(log_dir, 'llm_cache.sqlite3')) if os.getenv("NIKU_LLM_CACHE", "1") != "0" else None
+    # Canned replies are synthesized once and then served from disk; LLM replies are never cached
+    audio_cache = AudioCache(cache_dir=os.path.join(log_dir, 'tts_cache'), phrases=CANNED_PHRASES)
+    prewarm_task = asyncio.create_task(audio_cache.prewarm())
+
+    async def synthesize_sentence(sentence: str) -> memoryview | None:
+        try:
+            return await audio_cache.synthesize(sentence)
+        except Exception as e:
+            print(f"\\nNiku (Audio Error): Error during text-to-speech conversion: {e}")
+            return None
+
+    # Per-stage latency tracing: NIKU_TRACE=1 records histograms, NIKU_TRACE_FILE adds a JSONL span log
+    tracer = Tracer(enabled=os.getenv("NIKU_TRACE", "0") != "0", trace_file=os.getenv("NIKU_TRACE_FILE"))
+    # get_time and identity_query are answered locally; short small talk goes to the small model
+    router = ModelRouter(
+        small_model=os.getenv("NIKU_SMALL_MODEL", SMALL_MODEL) or None, # Empty disables the small model
+        latency_budget=float(os.getenv("NIKU_LATENCY_BUDGET", str(DEFAULT_LATENCY_BUDGET))),
+    )
+    services = NikuServices(
+        None, # Set once engine_task completes, before the first turn
+        llm_cache=llm_cache,
+        speculate=os.getenv("NIKU_SPECULATE", "1") != "0",
+        synthesize=synthesize_sentence,
+        token_budget=int(os.getenv("NIKU_PROMPT_TOKENS", "1024")),
+        tracer=tracer,
+        recall=int(os.getenv("NIKU_RECALL", "3")),
+        router=router,
+    )
+    session = NikuSession(history_manager, services)
+
+    # Audio for turn N is produced in the background while the user types turn N+1
+    tts_worker = TTSWorker(services.synthesize, tracer=tracer)
+    interrupt_stale_audio = os.getenv("NIKU_INTERRUPT_AUDIO", "1") != "0"
+    if speech_source:
+        console = SpeechReader(
+            speech_source,
+            recognizer,
+            on_partial=services.prefetch_intent,
+            sample_rate=int(os.getenv("NIKU_SPEECH_SAMPLE_RATE", "16000")), # Of raw PCM; WAV headers override it
+            realtime=os.getenv("NIKU_SPEECH_REALTIME", "0") != "0",
+            tracer=tracer,
+        )
+    else:
+        console = ConsoleReader()
+
+    history_size = len(history_manager.history)
+    print(f"\\n--- Conversation History Loaded ({history_size} messages) ---")
+    for msg in history_manager.get_recent(RECENT_HISTORY_SHOWN):
         print(f"{msg['role'].capitalize()}: {msg['content']}")
     print("-----------------------------------\\n")
 
     while True:
-        user_input = input("You: ").strip()
+        user_input = await console.readline("You: ")
+        if user_input is None: # End of input (e.g. Ctrl-D)
+            user_input = "quit"
+        user_input = user_input.strip()
 
         if user_input.lower() == 'quit':
             print("Niku: Goodbye!")
@@ -62,117 +157,90 @@ async def main_loop():
         if not user_input:
             continue
 
-        history_manager.add_message("user", user_input)
-
-        # --- Intent Classification ---
-        print("\\nNiku (Decision Engine): Classifying intent...")
-        intent = decision_engine.classify_intent(user_input)
-        effective_intent_for_prompt = intent if intent and intent != "unknown_intent" else "general_chat"
-
-        if intent:
-            print(f"Niku (Decision Engine): Detected intent - {intent}")
-            history_manager.add_message("system", f"Detected user intent: {intent}") # Log intent
-        else:
-            print("Niku (Decision Engine): Could not determine intent or error occurred.")
-            history_manager.add_message("system", "Intent classification failed.") # Log failure
-
-        assistant_response = ""
-        # --- Tool Usage or LLM Response ---
-        if effective_intent_for_prompt == "get_weather":
-            print("\\\\nNiku (LLM for Tool Parameter Extraction): Determining location for weather tool...")
-            
-            # Define the tool and its required parameters for the LLM
-            tool_description_for_llm = {
-                "tool_name": "fetch_weather_data",
-                "description": "Fetches the current weather for a specified location.",
-                "parameters": {
-                    "location": {
-                        "type": "string",
-                        "description": "The city and state, or city and country for which to get the weather (e.g., 'San Francisco, CA', 'London, UK')."
-                    }
-                }
-            }
-            
-            # Construct a more specific prompt for parameter extraction
-            parameter_extraction_prompt = (
-                f"You need to determine the parameter for a tool based on the user's query.\\n"
-                f"Tool Name: {tool_description_for_llm['tool_name']}\\n"
-                f"Tool Description: {tool_description_for_llm['description']}\\n"
-                f"Parameter to Extract: 'location' ({tool_description_for_llm['parameters']['location']['description']})\\n\\n"
-                f"User Query: '{user_input}'\\n\\n"
-                f"Based on the user query, what is the value for the 'location' parameter? "
-                f"Respond with only the location name. If no specific location is clearly mentioned or inferable, respond with the exact word 'None'."
-            )
-            
-            extracted_location_raw = get_groq_completion(prompt=parameter_extraction_prompt)
-            extracted_location = extracted_location_raw.strip()
-            
-            history_manager.add_message("system", f"LLM (param_extraction) for 'fetch_weather_data' on query '{user_input}' -> extracted location: '{extracted_location}'")
-
-            if extracted_location and extracted_location.lower() != "none":
-                print(f"Niku (Tool): Using weather tool for '{extracted_location}'...")
-                assistant_response = fetch_weather_data(extracted_location) 
-                history_manager.add_message("system", f"Tool used: fetch_weather_data, input: {extracted_location}")
-            else:
-                assistant_response = "I can get the weather for you, but I need to know the city. Could you please tell me which city you're interested in?"
-                history_manager.add_message("system", "Weather tool skipped: No location identified by LLM for parameter extraction.")
-        else:
-            # --- Construct a prompt for Groq using recent history and intent ---
-            recent_history_messages = history_manager.get_history()[-5:] # Get last 5 messages (includes current user input)
-            
-            # Modify the latest user message in the history copy based on intent for the prompt
-            # This modification is only for the prompt, not for the stored history.
-            prompt_specific_messages = [msg.copy() for msg in recent_history_messages] # Create a deep copy for modification
-
-            if prompt_specific_messages and prompt_specific_messages[-1]["role"] == "user":
-                last_user_message_content = prompt_specific_messages[-1]["content"]
-                if effective_intent_for_prompt == "tell_joke":
-                    prompt_specific_messages[-1]["content"] = f"Tell a joke related to: {last_user_message_content}"
-                # Add more intent-specific prompt modifications here
-
-            conversation_str_prompt = "\\n".join([f"{m['role'].capitalize()}: {m['content']}" for m in prompt_specific_messages])
-            
-            # Optional: Add a system message based on intent at the beginning of the prompt string
-            system_prompt_prefix = ""
-            if effective_intent_for_prompt == "tell_joke":
-                system_prompt_prefix = "System: You are an AI that specializes in telling jokes. "
-            # ... add other system prefixes based on intent
-            
-            final_prompt_to_llm = f"{system_prompt_prefix}{conversation_str_prompt}"
-
-            print("\\nNiku is thinking...")
-            # print(f"DEBUG: Sending to LLM: {final_prompt_to_llm}") # For debugging the prompt
-            llm_response = get_groq_completion(prompt=final_prompt_to_llm)
-            if "Error:" in llm_response:
-                print(f"Niku (Error): {llm_response}")
-                history_manager.add_message("system", f"Error obtaining response from Groq: {llm_response}")
-                continue # Skip to next iteration if LLM fails
-            assistant_response = llm_response
-
-        print(f"Niku: {assistant_response}")
-        history_manager.add_message("assistant", assistant_response)
-
-        # Generate speech for the assistant's response
-        # Ensure 'audio_responses' directory exists
-        audio_dir = os.path.join(os.path.dirname(__file__), 'audio_responses')
-        os.makedirs(audio_dir, exist_ok=True)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_audio_file = os.path.join(audio_dir, f"niku_response_{timestamp}.mp3")
-        
-        print(f"Niku (Audio): Generating speech...")
-        audio_path = await text_to_speech(assistant_response, output_file=output_audio_file)
-
-        if "Error" not in audio_path:
-            print(f"Niku (Audio): Speech saved to: {audio_path}")
-            # Here you could add a command to play the audio if a player is available
-            # e.g., os.system(f"xdg-open {audio_path}") # For Linux
-            # e.g., os.system(f"start {audio_path}") # For Windows
-            # e.g., os.system(f"afplay {audio_path}") # For macOS
-        else:
-            print(f"Niku (Audio Error): {audio_path}")
+        if services.decision_engine is None:
+            try:
+                services.decision_engine = await engine_task
+            except ValueError as e:
+                print(f"Error initializing Decision Engine: {e}")
+                print("Please ensure COHERE_API_KEY is set in your .env file.")
+                break
+
+        if interrupt_stale_audio and tts_worker.cancel_pending():
+            print("Niku (Audio): Stopped speaking the previous reply.")
+
+        # Speech is synthesized by the background worker while the reply is still streaming
+        speech_job = None
+        output_audio_file = None
+        try:
+            async for event in session.respond(user_input):
+                if event.kind == "token":
+                    if speech_job is None:
+                        if save_audio:
+                            audio_dir = os.path.join(os.path.dirname(__file__), 'audio_responses')
+                            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                            output_audio_file = os.path.join(audio_dir, f"niku_response_{timestamp}.mp3")
+                        speech_job = SpeechJob(AudioOutput(player_command=audio_player_command, output_file=output_audio_file), trace=session.trace)
+                        await tts_worker.submit(speech_job)
+                        print("Niku: ", end="", flush=True)
+                    print(event.text, end="", flush=True)
+                    speech_job.feed(event.text)
+                elif event.kind == "done":
+                    if speech_job is None: # Empty reply
+                        print("Niku: ", end="")
+                    print()
+                elif event.kind == "intent":
+                    print(f"Niku (Decision Engine): Detected intent - {event.text} ({event.source}, confidence {event.data['confidence']:.2f})")
+                elif event.kind == "tool":
+                    print(f"Niku (Tool): {event.text}")
+                elif event.kind == "error":
+                    if speech_job is not None: # The reply was cut off; don't speak the rest of it
+                        tts_worker.cancel(speech_job)
+                        print()
+                    print(f"Niku (Error): {event.text}")
+                elif event.source:
+                    print(f"Niku ({event.source}): {event.text}")
+                else:
+                    print(event.text)
+        finally:
+            if speech_job is not None:
+                speech_job.finish()
+
+        if session.last_completion_stats is not None:
+            print(f"Niku (LLM): {session.last_completion_stats}")
+        if output_audio_file:
+            print(f"Niku (Audio): Speech will be saved to: {output_audio_file}")
 
         print("-----------------------------------\\n")
 
+    if speech_source:
+        await console.close()
+        if console.speech_input is not None:
+            print(f"Niku (Speech Input): {console.speech_input.stats}")
+    print("Niku (Audio): Finishing speech...")
+    await tts_worker.drain(timeout=30) # Let queued speech finish before exiting
+    prewarm_task.cancel()
+    warm_up_task.cancel()
+    if not engine_task.done():
+        engine_task.cancel()
+    elif not engine_task.cancelled():
+        engine_task.exception() # Already reported to the user, if it failed
+    print(f"Niku (Audio): TTS cache stats: {audio_cache.stats()}")
+    if services.decision_engine is not None:
+        print(f"Niku (Decision Engine): Stats: {services.decision_engine.get_stats()}")
+    print(f"Niku (Speculation): {services.speculation_stats}")
+    print(f"Niku (Router): {router}")
+    print(f"Niku (LLM): {completion_policy}")
+    if llm_cache is not None:
+        print(f"Niku (LLM): Completion cache stats: {llm_cache.stats()}")
+        llm_cache.close()
+    if tracer.enabled:
+        metrics_path = os.path.join(log_dir, 'niku_metrics.json')
+        tracer.dump_json(metrics_path)
+        print(f"Niku (Tracing): Stage latencies (also written to {metrics_path}):\n{tracer.summary()}")
+        tracer.close()
+    history_manager.close() # Flush any pending journal writes before exiting
+    await close_groq_clients()
+
 
 if __name__ == "__main__":
     try:
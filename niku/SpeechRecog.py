@@ -1 +1,719 @@
-# This is an test Speech Recognition Function that is a gemini all in one SpeechRecognition and TTS function
+"""
+Streaming speech input for Niku.
+
+Reads 16-bit PCM audio (raw or WAV) from a file, a pipe or a TCP socket, splits
+it into utterances with a lightweight voice-activity detector and sends each
+utterance to a pluggable recognizer. While the speaker is still talking the
+recognizer is asked for partial transcripts, so the turn pipeline can start
+classifying the intent before the utterance ends.
+
+Sources:
+    recording.wav / audio.pcm   A file (WAV is detected from its header)
+    -                           Standard input, e.g. `arecord -f S16_LE -r 16000 -c 1 | ...`
+    tcp://host:port             A TCP server streaming audio
+
+Run from the repository root to print the transcripts of a recording:
+    python -m niku.SpeechRecog recording.wav --transcripts "hello there" "what time is it"
+"""
+import argparse
+import asyncio
+import contextlib
+import importlib
+import logging
+import struct
+import sys
+import time
+from abc import ABC, abstractmethod
+from collections.abc import AsyncIterator, Callable
+from typing import Any
+from urllib.parse import urlparse
+
+import numpy as np
+
+from niku.tracing import Tracer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SAMPLE_RATE = 16000
+FRAME_MS = 20 # Analysis frame of the voice-activity detector
+READ_SIZE = 8192 # Bytes requested from the source at a time
+PARTIAL_INTERVAL_MS = 400 # Audio between partial transcript requests
+
+_WAVE_FORMAT_PCM = 1
+_WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+class AudioSource:
+    """
+    A stream of 16-bit little-endian PCM audio from a file, a pipe or a socket,
+    delivered as mono float32 frames in [-1, 1].
+
+    WAV input is recognized by its RIFF header, whose format overrides the
+    sample rate and channel count given for raw PCM.
+    """
+    def __init__(self, read: Callable[[int], Any], close: Callable[[], Any], sample_rate: int = DEFAULT_SAMPLE_RATE,
+                 channels: int = 1, name: str = "audio"):
+        """
+        Initializes the AudioSource; use `AudioSource.open` for the usual sources.
+
+        Args:
+            read: Coroutine function returning up to n bytes, or b"" at the end of the stream.
+            close: Releases the underlying file or connection; may be a coroutine function.
+            sample_rate: Sample rate of raw PCM input.
+            channels: Interleaved channels of raw PCM input; they are averaged to mono.
+            name: Shown in error messages.
+        """
+        self._read = read
+        self._close = close
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.name = name
+        self.is_wav = False
+        self._pending = bytearray()
+        self._header_read = False
+        self._remaining: int | None = None # Bytes left in a WAV data chunk; None for raw or streamed WAV
+
+    @classmethod
+    async def open(cls, spec: str, sample_rate: int = DEFAULT_SAMPLE_RATE, channels: int = 1) -> "AudioSource":
+        """
+        Opens a file path, "-" for standard input, or "tcp://host:port".
+        """
+        if spec.startswith("tcp://"):
+            address = urlparse(spec)
+            reader, writer = await asyncio.open_connection(address.hostname, address.port)
+
+            async def close_connection():
+                writer.close()
+                with contextlib.suppress(ConnectionError):
+                    await writer.wait_closed()
+            source = cls(reader.read, close_connection, sample_rate, channels, name=spec)
+        else:
+            stream = sys.stdin.buffer if spec == "-" else open(spec, 'rb')
+            # Blocking reads run in a thread so a slow pipe never stalls the event loop
+            source = cls(lambda n: asyncio.to_thread(stream.read1, n),
+                         (lambda: None) if spec == "-" else stream.close, sample_rate, channels, name=spec)
+        try:
+            await source._read_header()
+        except BaseException:
+            await source.close()
+            raise
+        return source
+
+    async def _read_exactly(self, n: int) -> bytes:
+        """Reads n bytes, or fewer only at the end of the stream."""
+        while len(self._pending) < n:
+            chunk = await self._read(max(READ_SIZE, n - len(self._pending)))
+            if not chunk:
+                break
+            self._pending += chunk
+        data = bytes(self._pending[:n])
+        del self._pending[:n]
+        return data
+
+    async def _read_header(self):
+        """Parses a WAV header if there is one; raw PCM is left untouched."""
+        if self._header_read:
+            return
+        self._header_read = True
+        riff = await self._read_exactly(12)
+        if len(riff) < 12 or riff[:4] != b"RIFF" or riff[8:12] != b"WAVE":
+            self._pending[:0] = riff # Raw PCM; put the bytes back
+            return
+        fmt = None
+        while True:
+            header = await self._read_exactly(8)
+            if len(header) < 8:
+                raise ValueError(f"{self.name}: WAV file has no data chunk.")
+            chunk_id, size = header[:4], int.from_bytes(header[4:], 'little')
+            if chunk_id == b"data":
+                if 0 < size < 0xFFFFFFFF: # Streaming writers leave the size 0 or at its maximum
+                    self._remaining = size
+                break
+            body = await self._read_exactly(size + size % 2) # Chunks are padded to even sizes
+            if chunk_id == b"fmt ":
+                fmt = body
+        if fmt is None or len(fmt) < 16:
+            raise ValueError(f"{self.name}: WAV file has no format chunk.")
+        audio_format, channels, sample_rate, _, _, bits = struct.unpack("<HHIIHH", fmt[:16])
+        if audio_format == _WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+            audio_format = struct.unpack("<H", fmt[24:26])[0]
+        if audio_format != _WAVE_FORMAT_PCM or bits != 16:
+            raise ValueError(f"{self.name}: only 16-bit PCM WAV audio is supported.")
+        self.is_wav = True
+        self.sample_rate = sample_rate
+        self.channels = channels
+
+    async def frames(self, frame_samples: int, realtime: bool = False) -> AsyncIterator[np.ndarray]:
+        """
+        Yields mono float32 frames of exactly `frame_samples` samples; a final
+        partial frame is padded with silence.
+
+        Args:
+            frame_samples: Samples per frame at the source's sample rate.
+            realtime: Pace the frames at the audio's own speed, to replay a
+                      recording as if it were a live microphone.
+        """
+        await self._read_header()
+        frame_bytes = frame_samples * self.channels * 2
+        started = time.perf_counter()
+        position = 0
+        while True:
+            data = await self._read_exactly(frame_bytes if self._remaining is None else min(frame_bytes, self._remaining))
+            if not data:
+                return
+            if self._remaining is not None:
+                self._remaining -= len(data)
+            data = data[:len(data) - len(data) % (2 * self.channels)] # Drop a torn last sample
+            samples = np.frombuffer(data, dtype="<i2").reshape(-1, self.channels)
+            frame = (samples.mean(axis=1) if self.channels > 1 else samples[:, 0]).astype(np.float32) / 32768.0
+            if len(frame) < frame_samples:
+                frame = np.pad(frame, (0, frame_samples - len(frame)))
+            if realtime:
+                await asyncio.sleep(max(0.0, started + position / self.sample_rate - time.perf_counter()))
+            position += frame_samples
+            yield frame
+            if len(data) < frame_bytes:
+                return
+
+    async def close(self):
+        result = self._close()
+        if asyncio.iscoroutine(result):
+            await result
+
+
+class RingBuffer:
+    """
+    Fixed-capacity float32 sample buffer addressed by absolute sample position,
+    holding the most recent `capacity` samples.
+    """
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.end = 0 # Samples ever written
+        self._data = np.zeros(capacity, dtype=np.float32)
+
+    @property
+    def start(self) -> int:
+        """Position of the oldest sample still held."""
+        return max(0, self.end - self.capacity)
+
+    def write(self, samples: np.ndarray):
+        samples = samples[-self.capacity:]
+        offset = self.end % self.capacity
+        first = min(len(samples), self.capacity - offset)
+        self._data[offset:offset + first] = samples[:first]
+        self._data[:len(samples) - first] = samples[first:]
+        self.end += len(samples)
+
+    def read(self, begin: int, end: int | None = None) -> np.ndarray:
+        """Copies the samples from position `begin` up to `end` (clamped to what is held)."""
+        begin = max(begin, self.start)
+        end = self.end if end is None else min(end, self.end)
+        if end <= begin:
+            return np.zeros(0, dtype=np.float32)
+        first, last = begin % self.capacity, end % self.capacity
+        if first < last:
+            return self._data[first:last].copy()
+        return np.concatenate((self._data[first:], self._data[:last]))
+
+
+class VoiceActivityDetector:
+    """
+    Classifies frames as speech or not from their short-time energy and
+    zero-crossing rate, relative to an adaptive noise floor.
+
+    A frame is speech if its RMS energy is well above the noise floor and its
+    zero-crossing rate is that of voiced sound, or if it is loud enough that
+    the zero-crossing rate does not matter (fricatives within speech). The
+    noise floor follows the energy of non-speech frames, falling quickly and
+    rising slowly, so input is expected to start with a moment of silence.
+    """
+    def __init__(self, energy_ratio: float = 2.0, min_energy: float = 0.003, max_zcr: float = 0.3,
+                 noise_adaptation: float = 0.05):
+        """
+        Initializes the VoiceActivityDetector.
+
+        Args:
+            energy_ratio: Speech must be this many times louder (RMS) than the noise floor.
+            min_energy: Absolute RMS threshold, so digital silence does not make every sound speech.
+            max_zcr: Highest zero-crossing rate (crossings per sample) of voiced frames.
+            noise_adaptation: Weight of a non-speech frame in the rising noise floor.
+        """
+        self.energy_ratio = energy_ratio
+        self.min_energy = min_energy
+        self.max_zcr = max_zcr
+        self.noise_adaptation = noise_adaptation
+        self.noise_floor: float | None = None
+
+    @staticmethod
+    def features(frame: np.ndarray) -> tuple[float, float]:
+        """RMS energy and zero-crossing rate of a frame."""
+        rms = float(np.sqrt(np.mean(np.square(frame))))
+        zcr = np.count_nonzero(np.diff(np.signbit(frame))) / len(frame)
+        return rms, zcr
+
+    def is_speech(self, frame: np.ndarray) -> bool:
+        rms, zcr = self.features(frame)
+        if self.noise_floor is None:
+            self.noise_floor = rms
+        threshold = max(self.min_energy, self.noise_floor * self.energy_ratio)
+        speech = rms > 2 * threshold or (rms > threshold and zcr <= self.max_zcr)
+        if not speech:
+            weight = 4 * self.noise_adaptation if rms < self.noise_floor else self.noise_adaptation
+            self.noise_floor += weight * (rms - self.noise_floor)
+        return speech
+
+
+class UtteranceSegmenter:
+    """
+    Turns a stream of frames into utterances: speech starts after `start_ms` of
+    consecutive speech frames and ends after `end_ms` of silence (or at
+    `max_utterance_ms`). The audio is kept in a ring buffer, so an utterance
+    includes `pad_ms` of audio before its detected start and after its end.
+    """
+    def __init__(self, sample_rate: int, frame_ms: int = FRAME_MS, vad: VoiceActivityDetector | None = None,
+                 start_ms: int = 60, end_ms: int = 500, pad_ms: int = 200, min_utterance_ms: int = 200,
+                 max_utterance_ms: int = 15000):
+        """
+        Initializes the UtteranceSegmenter.
+
+        Args:
+            sample_rate: Samples per second of the frames.
+            frame_ms: Length of each frame passed to `push`.
+            vad: Frame classifier; one with default settings if None.
+            start_ms: Speech needed to start an utterance (shorter sounds are ignored).
+            end_ms: Silence that ends an utterance; the main latency/accuracy trade-off.
+            pad_ms: Audio kept before the start and after the end of the speech.
+            min_utterance_ms: Shorter utterances are discarded as noise.
+            max_utterance_ms: Utterances are cut at this length.
+        """
+        self.sample_rate = sample_rate
+        self.frame_samples = sample_rate * frame_ms // 1000
+        self.vad = vad or VoiceActivityDetector()
+        self.start_frames = max(1, start_ms // frame_ms)
+        self.end_frames = max(1, end_ms // frame_ms)
+        self.pad = sample_rate * pad_ms // 1000
+        self.min_utterance = sample_rate * min_utterance_ms // 1000
+        self.max_utterance = sample_rate * max_utterance_ms // 1000
+        self.ring = RingBuffer(self.max_utterance + 2 * self.pad + self.frame_samples)
+        self.start: int | None = None # Start of the current utterance, while one is open
+        self.utterance: tuple[int, int] | None = None # Bounds of the last completed utterance
+        self._speech_run = 0
+        self._silence_run = 0
+        self._speech_begin = 0 # First frame of the current run of speech
+        self._speech_end = 0 # End of the last speech frame
+
+    @property
+    def position(self) -> int:
+        return self.ring.end
+
+    @property
+    def in_utterance(self) -> bool:
+        return self.start is not None
+
+    def push(self, frame: np.ndarray) -> str | None:
+        """
+        Adds one frame.
+
+        Returns:
+            "start" when an utterance begins, "end" when one is complete (its
+            bounds are in `utterance`), "discard" when one turned out too short,
+            or None.
+        """
+        frame_start = self.position
+        self.ring.write(frame)
+        speech = self.vad.is_speech(frame)
+        if self.start is None:
+            if not speech:
+                self._speech_run = 0
+                return None
+            if self._speech_run == 0:
+                self._speech_begin = frame_start
+            self._speech_run += 1
+            self._speech_end = self.position
+            if self._speech_run < self.start_frames:
+                return None
+            self.start = max(self.ring.start, self._speech_begin - self.pad)
+            self._silence_run = 0
+            return "start"
+        if speech:
+            self._silence_run = 0
+            self._speech_end = self.position
+        else:
+            self._silence_run += 1
+        if self._silence_run >= self.end_frames or self.position - self.start >= self.max_utterance:
+            return self._close()
+        return None
+
+    def flush(self) -> str | None:
+        """Ends the open utterance, if any, at the end of the input."""
+        return self._close() if self.start is not None else None
+
+    def _close(self) -> str:
+        start, end = self.start, min(self.position, self._speech_end + self.pad)
+        self.start = None
+        self._speech_run = 0
+        if self._speech_end - self._speech_begin < self.min_utterance:
+            return "discard"
+        self.utterance = (start, end)
+        return "end"
+
+    def audio(self, begin: int | None = None, end: int | None = None) -> np.ndarray:
+        """Samples of the open utterance so far, or of the given bounds."""
+        return self.ring.read(self.start if begin is None else begin, end)
+
+
+class RecognitionStream(ABC):
+    """
+    Recognition of one utterance. Engines that stream keep their state here.
+    """
+    async def partial(self, audio: np.ndarray) -> str | None:
+        """
+        Returns a transcript of the utterance so far, or None if there is none
+        yet. `audio` is everything since the utterance began; engines without
+        partial results keep this default.
+        """
+        return None
+
+    @abstractmethod
+    async def finish(self, audio: np.ndarray) -> str:
+        """Returns the final transcript of the complete utterance."""
+
+
+class Recognizer(ABC):
+    """
+    Speech-to-text engine: starts one RecognitionStream per utterance.
+    Implementations are plugged in by import path (see load_recognizer).
+    """
+    @abstractmethod
+    def start(self, sample_rate: int) -> RecognitionStream:
+        """Starts recognizing a new utterance of audio at `sample_rate`."""
+
+
+class _StubStream(RecognitionStream):
+    def __init__(self, recognizer: "StubRecognizer", index: int, sample_rate: int):
+        self.recognizer = recognizer
+        self.index = index
+        self.sample_rate = sample_rate
+
+    @property
+    def script(self) -> str | None:
+        transcripts = self.recognizer.transcripts
+        return transcripts[self.index] if self.index < len(transcripts) else None
+
+    async def partial(self, audio: np.ndarray) -> str | None:
+        if self.recognizer.delay:
+            await asyncio.sleep(self.recognizer.delay)
+        if self.script is None:
+            return None
+        shown = int(len(audio) / self.sample_rate * self.recognizer.words_per_second)
+        return " ".join(self.script.split()[:shown]) or None
+
+    async def finish(self, audio: np.ndarray) -> str:
+        if self.recognizer.delay:
+            await asyncio.sleep(self.recognizer.delay)
+        if self.script is None:
+            return f"[utterance {self.index + 1}, {len(audio) / self.sample_rate:.1f} s]"
+        return self.script
+
+
+class StubRecognizer(Recognizer):
+    """
+    Offline stand-in for a speech-to-text engine: returns scripted transcripts
+    in utterance order, revealed word by word as partials at a speaking rate,
+    and describes utterances beyond the script by their duration (without partials).
+    """
+    def __init__(self, transcripts: list[str] | None = None, words_per_second: float = 2.5, delay: float = 0.0):
+        """
+        Initializes the StubRecognizer.
+
+        Args:
+            transcripts: Transcript of each utterance, in order.
+            words_per_second: Speaking rate at which partials reveal words.
+            delay: Seconds each recognition call takes, to simulate a real engine.
+        """
+        self.transcripts = transcripts or []
+        self.words_per_second = words_per_second
+        self.delay = delay
+        self.utterances = 0
+
+    def start(self, sample_rate: int) -> RecognitionStream:
+        stream = _StubStream(self, self.utterances, sample_rate)
+        self.utterances += 1
+        return stream
+
+
+def load_recognizer(spec: str) -> Recognizer:
+    """
+    Creates a recognizer from "stub" or an import path "package.module:factory",
+    where the factory is called without arguments (a Recognizer class works).
+    Raises TypeError if the factory returns anything but a Recognizer.
+    """
+    if spec == "stub":
+        return StubRecognizer()
+    module_name, _, attribute = spec.partition(":")
+    if not attribute:
+        raise ValueError(f"Recognizer must be 'stub' or 'module:factory', not {spec!r}.")
+    recognizer = getattr(importlib.import_module(module_name), attribute)()
+    if not isinstance(recognizer, Recognizer):
+        raise TypeError(f"{spec} returned {type(recognizer).__name__}, not a Recognizer.")
+    return recognizer
+
+
+class Transcript:
+    """
+    A partial or final transcript of one utterance.
+    """
+    def __init__(self, text: str, final: bool, utterance: int, start: float, end: float,
+                 latency: float | None = None):
+        self.text = text
+        self.final = final
+        self.utterance = utterance # Index of the utterance in the stream
+        self.start = start # Seconds into the audio where the utterance starts
+        self.end = end # Seconds into the audio covered by this transcript
+        self.latency = latency # Seconds the recognizer took after the audio was available
+
+    def to_dict(self) -> dict:
+        return dict(vars(self))
+
+    def __repr__(self) -> str:
+        kind = "final" if self.final else "partial"
+        return f"Transcript({kind} #{self.utterance} {self.start:.2f}-{self.end:.2f}s: {self.text!r})"
+
+
+class SpeechInputStats:
+    """
+    Counters of one SpeechInput run.
+    """
+    def __init__(self):
+        self.audio_seconds = 0.0
+        self.utterances = 0
+        self.discarded = 0
+        self.partials = 0
+        self.partial_errors = 0 # Partial transcripts that raised; the final transcript is still attempted
+        self.processing_seconds = 0.0 # Wall time spent reading and segmenting
+
+    def to_dict(self) -> dict:
+        return dict(vars(self))
+
+    def __repr__(self) -> str:
+        speed = self.audio_seconds / self.processing_seconds if self.processing_seconds else 0.0
+        return (f"SpeechInputStats(audio={self.audio_seconds:.1f} s, utterances={self.utterances}, "
+                f"discarded={self.discarded}, partials={self.partials}, {speed:.0f}x realtime)")
+
+
+class SpeechInput:
+    """
+    Segments an AudioSource into utterances and transcribes them, yielding
+    partial transcripts while an utterance is in progress and a final one when
+    it ends.
+
+    Audio keeps being read and segmented while transcripts wait to be consumed,
+    so speech captured while Niku is busy is queued rather than lost. Partial
+    recognition runs in the background and is skipped while the previous
+    partial request is still running, so a slow recognizer never delays
+    end-of-speech detection.
+    """
+    def __init__(self, source: AudioSource, recognizer: Recognizer, segmenter: UtteranceSegmenter | None = None,
+                 partial_interval_ms: int = PARTIAL_INTERVAL_MS, realtime: bool = False, tracer: Tracer | None = None):
+        """
+        Initializes the SpeechInput.
+
+        Args:
+            source: Opened audio source.
+            recognizer: Speech-to-text engine.
+            segmenter: Utterance segmenter for the source's sample rate; one with
+                       default settings if None.
+            partial_interval_ms: Audio between partial transcript requests (0 disables partials).
+            realtime: Pace file input at the audio's own speed.
+            tracer: Optional. Records recognition latency as the "speech_recognition" stage.
+        """
+        self.source = source
+        self.recognizer = recognizer
+        self.segmenter = segmenter or UtteranceSegmenter(source.sample_rate)
+        self.partial_interval = source.sample_rate * partial_interval_ms // 1000
+        self.realtime = realtime
+        self.tracer = tracer or Tracer(enabled=False)
+        self.stats = SpeechInputStats()
+        self._last_partial = "" # Partial transcript last reported for the open utterance
+
+    async def transcripts(self) -> AsyncIterator[Transcript]:
+        """Yields transcripts in order until the audio ends."""
+        queue: asyncio.Queue = asyncio.Queue()
+        reader = asyncio.create_task(self._run(queue))
+        try:
+            while (item := await queue.get()) is not None:
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            reader.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await reader
+
+    def _seconds(self, position: int) -> float:
+        return position / self.source.sample_rate
+
+    async def _partial(self, stream: RecognitionStream, index: int, start: int, audio: np.ndarray, queue: asyncio.Queue):
+        text = await stream.partial(audio)
+        if text and text != self._last_partial:
+            self._last_partial = text
+            self.stats.partials += 1
+            queue.put_nowait(Transcript(text, False, index, self._seconds(start), self._seconds(start + len(audio))))
+
+    def _partial_done(self, task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            self.stats.partial_errors += 1
+            logger.warning("Partial transcript failed: %r", task.exception())
+
+    async def _finish(self, stream: RecognitionStream, index: int, bounds: tuple[int, int], queue: asyncio.Queue):
+        audio = self.segmenter.audio(*bounds)
+        started = time.perf_counter()
+        text = await stream.finish(audio)
+        latency = time.perf_counter() - started
+        self.tracer.record("speech_recognition", latency)
+        queue.put_nowait(Transcript(text, True, index, self._seconds(bounds[0]), self._seconds(bounds[1]), latency))
+
+    async def _run(self, queue: asyncio.Queue):
+        segmenter = self.segmenter
+        stream = partial_task = None
+        next_partial = 0
+        started = time.perf_counter()
+        try:
+            async for frame in self.source.frames(segmenter.frame_samples, self.realtime):
+                event = segmenter.push(frame)
+                if event == "start":
+                    stream = self.recognizer.start(self.source.sample_rate)
+                    self._last_partial = ""
+                    next_partial = segmenter.start + self.partial_interval
+                elif event is not None:
+                    await self._end_utterance(event, stream, partial_task, queue)
+                    stream = partial_task = None
+                elif (segmenter.in_utterance and self.partial_interval and segmenter.position >= next_partial
+                      and (partial_task is None or partial_task.done())):
+                    next_partial = segmenter.position + self.partial_interval
+                    partial_task = asyncio.create_task(self._partial(
+                        stream, self.stats.utterances, segmenter.start, segmenter.audio(), queue))
+                    partial_task.add_done_callback(self._partial_done)
+            event = segmenter.flush()
+            if event is not None:
+                await self._end_utterance(event, stream, partial_task, queue)
+            self.stats.audio_seconds = self._seconds(segmenter.position)
+            self.stats.processing_seconds = time.perf_counter() - started
+            queue.put_nowait(None)
+        except Exception as e:
+            queue.put_nowait(e)
+        finally:
+            await self.source.close()
+
+    async def _end_utterance(self, event: str, stream: RecognitionStream, partial_task: asyncio.Task | None,
+                             queue: asyncio.Queue):
+        if partial_task is not None and not partial_task.done():
+            partial_task.cancel() # A partial must not arrive after the final transcript
+        if event == "discard":
+            self.stats.discarded += 1
+            return
+        await self._finish(stream, self.stats.utterances, self.segmenter.utterance, queue)
+        self.stats.utterances += 1
+
+
+class SpeechReader:
+    """
+    Drop-in replacement for ConsoleReader whose lines are the final transcripts
+    of spoken utterances.
+
+    Partial transcripts are shown on the prompt line as they arrive and passed
+    to `on_partial` (e.g. NikuServices.prefetch_intent).
+    """
+    def __init__(self, spec: str, recognizer: Recognizer, on_partial: Callable[[str], Any] | None = None,
+                 sample_rate: int = DEFAULT_SAMPLE_RATE, channels: int = 1, realtime: bool = False,
+                 tracer: Tracer | None = None):
+        """
+        Initializes the SpeechReader.
+
+        Args:
+            spec: Audio source: a file path, "-" for standard input or "tcp://host:port".
+            recognizer: Speech-to-text engine.
+            on_partial: Optional. Called with each partial transcript.
+            sample_rate: Sample rate of raw PCM input.
+            channels: Channels of raw PCM input.
+            realtime: Pace file input at the audio's own speed.
+            tracer: Optional. Records recognition latency.
+        """
+        self.spec = spec
+        self.recognizer = recognizer
+        self.on_partial = on_partial
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.realtime = realtime
+        self.tracer = tracer
+        self.speech_input: SpeechInput | None = None
+        self._transcripts: AsyncIterator[Transcript] | None = None
+        self._ended = False
+
+    async def readline(self, prompt: str = "") -> str | None:
+        """
+        Waits for the next complete utterance.
+
+        Returns:
+            Its transcript, or None once the audio has ended.
+        """
+        if self._ended:
+            return None
+        if self._transcripts is None:
+            try:
+                source = await AudioSource.open(self.spec, self.sample_rate, self.channels)
+            except (OSError, ValueError) as e:
+                print(f"Niku (Speech Input): Could not read audio from {self.spec}: {e}")
+                self._ended = True
+                return None
+            self.speech_input = SpeechInput(source, self.recognizer, realtime=self.realtime, tracer=self.tracer)
+            self._transcripts = self.speech_input.transcripts()
+        if prompt:
+            print(prompt, end="", flush=True)
+        shown = 0
+        while True:
+            transcript = await anext(self._transcripts, None)
+            if transcript is None:
+                self._ended = True
+                print()
+                return None
+            # Overwrite the previous partial on the prompt line
+            text = transcript.text if transcript.final else transcript.text + "..."
+            print(f"\r{prompt}{text}{' ' * max(0, shown - len(text))}", end="" if not transcript.final else "\n", flush=True)
+            shown = len(text)
+            if transcript.final:
+                return transcript.text
+            if self.on_partial is not None:
+                self.on_partial(transcript.text)
+
+    async def close(self):
+        if self._transcripts is not None:
+            await self._transcripts.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", help='WAV or raw PCM file, "-" for standard input, or tcp://host:port')
+    parser.add_argument("--sample-rate", type=int, default=DEFAULT_SAMPLE_RATE, help="Sample rate of raw PCM input")
+    parser.add_argument("--channels", type=int, default=1, help="Channels of raw PCM input")
+    parser.add_argument("--recognizer", default="stub", help='"stub" or an import path "module:factory"')
+    parser.add_argument("--transcripts", nargs="*", help="Scripted transcripts for the stub recognizer")
+    parser.add_argument("--end-ms", type=int, default=500, help="Silence that ends an utterance")
+    parser.add_argument("--realtime", action="store_true", help="Replay files at the audio's own speed")
+    args = parser.parse_args()
+
+    recognizer = StubRecognizer(args.transcripts) if args.recognizer == "stub" else load_recognizer(args.recognizer)
+
+    async def run():
+        source = await AudioSource.open(args.source, args.sample_rate, args.channels)
+        speech_input = SpeechInput(source, recognizer, UtteranceSegmenter(source.sample_rate, end_ms=args.end_ms),
+                                   realtime=args.realtime)
+        async for transcript in speech_input.transcripts():
+            print(transcript)
+        print(speech_input.stats)
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
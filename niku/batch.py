@@ -0,0 +1,288 @@
+"""
+Batch mode: runs a JSONL file of conversations through the Niku turn pipeline.
+
+Each input line is one conversation:
+    {"id": "conv-1", "turns": ["Hello!", "What's the weather in Paris?"]}
+Turns may also be objects with a "text" field; "id" is optional.
+
+Conversations run concurrently (up to --workers at a time), while the turns of
+one conversation run in order against that conversation's own history. Output
+is JSONL written as results arrive: a "turn" record per turn with the reply and
+per-stage timings, and a "conversation" record once a conversation is complete.
+
+The output file is also the checkpoint. With --resume, conversations that
+already have a "conversation" record are skipped, and turn records of
+conversations that were cut off are dropped and those conversations run again.
+
+Run from the repository root:
+    python -m niku.batch queries.jsonl --output logs/batch_results.jsonl --workers 16
+    python -m niku.batch queries.jsonl --output logs/batch_results.jsonl --resume
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections.abc import Iterator
+
+from niku.memory_manager import ConversationHistory
+from niku.session import NikuServices, NikuSession
+from niku.tracing import Tracer
+
+DEFAULT_WORKERS = 8
+PROGRESS_INTERVAL = 5.0 # Seconds between progress lines on stderr
+
+
+class Conversation:
+    """
+    One input record: its position in the input file, id and user turns.
+    """
+    def __init__(self, line: int, conversation_id: str, turns: list[str], error: str | None = None):
+        self.line = line
+        self.conversation_id = conversation_id
+        self.turns = turns
+        self.error = error # Why the record could not be read, if it could not
+
+
+def parse_conversation(line_number: int, line: str) -> Conversation:
+    """Reads one input line; malformed records become conversations carrying an error."""
+    try:
+        record = json.loads(line)
+        turns = [turn["text"] if isinstance(turn, dict) else turn for turn in record["turns"]]
+        if not all(isinstance(turn, str) for turn in turns):
+            raise ValueError("every turn must be a string or an object with a \"text\" string")
+        return Conversation(line_number, str(record.get("id", line_number)), turns)
+    except (ValueError, KeyError, TypeError) as e:
+        return Conversation(line_number, str(line_number), [], error=f"Invalid record: {e}")
+
+def read_conversations(path: str, skip: set[int]) -> Iterator[Conversation]:
+    """Yields the conversations of an input file lazily, leaving out the line numbers in `skip`."""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, start=1):
+            if line.strip() and line_number not in skip:
+                yield parse_conversation(line_number, line)
+
+def load_checkpoint(output_file: str) -> set[int]:
+    """
+    Prepares an existing output file for resuming.
+
+    Keeps the records of completed conversations, drops those of conversations
+    that were cut off (and any partly written last line), and rewrites the file
+    if anything was dropped.
+
+    Returns:
+        Input line numbers of the completed conversations.
+    """
+    if not os.path.exists(output_file):
+        return set()
+    completed = set()
+    with open(output_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("type") == "conversation":
+                completed.add(record["line"])
+    kept_file = output_file + ".resume"
+    dropped = 0
+    with open(output_file, 'r', encoding='utf-8') as source, open(kept_file, 'w', encoding='utf-8') as kept:
+        for line in source:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                dropped += 1
+                continue
+            if record.get("line") in completed:
+                kept.write(line)
+            else:
+                dropped += 1
+    if dropped:
+        os.replace(kept_file, output_file)
+    else:
+        os.remove(kept_file)
+    return completed
+
+
+class BatchRunner:
+    """
+    Runs conversations through NikuSession with a bounded number of workers and
+    streams the results to a JSONL file.
+
+    Conversations are replayed from scratch, so each one's history is kept in
+    memory and dropped when it completes.
+    """
+    def __init__(self, services: NikuServices, output, workers: int = DEFAULT_WORKERS):
+        """
+        Initializes the BatchRunner.
+
+        Args:
+            services: Shared clients and caches used by every conversation.
+            output: Text file the JSONL results are appended to.
+            workers: Conversations processed at the same time.
+        """
+        self.services = services
+        self.output = output
+        self.workers = workers
+        self.conversations = 0
+        self.turns = 0
+        self.errors = 0
+        self.started = time.perf_counter()
+
+    def _write(self, record: dict):
+        self.output.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    async def run_turn(self, session: NikuSession, conversation: Conversation, index: int, user_input: str) -> dict:
+        """Runs one turn and returns its result record."""
+        started = time.perf_counter()
+        first_token = None
+        record = {"type": "turn", "line": conversation.line, "id": conversation.conversation_id, "turn": index,
+                  "input": user_input, "reply": None, "intent": None, "tools": [], "model": None, "error": None}
+        async for event in session.respond(user_input):
+            if event.kind == "intent":
+                record["intent"] = event.text
+                record["intent_source"] = event.source
+            elif event.kind == "tool":
+                record["tools"].append(event.source)
+            elif event.kind == "token" and first_token is None:
+                first_token = time.perf_counter() - started
+            elif event.kind == "done":
+                record["reply"] = event.text
+            elif event.kind == "error":
+                record["error"] = event.text
+        completion = session.last_completion_stats
+        if completion is not None:
+            record["model"] = completion.model
+            record["cached"] = completion.cached
+        record["timings_ms"] = {
+            "turn": round((time.perf_counter() - started) * 1000, 3),
+            "first_token": round(first_token * 1000, 3) if first_token is not None else None,
+            **({name: round(seconds * 1000, 3) for name, seconds in session.trace.stages.items()} if session.trace else {}),
+        }
+        return record
+
+    async def run_conversation(self, conversation: Conversation):
+        """Runs the turns of one conversation in order, writing each result as it completes."""
+        started = time.perf_counter()
+        errors = 0
+        if conversation.error is None:
+            session_id = f"{conversation.line}:{conversation.conversation_id}"
+            history = ConversationHistory(log_file=None)
+            session = NikuSession(history, self.services, session_id)
+            try:
+                for index, user_input in enumerate(conversation.turns):
+                    try:
+                        record = await self.run_turn(session, conversation, index, user_input)
+                    except Exception as e:
+                        record = {"type": "turn", "line": conversation.line, "id": conversation.conversation_id,
+                                  "turn": index, "input": user_input, "error": f"{type(e).__name__}: {e}"}
+                    errors += record["error"] is not None
+                    self.turns += 1
+                    self._write(record)
+            finally:
+                history.close()
+        else:
+            errors = 1
+        self.errors += errors
+        self.conversations += 1
+        self._write({"type": "conversation", "line": conversation.line, "id": conversation.conversation_id,
+                     "turns": len(conversation.turns), "errors": errors, "error": conversation.error,
+                     "duration_ms": round((time.perf_counter() - started) * 1000, 3)})
+        self.output.flush() # The conversation record is the checkpoint
+
+    async def run(self, conversations: Iterator[Conversation]):
+        """
+        Processes every conversation, reading the input only as fast as workers
+        become free.
+        """
+        queue: asyncio.Queue[Conversation | None] = asyncio.Queue(maxsize=2 * self.workers)
+
+        async def produce():
+            for conversation in conversations:
+                await queue.put(conversation)
+            for _ in range(self.workers):
+                await queue.put(None)
+
+        async def worker():
+            while (conversation := await queue.get()) is not None:
+                await self.run_conversation(conversation)
+
+        async def report_progress():
+            while True:
+                await asyncio.sleep(PROGRESS_INTERVAL)
+                print(self.progress(), file=sys.stderr)
+
+        # If a worker fails, gather raises at once and the rest are cancelled rather
+        # than leaving the producer blocked on a full queue
+        tasks = [asyncio.create_task(produce())] + [asyncio.create_task(worker()) for _ in range(self.workers)]
+        reporter = asyncio.create_task(report_progress())
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            reporter.cancel()
+            for task in tasks:
+                task.cancel()
+            self.output.flush()
+
+    def progress(self) -> str:
+        elapsed = time.perf_counter() - self.started
+        return (f"{self.conversations} conversations, {self.turns} turns, {self.errors} errors in {elapsed:.1f} s "
+                f"({self.turns / elapsed if elapsed else 0.0:.1f} turns/sec)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSONL file with one conversation per line")
+    parser.add_argument("--output", required=True, help="JSONL file the results are written to")
+    parser.add_argument("--resume", action="store_true", help="Skip conversations already completed in --output")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Conversations processed at the same time")
+    parser.add_argument("--log-dir", default="logs", help="Directory holding the completion cache")
+    parser.add_argument("--no-llm-cache", action="store_true", help="Always call the model, e.g. when evaluating prompt changes")
+    parser.add_argument("--trace-file", help="Append every span and turn summary to this JSONL file")
+    args = parser.parse_args()
+
+    from niku.env import load_env
+    from niku.groq_client import close_clients
+    from niku.server import build_services
+
+    load_env()
+    if not os.getenv("GROQ_API_KEY"):
+        print("Error: GROQ_API_KEY not found in environment variables. Please set it in a .env file.")
+        return
+    if not args.resume and os.path.exists(args.output) and os.path.getsize(args.output):
+        print(f"Error: {args.output} already exists; pass --resume to continue it or choose another --output.")
+        return
+    completed = load_checkpoint(args.output) if args.resume else set()
+    if completed:
+        print(f"Resuming: {len(completed)} conversations already completed.", file=sys.stderr)
+    try:
+        tracer = Tracer(trace_file=args.trace_file)
+        services = build_services(args.log_dir, speak=False, tracer=tracer, llm_cache=not args.no_llm_cache)
+    except ValueError as e:
+        print(f"Error initializing Decision Engine: {e}")
+        return
+
+    async def run(output):
+        runner = BatchRunner(services, output, workers=args.workers)
+        try:
+            await runner.run(read_conversations(args.input, completed))
+        finally:
+            await close_clients()
+        print(runner.progress(), file=sys.stderr)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'a', encoding='utf-8') as output:
+        try:
+            asyncio.run(run(output))
+        except KeyboardInterrupt:
+            print("Interrupted; run again with --resume to continue.", file=sys.stderr)
+        finally:
+            if services.llm_cache is not None:
+                services.llm_cache.close()
+            tracer.close()
+    print(f"Stage latencies:\n{tracer.summary()}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+import asyncio
+import sys
+import threading
+
+class ConsoleReader:
+    """
+    Reads console lines on a background thread so the event loop never blocks on input().
+
+    Lines typed while Niku is still busy are queued and returned by later
+    `readline()` calls.
+    """
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdin
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._lines: asyncio.Queue | None = None
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        """Starts the reader thread; must be called from the running event loop."""
+        if self._thread is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._lines = asyncio.Queue()
+        self._thread = threading.Thread(target=self._run, name="niku-console-reader", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        for line in self.stream:
+            self._loop.call_soon_threadsafe(self._lines.put_nowait, line.rstrip("\n"))
+        self._loop.call_soon_threadsafe(self._lines.put_nowait, None) # End of input
+
+    async def readline(self, prompt: str = "") -> str | None:
+        """
+        Prints a prompt and waits for the next line without blocking the event loop.
+
+        Returns:
+            The line without its newline, or None once input has ended (EOF).
+        """
+        self.start()
+        if prompt:
+            print(prompt, end="", flush=True)
+        line = await self._lines.get()
+        if line is None:
+            self._lines.put_nowait(None) # Keep reporting EOF to later callers
+        return line
@@ -0,0 +1,216 @@
+import math
+import re
+
+from niku.cache import LRUCache
+
+DEFAULT_TOKEN_BUDGET = 1024
+DEFAULT_EXCERPT_BUDGET = 192
+DEFAULT_RECALL_BUDGET = 128
+EXCERPT_LINE_TOKENS = 40 # Each evicted or recalled message is cut to at most this many tokens
+INTERNAL_ROLES = {"system"} # History records that are internal logs, not conversation
+
+_TOKEN_PIECES = re.compile(r"\w+|[^\w\s]")
+
+def count_tokens(text: str) -> int:
+    """
+    Approximates the LLM token count of a text: punctuation marks count as one
+    token and words as one token per four characters.
+    """
+    return sum(math.ceil(len(piece) / 4) for piece in _TOKEN_PIECES.findall(text))
+
+def _message_key(message: dict) -> tuple:
+    return message.get("timestamp"), message["role"], message["content"]
+
+def _truncate(text: str, max_tokens: int) -> str:
+    """Cuts a text down to roughly `max_tokens` tokens at a word boundary."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    words = []
+    used = 0
+    for word in text.split():
+        used += count_tokens(word)
+        if used > max_tokens:
+            break
+        words.append(word)
+    return " ".join(words) + "..."
+
+
+class PromptMetrics:
+    """
+    Size of one built prompt.
+    """
+    def __init__(self, budget: int):
+        self.budget = budget
+        self.history_messages = 0 # Conversation messages available (internal records excluded)
+        self.included_messages = 0
+        self.excerpted_messages = 0 # Messages that left the window this turn and were added to the excerpts
+        self.prompt_tokens = 0
+        self.excerpt_tokens = 0
+        self.recalled_messages = 0 # Relevant older messages found by search and included
+        self.recall_tokens = 0
+
+    def __repr__(self) -> str:
+        return (f"PromptMetrics(prompt_tokens={self.prompt_tokens}/{self.budget}, "
+                f"messages={self.included_messages}/{self.history_messages}, "
+                f"excerpt_tokens={self.excerpt_tokens}, newly_excerpted={self.excerpted_messages}, "
+                f"recalled={self.recalled_messages})")
+
+
+class ContextBuilder:
+    """
+    Builds chat prompts from conversation history under a token budget.
+
+    Internal system records are skipped and messages are added newest-first
+    until the budget is spent. Older turns are not summarized: as they fall out
+    of the window, each is kept as a truncated excerpt (its first
+    EXCERPT_LINE_TOKENS tokens), and the newest excerpts that fit their budget
+    are quoted. Older messages recalled by a history search can be quoted in a
+    budget of their own.
+    """
+    def __init__(self, token_budget: int = DEFAULT_TOKEN_BUDGET, excerpt_budget: int = DEFAULT_EXCERPT_BUDGET,
+                 recall_budget: int = DEFAULT_RECALL_BUDGET):
+        """
+        Initializes the ContextBuilder.
+
+        Args:
+            token_budget: Maximum prompt size in (approximate) tokens, excerpts and recall included.
+            excerpt_budget: Maximum size of the excerpts of older turns.
+            recall_budget: Maximum size of the recalled messages.
+        """
+        self.token_budget = token_budget
+        self.excerpt_budget = excerpt_budget
+        self.recall_budget = recall_budget
+        self.excerpt_lines: list[tuple[str, int]] = [] # (line, tokens), oldest first
+        self.last_metrics: PromptMetrics | None = None
+        self._token_counts = LRUCache(maxsize=4096) # Per-message token counts, computed once
+        self._excerpted = LRUCache(maxsize=4096) # Keys of messages already excerpted
+        self._previous_window: list[dict] = []
+
+    def message_tokens(self, message: dict) -> int:
+        """Returns the token count of a message, counting each message only once."""
+        key = _message_key(message)
+        tokens = self._token_counts.get(key)
+        if tokens is None:
+            tokens = count_tokens(message["content"]) + 4 # Role and message framing overhead
+            self._token_counts.set(key, tokens)
+        return tokens
+
+    def _add_excerpts(self, evicted: list[dict]) -> tuple[list[tuple[str, int]], list[tuple]]:
+        """
+        Returns the excerpt lines with truncated excerpts of newly evicted
+        messages added, and the keys of those messages. The builder itself is
+        left unchanged.
+        """
+        excerpt_lines = list(self.excerpt_lines)
+        new_keys = []
+        for message in evicted:
+            key = _message_key(message)
+            if key in self._excerpted or key in new_keys:
+                continue
+            new_keys.append(key)
+            line = f"{message['role'].capitalize()}: {_truncate(message['content'], EXCERPT_LINE_TOKENS)}"
+            excerpt_lines.append((line, count_tokens(line)))
+        while sum(tokens for _, tokens in excerpt_lines) > self.excerpt_budget and len(excerpt_lines) > 1:
+            excerpt_lines.pop(0) # The oldest excerpts go first
+        return excerpt_lines, new_keys
+
+    @property
+    def excerpts(self) -> str:
+        return "\n".join(line for line, _ in self.excerpt_lines)
+
+    def _recall_lines(self, recalled: list[dict]) -> list[tuple[dict, str, int]]:
+        """Formats recalled messages, best match first, until the recall budget is spent."""
+        lines = []
+        used = 0
+        for message in recalled:
+            if message["role"] in INTERNAL_ROLES:
+                continue
+            date = (message.get("timestamp") or "")[:10]
+            line = f"[{date}] {message['role'].capitalize()}: {_truncate(message['content'], EXCERPT_LINE_TOKENS)}"
+            tokens = count_tokens(line)
+            if used + tokens > self.recall_budget:
+                break
+            lines.append((message, line, tokens))
+            used += tokens
+        return lines
+
+    def build(self, history: list[dict], system_prompt: str | None = None,
+              last_user_instruction: str | None = None, recalled: list[dict] | None = None,
+              commit: bool = True) -> list[dict]:
+        """
+        Builds the chat messages for the next completion.
+
+        Args:
+            history: Recent history records, oldest first (as stored by ConversationHistory).
+            system_prompt: Optional system instruction placed first.
+            last_user_instruction: Optional format string applied to the newest user
+                                   message for this prompt only, e.g. "Tell a joke related to: {}".
+            recalled: Optional older messages relevant to the newest one (e.g. from
+                      ConversationHistory.search), best match first. Those not already
+                      in the prompt are quoted in the system message.
+            commit: Record the messages that left the window as excerpted. A
+                    speculative build passes False: its prompt is the same, but a
+                    later build still sees the window as it was before.
+
+        Returns:
+            Chat messages with "role" and "content" keys, ready for the Groq client.
+        """
+        metrics = PromptMetrics(self.token_budget)
+        conversation = [message for message in history if message["role"] not in INTERNAL_ROLES]
+        metrics.history_messages = len(conversation)
+
+        system_tokens = count_tokens(system_prompt) + 4 if system_prompt else 0
+        available = self.token_budget - system_tokens
+        recall_lines = self._recall_lines(recalled) if recalled else []
+        available -= sum(tokens for _, _, tokens in recall_lines)
+        if self.excerpt_lines or sum(self.message_tokens(message) for message in conversation) > available:
+            available -= self.excerpt_budget # Room for the excerpts of what does not fit
+        window: list[dict] = []
+        for message in reversed(conversation):
+            tokens = self.message_tokens(message)
+            if window and tokens > available: # The newest message is always included
+                break
+            window.append(message)
+            available -= tokens
+        window.reverse()
+
+        # Everything older than the window, including messages that just aged out of
+        # the history itself, is kept as an excerpt.
+        window_keys = {_message_key(message) for message in window}
+        oldest_in_window = window[0].get("timestamp", "") if window else ""
+        evicted = [
+            message for message in self._previous_window + conversation
+            if _message_key(message) not in window_keys and message.get("timestamp", "") <= oldest_in_window
+        ]
+        excerpt_lines, new_keys = self._add_excerpts(sorted(evicted, key=lambda message: message.get("timestamp", "")))
+        metrics.excerpted_messages = len(new_keys)
+        if commit:
+            self.excerpt_lines = excerpt_lines
+            for key in new_keys:
+                self._excerpted.set(key, True)
+            self._previous_window = window
+        excerpts = "\n".join(line for line, _ in excerpt_lines)
+
+        # Recalled messages still in the window are already in the prompt
+        recall_lines = [(message, line, tokens) for message, line, tokens in recall_lines
+                        if _message_key(message) not in window_keys]
+        recall_lines.sort(key=lambda entry: entry[0].get("timestamp") or "")
+        recall = "\n".join(line for _, line, _ in recall_lines)
+
+        messages = []
+        system_parts = [part for part in (system_prompt, excerpts and f"Excerpts of earlier conversation (truncated):\n{excerpts}",
+                                          recall and f"Relevant earlier messages:\n{recall}") if part]
+        if system_parts:
+            messages.append({"role": "system", "content": "\n\n".join(system_parts)})
+        for message in window:
+            messages.append({"role": message["role"], "content": message["content"]})
+        if last_user_instruction and messages and messages[-1]["role"] == "user":
+            messages[-1]["content"] = last_user_instruction.format(messages[-1]["content"])
+
+        metrics.included_messages = len(window)
+        metrics.excerpt_tokens = sum(tokens for _, tokens in excerpt_lines)
+        metrics.recalled_messages = len(recall_lines)
+        metrics.recall_tokens = sum(tokens for _, _, tokens in recall_lines)
+        metrics.prompt_tokens = sum(count_tokens(message["content"]) + 4 for message in messages)
+        self.last_metrics = metrics
+        return messages
@@ -1,25 +1,236 @@
+import math
 import os
-import cohere
-from dotenv import load_dotenv
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-load_dotenv()
+from niku.cache import LRUCache
+from niku.env import load_env
+from niku.intent_classifier import LocalIntentClassifier
+from niku.resilience import CircuitOpenError, ResiliencePolicy
+
+load_env()
+
+DEFAULT_CONFIDENCE_THRESHOLD = 0.6
+MAX_CLASSIFY_BATCH = 96 # Maximum inputs Cohere accepts per classify request
+_NON_WORD = re.compile(r"[^\w\s']")
+
+# Default few-shot examples, shared by the local classifier and Cohere.
+DEFAULT_EXAMPLES = [
+    {"text": "What is the weather like today?", "label": "get_weather"},
+    {"text": "Will it rain in London tomorrow?", "label": "get_weather"},
+    {"text": "How hot is it outside right now?", "label": "get_weather"},
+    {"text": "What's the temperature in Paris?", "label": "get_weather"},
+    {"text": "Give me the forecast for this weekend.", "label": "get_weather"},
+    {"text": "Can you tell me a joke?", "label": "tell_joke"},
+    {"text": "Make me laugh.", "label": "tell_joke"},
+    {"text": "Tell me something funny.", "label": "tell_joke"},
+    {"text": "Do you know any good puns?", "label": "tell_joke"},
+    {"text": "What time is it?", "label": "get_time"},
+    {"text": "Tell me the current time.", "label": "get_time"},
+    {"text": "What's the time right now?", "label": "get_time"},
+    {"text": "What day is it today?", "label": "get_time"},
+    {"text": "I want to chat.", "label": "general_chat"},
+    {"text": "Hello, how are you doing?", "label": "general_chat"},
+    {"text": "Let's talk about movies.", "label": "general_chat"},
+    {"text": "I had a long day at work.", "label": "general_chat"},
+    {"text": "Explain how airplanes fly.", "label": "general_chat"},
+    {"text": "Who are you?", "label": "identity_query"},
+    {"text": "What is your name?", "label": "identity_query"},
+    {"text": "Who built you?", "label": "identity_query"},
+    {"text": "Are you a robot?", "label": "identity_query"},
+]
+
+class IntentPrediction:
+    """
+    The result of classifying one text.
+    """
+    def __init__(self, label: str | None, confidence: float, source: str):
+        self.label = label
+        self.confidence = confidence
+        self.source = source # "local" or "cohere"
+
+    def __repr__(self) -> str:
+        return f"IntentPrediction(label={self.label}, confidence={self.confidence:.2f}, source={self.source})"
 
 class DecisionEngine:
     """
-    Handles intent classification and decision making using Cohere.
+    Handles intent classification and decision making.
+
+    Intents are classified locally first; Cohere is only consulted when the
+    local classifier is not confident enough.
     """
-    def __init__(self):
+    def __init__(self, confidence_threshold: float = DEFAULT_CONFIDENCE_THRESHOLD, cache_size: int = 1024,
+                 cache_ttl: float | None = 3600, max_concurrent_batches: int = 4,
+                 remote_policy: ResiliencePolicy | None = None):
         """
         Initializes the DecisionEngine with the Cohere API key.
+
+        Args:
+            confidence_threshold: Local predictions below this confidence are
+                                  sent to Cohere instead.
+            cache_size: Number of normalized utterances whose intent is memoized.
+            cache_ttl: Seconds a memoized intent stays valid, or None for no expiry.
+            max_concurrent_batches: Cohere classify requests allowed in flight at once.
+            remote_policy: Timeouts, hedging, retries and circuit breaking for Cohere
+                           requests. A short default timeout keeps a slow Cohere from
+                           holding up the turn; the local prediction is used instead.
         """
         self.cohere_api_key = os.environ.get("COHERE_API_KEY")
         if not self.cohere_api_key:
             raise ValueError("COHERE_API_KEY not found in environment variables. Please set it in a .env file.")
+        import cohere # Imported on first use; the SDK is slow to load
         self.co = cohere.Client(self.cohere_api_key)
+        self.confidence_threshold = confidence_threshold
+        # Built once and reused for every call that uses the default examples.
+        self.examples = self._to_cohere_examples(DEFAULT_EXAMPLES)
+        self.local_classifier = LocalIntentClassifier(DEFAULT_EXAMPLES)
+        self._custom_classifiers: dict[tuple, tuple[list, LocalIntentClassifier]] = {}
+        self._intent_cache = LRUCache(maxsize=cache_size, ttl=cache_ttl)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent_batches, thread_name_prefix="niku-classify")
+        self.remote_batches = 0
+        self.remote_inputs = 0
+        self._stats_lock = threading.Lock() # Batches run on executor threads, for callers on many threads
+        self.remote_policy = remote_policy or ResiliencePolicy(
+            "cohere", initial_timeout=5.0, min_timeout=0.5, max_timeout=10.0, max_workers=2 * max_concurrent_batches,
+        )
+
+    @staticmethod
+    def _to_cohere_examples(examples: list) -> list:
+        import cohere
+        return [
+            example if isinstance(example, cohere.ClassifyExample)
+            else cohere.ClassifyExample(text=example["text"], label=example["label"])
+            for example in examples
+        ]
+
+    def _classifier_for(self, examples: list | None) -> tuple[tuple | str, list, LocalIntentClassifier]:
+        """Returns the cache key, Cohere examples and local classifier for an example set, building each set once."""
+        if not examples:
+            return "default", self.examples, self.local_classifier
+        cohere_examples = self._to_cohere_examples(examples)
+        key = tuple((example.text, example.label) for example in cohere_examples)
+        if key not in self._custom_classifiers:
+            self._custom_classifiers[key] = (cohere_examples, LocalIntentClassifier(cohere_examples))
+        return (key, *self._custom_classifiers[key])
+
+    @staticmethod
+    def normalize_text(text: str) -> str:
+        """Lowercases and strips punctuation so repeated phrasings share a cache entry."""
+        return " ".join(_NON_WORD.sub(" ", text.lower()).split())
+
+    def _classify_remote(self, texts: list[str], cohere_examples: list) -> list[IntentPrediction | None]:
+        """
+        Classifies one batch with Cohere.
+
+        Returns:
+            One prediction per text, or None for every text if the request failed.
+        """
+        from cohere.core.api_error import ApiError
+
+        with self._stats_lock:
+            self.remote_batches += 1
+            self.remote_inputs += len(texts)
+        try:
+            # The SDK's own retries and timeout are turned off; remote_policy owns both
+            request_options = {"max_retries": 0, "timeout_in_seconds": math.ceil(self.remote_policy.timeout())}
+            response = self.remote_policy.call_sync(lambda request: self.co.classify(
+                model='embed-english-v3.0', # Using a default embedding model
+                inputs=texts,
+                examples=cohere_examples,
+                request_options=request_options,
+            ))
+            predictions = []
+            for text, classification in zip(texts, response.classifications or []):
+                if classification.prediction:
+                    predictions.append(IntentPrediction(classification.prediction, classification.confidence or 0.0, "cohere"))
+                else:
+                    print(f"Warning: Could not classify intent for text: '{text}'. Response: {classification}")
+                    predictions.append(IntentPrediction("unknown_intent", 0.0, "cohere")) # Fallback intent
+            return predictions + [None] * (len(texts) - len(predictions))
+        except CircuitOpenError:
+            pass # Cohere keeps failing; fall back to the local prediction without waiting on it
+        except ApiError as e:
+            print(f"Cohere API Error during intent classification: {e}")
+        except Exception as e:
+            print(f"An unexpected error occurred during intent classification: {e}")
+        return [None] * len(texts)
+
+    def classify_intents_detailed(self, texts: list[str], examples: list | None = None) -> list[IntentPrediction]:
+        """
+        Classifies many texts, answering from the cache and the local classifier
+        where possible and sending the rest to Cohere in concurrent batches.
+
+        Args:
+            texts: The input texts to classify.
+            examples: Optional few-shot examples (dicts or cohere.ClassifyExample).
+
+        Returns:
+            One IntentPrediction per input text, in order. A label is None only
+            if both the local classifier and Cohere failed to produce one.
+        """
+        examples_key, cohere_examples, local_classifier = self._classifier_for(examples)
+        results: dict[str, IntentPrediction] = {}
+        local_guesses: dict[str, IntentPrediction] = {}
+        remote_texts: list[str] = []
+
+        for text in texts:
+            normalized = self.normalize_text(text)
+            if normalized in results or normalized in local_guesses:
+                continue
+            cached = self._intent_cache.get((examples_key, normalized))
+            if cached is not None:
+                results[normalized] = cached
+                continue
+            label, confidence = local_classifier.predict(text)
+            prediction = IntentPrediction(label, confidence, "local")
+            if confidence >= self.confidence_threshold:
+                results[normalized] = prediction
+                self._intent_cache.set((examples_key, normalized), prediction)
+            else:
+                local_guesses[normalized] = prediction
+                remote_texts.append(text)
+
+        batches = [remote_texts[i:i + MAX_CLASSIFY_BATCH] for i in range(0, len(remote_texts), MAX_CLASSIFY_BATCH)]
+        batch_results = self._executor.map(lambda batch: self._classify_remote(batch, cohere_examples), batches)
+        for batch, predictions in zip(batches, batch_results):
+            for text, prediction in zip(batch, predictions):
+                normalized = self.normalize_text(text)
+                if prediction is None:
+                    # Cohere failed; the local guess is better than no answer. Not cached, so it is retried.
+                    results[normalized] = local_guesses[normalized]
+                else:
+                    results[normalized] = prediction
+                    self._intent_cache.set((examples_key, normalized), prediction)
+
+        return [results[self.normalize_text(text)] for text in texts]
+
+    def classify_intents(self, texts: list[str], examples: list | None = None) -> list[str | None]:
+        """
+        Classifies the intents of many texts.
+
+        Returns:
+            The predicted intent labels, in input order.
+        """
+        return [prediction.label for prediction in self.classify_intents_detailed(texts, examples)]
+
+    def classify_intent_detailed(self, text: str, examples: list | None = None) -> IntentPrediction:
+        """
+        Classifies the intent of a text and reports where the answer came from.
+
+        Args:
+            text: The input text to classify.
+            examples: Optional few-shot examples (dicts or cohere.ClassifyExample).
+
+        Returns:
+            An IntentPrediction. Its label is None only if both the local
+            classifier and Cohere failed to produce one.
+        """
+        return self.classify_intents_detailed([text], examples)[0]
 
-    def classify_intent(self, text: str, examples: list[dict] | None = None) -> str | None:
+    def classify_intent(self, text: str, examples: list | None = None) -> str | None:
         """
-        Classifies the intent of a given text using Cohere's classify endpoint.
+        Classifies the intent of a given text, locally or with Cohere's classify endpoint.
 
         Args:
             text: The input text to classify.
@@ -31,38 +242,27 @@ class DecisionEngine:
         Returns:
             The predicted intent label (str) or None if classification fails.
         """
-        if not examples:
-            # Define some default examples if none are provided
-            examples = [
-                cohere.ClassifyExample(text="What is the weather like today?", label="get_weather"),
-                cohere.ClassifyExample(text="Can you tell me a joke?", label="tell_joke"),
-                cohere.ClassifyExample(text="What time is it?", label="get_time"),
-                cohere.ClassifyExample(text="I want to chat.", label="general_chat"),
-                cohere.ClassifyExample(text="Who are you?", label="identity_query"),
-            ]
+        return self.classify_intent_detailed(text, examples).label
 
-        try:
-            response = self.co.classify(
-                model='embed-english-v3.0', # Using a default embedding model
-                inputs=[text],
-                examples=examples
-            )
-            if response.classifications and response.classifications[0].prediction:
-                return response.classifications[0].prediction
-            else:
-                print(f"Warning: Could not classify intent for text: '{text}'. Response: {response}")
-                return "unknown_intent" # Fallback intent
-        except cohere.CohereAPIError as e:
-            print(f"Cohere API Error during intent classification: {e}")
-            return None
-        except Exception as e:
-            print(f"An unexpected error occurred during intent classification: {e}")
-            return None
+    def get_stats(self) -> dict:
+        """Returns cache, Cohere batching and Cohere resilience statistics."""
+        with self._stats_lock:
+            remote_batches, remote_inputs = self.remote_batches, self.remote_inputs
+        return {
+            "cache_hits": self._intent_cache.hits,
+            "cache_misses": self._intent_cache.misses,
+            "cache_hit_rate": self._intent_cache.hit_rate,
+            "remote_batches": remote_batches,
+            "remote_inputs": remote_inputs,
+            "batch_fill_ratio": remote_inputs / (remote_batches * MAX_CLASSIFY_BATCH) if remote_batches else 0.0,
+            "remote": self.remote_policy.to_dict(),
+        }
 
 if __name__ == '__main__':
     # Example Usage
     # Ensure COHERE_API_KEY is set in your .env file:
     # COHERE_API_KEY="your_actual_cohere_api_key"
+    import cohere
 
     engine = DecisionEngine()
 
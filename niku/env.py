@@ -0,0 +1,32 @@
+import os
+import threading
+
+_loaded = False
+_lock = threading.Lock()
+
+def load_env(dotenv_path: str | None = None) -> bool:
+    """
+    Loads variables from the .env file into the environment, once per process.
+
+    Modules call this instead of dotenv.load_dotenv() so the file is parsed a
+    single time however many of them are imported; later calls return at once.
+    Variables already set in the environment take precedence.
+
+    Returns:
+        True if this call loaded the file.
+    """
+    global _loaded
+    if _loaded:
+        return False
+    with _lock:
+        if _loaded:
+            return False
+        from dotenv import load_dotenv
+        load_dotenv(dotenv_path) if dotenv_path else load_dotenv()
+        _loaded = True
+        return True
+
+def get_env(name: str, default: str | None = None) -> str | None:
+    """Returns an environment variable after making sure .env has been loaded."""
+    load_env()
+    return os.environ.get(name, default)
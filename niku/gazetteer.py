@@ -0,0 +1,122 @@
+import os
+import re
+from collections import deque
+
+DEFAULT_CITY_FILE = os.path.join(os.path.dirname(__file__), 'data', 'cities.txt')
+_WORD_PATTERN = re.compile(r"\w+")
+
+def _tokenize(text: str) -> list[str]:
+    return _WORD_PATTERN.findall(text.lower())
+
+
+class Gazetteer:
+    """
+    Word-level Aho-Corasick automaton over place names and their aliases.
+
+    Scanning a query is a single pass over its words regardless of how many
+    names are indexed; multi-word names ("new york city") are matched whole.
+    """
+    def __init__(self, names: dict[str, str]):
+        """
+        Builds the automaton.
+
+        Args:
+            names: Maps every name or alias to the canonical location it stands for.
+        """
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._outputs: list[list[tuple[int, str]]] = [[]] # node -> [(name length in words, canonical)]
+        for name, canonical in names.items():
+            self._add(_tokenize(name), canonical)
+        self._build_failure_links()
+
+    @classmethod
+    def from_file(cls, path: str = DEFAULT_CITY_FILE) -> "Gazetteer":
+        """
+        Loads a gazetteer file: one place per line, "Canonical Name|alias|alias".
+        Lines starting with '#' are comments.
+        """
+        names = {}
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                canonical, *aliases = [part.strip() for part in line.split('|')]
+                names[canonical.split(',')[0]] = canonical # The bare city name
+                names[canonical] = canonical
+                for alias in aliases:
+                    names[alias] = canonical
+        return cls(names)
+
+    def _add(self, words: list[str], canonical: str):
+        if not words:
+            return
+        node = 0
+        for word in words:
+            next_node = self._goto[node].get(word)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][word] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._outputs.append([])
+            node = next_node
+        self._outputs[node].append((len(words), canonical))
+
+    def _build_failure_links(self):
+        """Breadth-first construction of failure links, merging outputs along them."""
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for word, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and word not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(word, 0)
+                self._outputs[child] = self._outputs[child] + self._outputs[self._fail[child]]
+
+    def find_all(self, query: str) -> list[str]:
+        """
+        Finds every place mentioned in a query.
+
+        Overlapping matches are resolved leftmost-longest, so "new york city"
+        yields one match rather than "new york" and "york".
+
+        Returns:
+            Canonical locations in the order they appear, without duplicates.
+        """
+        matches = [] # (start word, length, canonical)
+        node = 0
+        for position, word in enumerate(_tokenize(query)):
+            while node and word not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(word, 0)
+            for length, canonical in self._outputs[node]:
+                matches.append((position - length + 1, length, canonical))
+
+        locations = []
+        covered_until = 0
+        for start, length, canonical in sorted(matches, key=lambda match: (match[0], -match[1])):
+            if start < covered_until:
+                continue
+            covered_until = start + length
+            if canonical not in locations:
+                locations.append(canonical)
+        return locations
+
+    def extract(self, query: str) -> str | None:
+        """Returns the first place mentioned in a query, or None."""
+        locations = self.find_all(query)
+        return locations[0] if locations else None
+
+
+_default_gazetteer: Gazetteer | None = None
+
+def get_default_gazetteer() -> Gazetteer:
+    """Returns the gazetteer built from the bundled city list, loading it on first use."""
+    global _default_gazetteer
+    if _default_gazetteer is None:
+        _default_gazetteer = Gazetteer.from_file(DEFAULT_CITY_FILE)
+    return _default_gazetteer
@@ -1,11 +1,324 @@
 \
+import asyncio
+import inspect
 import os
-from groq import Groq
-from dotenv import load_dotenv
+import threading
+import time
+from collections.abc import AsyncIterator, Iterator
+from typing import TYPE_CHECKING
 
-load_dotenv()
+from niku.env import load_env
+from niku.llm_cache import CompletionCache, completion_key
+from niku.resilience import ResiliencePolicy
 
-def get_groq_completion(prompt: str, model: str = "llama3-70b-8192") -> str:
+if TYPE_CHECKING: # The SDK is imported when the first client is created
+    import httpx
+    from groq import Groq, AsyncGroq
+
+load_env()
+
+DEFAULT_MODEL = "llama3-70b-8192"
+MAX_CONNECTIONS = 20 # Upper bound on pooled connections shared by all calls
+MAX_KEEPALIVE_CONNECTIONS = 10
+
+_client: "Groq | None" = None
+_async_client: "AsyncGroq | None" = None
+_client_lock = threading.Lock()
+
+# Timeouts, hedging and retries apply to the time until a stream's first chunk; the
+# SDK's own retries are turned off so the two do not multiply.
+completion_policy = ResiliencePolicy("groq", initial_timeout=10.0, min_timeout=2.0, max_timeout=30.0)
+
+class CompletionStats:
+    """
+    Timing information for a single completion call.
+    """
+    def __init__(self, model: str):
+        self.model = model
+        self.started_at = time.perf_counter()
+        self.time_to_first_token: float | None = None # Seconds from request to first token
+        self.total_time: float | None = None # Seconds from request to end of stream
+        self.tokens = 0
+        self.error: str | None = None
+        self.cached = False # Served from a CompletionCache without calling the API
+
+    def _on_token(self):
+        if self.time_to_first_token is None:
+            self.time_to_first_token = time.perf_counter() - self.started_at
+        self.tokens += 1
+
+    def _finish(self, completion_tokens: int | None = None):
+        self.total_time = time.perf_counter() - self.started_at
+        if completion_tokens:
+            self.tokens = completion_tokens
+
+    @property
+    def tokens_per_sec(self) -> float | None:
+        """Generation throughput measured after the first token arrived."""
+        if self.total_time is None or self.time_to_first_token is None or self.tokens < 2:
+            return None
+        generation_time = self.total_time - self.time_to_first_token
+        return (self.tokens - 1) / generation_time if generation_time > 0 else None
+
+    def __repr__(self) -> str:
+        ttft = f"{self.time_to_first_token * 1000:.0f} ms" if self.time_to_first_token is not None else "n/a"
+        tps = f"{self.tokens_per_sec:.1f} tok/s" if self.tokens_per_sec is not None else "n/a"
+        if self.cached:
+            return f"CompletionStats(model={self.model}, cached, {self.total_time * 1e6:.0f} µs)"
+        return f"CompletionStats(model={self.model}, ttft={ttft}, tokens={self.tokens}, {tps})"
+
+# Stats of the most recent completion, for callers that only receive a string.
+last_completion_stats: CompletionStats | None = None
+
+def _pool_limits() -> "httpx.Limits":
+    import httpx
+    return httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS)
+
+def get_client() -> "Groq | None":
+    """
+    Returns the shared, connection-pooled synchronous Groq client.
+
+    Returns:
+        The client, or None if GROQ_API_KEY is not set.
+    """
+    global _client
+    if _client is None:
+        api_key = os.environ.get("GROQ_API_KEY")
+        if not api_key:
+            return None
+        with _client_lock:
+            if _client is None:
+                from groq import Groq, DefaultHttpxClient
+                _client = Groq(api_key=api_key, max_retries=0, http_client=DefaultHttpxClient(limits=_pool_limits()))
+    return _client
+
+def get_async_client() -> "AsyncGroq | None":
+    """
+    Returns the shared, connection-pooled asynchronous Groq client.
+
+    Returns:
+        The client, or None if GROQ_API_KEY is not set.
+    """
+    global _async_client
+    if _async_client is None:
+        api_key = os.environ.get("GROQ_API_KEY")
+        if not api_key:
+            return None
+        with _client_lock:
+            if _async_client is None:
+                from groq import AsyncGroq, DefaultAsyncHttpxClient
+                _async_client = AsyncGroq(api_key=api_key, max_retries=0,
+                                          http_client=DefaultAsyncHttpxClient(limits=_pool_limits()))
+    return _async_client
+
+async def warm_up() -> bool:
+    """
+    Creates the pooled async client off the event loop and opens a connection
+    to the API with a cheap request, so the first completion skips SDK import,
+    DNS and TLS setup.
+
+    Returns:
+        True if the API answered.
+    """
+    client = await asyncio.to_thread(get_async_client)
+    if client is None:
+        return False
+    try:
+        await client.models.list()
+        return True
+    except Exception:
+        return False # Errors surface on the first real request
+
+async def close_clients():
+    """Closes the pooled clients and their connections."""
+    global _client, _async_client
+    with _client_lock:
+        client, async_client = _client, _async_client
+        _client = _async_client = None
+    if client is not None:
+        client.close()
+    if async_client is not None:
+        await async_client.close()
+
+def _build_messages(prompt: str | list[dict]) -> list[dict]:
+    """Wraps a plain prompt string as a single user message."""
+    if isinstance(prompt, str):
+        # For simplicity, the whole prompt is passed as a user message.
+        return [{"role": "user", "content": prompt}]
+    return prompt
+
+def _completion_tokens(chunk) -> int | None:
+    """Reads the completion token count Groq attaches to the final stream chunk."""
+    x_groq = getattr(chunk, "x_groq", None)
+    usage = getattr(x_groq, "usage", None) or getattr(chunk, "usage", None)
+    return getattr(usage, "completion_tokens", None)
+
+async def _close_stream(stream):
+    """Releases a response stream's connection (SDK streams and plain async generators)."""
+    close = getattr(stream, "close", None) or getattr(stream, "aclose", None)
+    if close is not None:
+        result = close()
+        if inspect.isawaitable(result):
+            await result
+
+async def _open_stream(client: "AsyncGroq", messages: list[dict], model: str, sampling_params: dict) -> tuple:
+    """Starts a streaming completion and waits for its first chunk."""
+    stream = await client.chat.completions.create(messages=messages, model=model, stream=True, **sampling_params)
+    chunks = aiter(stream)
+    try:
+        first_chunk = await anext(chunks, None)
+    except BaseException: # Including cancellation when another request won the race
+        await _close_stream(stream)
+        raise
+    return stream, chunks, first_chunk, model
+
+async def stream_groq_completion(prompt: str | list[dict], model: str = DEFAULT_MODEL,
+                                 stats: CompletionStats | None = None, policy: ResiliencePolicy | None = None,
+                                 hedge_model: str | None = None, **sampling_params) -> AsyncIterator[str]:
+    """
+    Streams a completion from the Groq API, yielding tokens as they arrive.
+
+    Args:
+        prompt: A prompt string, or a list of chat messages with "role" and "content".
+        model: The model to use for completion.
+        stats: Optional. Filled in with time-to-first-token and tokens/sec.
+        policy: Timeouts, hedging, retries and circuit breaking until the first
+                chunk arrives (the shared completion_policy if None).
+        hedge_model: Optional. Model for the hedged request; the same model if None.
+        **sampling_params: Passed to the API, e.g. temperature=0.
+
+    Yields:
+        Content tokens. If the call fails before any token arrives, a single
+        error message is yielded instead; a failure after that ends the stream
+        early with stats.error set, so callers must check it.
+    """
+    global last_completion_stats
+    stats = stats or CompletionStats(model)
+    last_completion_stats = stats
+    completion_tokens = None
+    stream = None
+    try:
+        client = get_async_client()
+        if client is None:
+            stats.error = "Error: GROQ_API_KEY not found in environment variables. Please set it in a .env file."
+            yield stats.error
+            return
+
+        messages = _build_messages(prompt)
+        stream, chunks, chunk, stats.model = await (policy or completion_policy).call(
+            lambda request: _open_stream(client, messages, hedge_model if request and hedge_model else model, sampling_params),
+            discard=lambda opened: _close_stream(opened[0]),
+        )
+        while chunk is not None:
+            completion_tokens = _completion_tokens(chunk) or completion_tokens
+            if chunk.choices and chunk.choices[0].delta.content:
+                stats._on_token()
+                yield chunk.choices[0].delta.content
+            chunk = await anext(chunks, None)
+    except Exception as e:
+        stats.error = f"Error interacting with Groq API: {e}"
+        if stats.tokens == 0:
+            yield stats.error
+    finally:
+        stats._finish(completion_tokens)
+        if stream is not None:
+            await _close_stream(stream)
+
+def _cached_response(cache: CompletionCache | None, key: str | None, stats: CompletionStats) -> str | None:
+    if cache is None:
+        return None
+    response = cache.get(key)
+    if response is not None:
+        stats.cached = True
+        stats._finish()
+    return response
+
+def _store_response(cache: CompletionCache | None, key: str | None, model: str, response: str,
+                    stats: CompletionStats, cache_ttl: float | None):
+    if cache is not None and not stats.error: # Errors are never cached
+        cache.put(key, model, response, ttl=cache_ttl)
+
+async def get_groq_completion_async(prompt: str | list[dict], model: str = DEFAULT_MODEL,
+                                    stats: CompletionStats | None = None,
+                                    cache: CompletionCache | None = None, cache_ttl: float | None = None,
+                                    **sampling_params) -> str:
+    """
+    Gets a full completion from the Groq API without blocking the event loop.
+
+    Args:
+        prompt: A prompt string, or a list of chat messages.
+        model: The model to use for completion.
+        stats: Optional. Filled in with time-to-first-token and tokens/sec.
+        cache: Optional. Serves repeated requests without calling the API; only
+               pass one for prompts whose answer is deterministic.
+        cache_ttl: Lifetime of the cached response in seconds (the cache default if None).
+        **sampling_params: Passed to the API and included in the cache key.
+
+    Returns:
+        The model's response, or an error message.
+    """
+    stats = stats or CompletionStats(model)
+    key = completion_key(model, _build_messages(prompt), sampling_params) if cache is not None else None
+    if cache is not None: # The cache's SQLite store is read and written in a worker thread
+        response = await asyncio.to_thread(_cached_response, cache, key, stats)
+        if response is not None:
+            return response
+    tokens = [token async for token in stream_groq_completion(prompt, model=model, stats=stats, **sampling_params)]
+    response = "".join(tokens)
+    if cache is not None:
+        await asyncio.to_thread(_store_response, cache, key, model, response, stats, cache_ttl)
+    return response
+
+def _close_sync_stream(stream):
+    close = getattr(stream, "close", None)
+    if close is not None:
+        close()
+
+def _open_sync_stream(client: "Groq", messages: list[dict], model: str, sampling_params: dict) -> tuple:
+    """Synchronous counterpart of _open_stream."""
+    stream = client.chat.completions.create(messages=messages, model=model, stream=True, **sampling_params)
+    chunks = iter(stream)
+    try:
+        first_chunk = next(chunks, None)
+    except BaseException:
+        _close_sync_stream(stream)
+        raise
+    return stream, chunks, first_chunk, model
+
+def _iter_sync_stream(prompt: str | list[dict], model: str, stats: CompletionStats, **sampling_params) -> Iterator[str]:
+    """Synchronous counterpart of stream_groq_completion using the pooled sync client."""
+    completion_tokens = None
+    stream = None
+    try:
+        client = get_client()
+        if client is None:
+            stats.error = "Error: GROQ_API_KEY not found in environment variables. Please set it in a .env file."
+            yield stats.error
+            return
+
+        messages = _build_messages(prompt)
+        stream, chunks, chunk, stats.model = completion_policy.call_sync(
+            lambda request: _open_sync_stream(client, messages, model, sampling_params),
+            discard=lambda opened: _close_sync_stream(opened[0]),
+        )
+        while chunk is not None:
+            completion_tokens = _completion_tokens(chunk) or completion_tokens
+            if chunk.choices and chunk.choices[0].delta.content:
+                stats._on_token()
+                yield chunk.choices[0].delta.content
+            chunk = next(chunks, None)
+    except Exception as e:
+        stats.error = f"Error interacting with Groq API: {e}"
+        if stats.tokens == 0:
+            yield stats.error
+    finally:
+        stats._finish(completion_tokens)
+        if stream is not None:
+            _close_sync_stream(stream)
+
+def get_groq_completion(prompt: str | list[dict], model: str = DEFAULT_MODEL,
+                        cache: CompletionCache | None = None, cache_ttl: float | None = None,
+                        **sampling_params) -> str:
     """
     Gets a completion from the Groq API.
 
@@ -13,35 +326,29 @@ def get_groq_completion(prompt: str, model: str = "llama3-70b-8192") -> str:
         prompt: The prompt to send to the language model. This can be a single string
                 or a formatted conversation history.
         model: The model to use for completion.
+        cache: Optional. Serves repeated requests without calling the API; only
+               pass one for prompts whose answer is deterministic.
+        cache_ttl: Lifetime of the cached response in seconds (the cache default if None).
+        **sampling_params: Passed to the API and included in the cache key.
 
     Returns:
         The model's response.
     """
-    try:
-        api_key = os.environ.get("GROQ_API_KEY")
-        if not api_key:
-            return "Error: GROQ_API_KEY not found in environment variables. Please set it in a .env file."
-
-        client = Groq(api_key=api_key)
-        chat_completion = client.chat.completions.create(
-            messages=[
-                {
-                    "role": "user", # For simplicity, we'll pass the whole prompt as a user message.
-                                  # For better results, structure with system/user/assistant turns if prompt is conversational.
-                    "content": prompt, 
-                }
-            ],
-            model=model,
-        )
-        return chat_completion.choices[0].message.content
-    except Exception as e:
-        return f"Error interacting with Groq API: {e}"
+    global last_completion_stats
+    stats = last_completion_stats = CompletionStats(model)
+    key = completion_key(model, _build_messages(prompt), sampling_params) if cache is not None else None
+    response = _cached_response(cache, key, stats)
+    if response is not None:
+        return response
+    response = "".join(_iter_sync_stream(prompt, model, stats, **sampling_params))
+    _store_response(cache, key, model, response, stats, cache_ttl)
+    return response
 
 if __name__ == '__main__':
     # Example usage (requires GROQ_API_KEY to be set in .env)
     # Create a .env file in the root directory with:
     # GROQ_API_KEY="your_actual_api_key"
-    
+
     # Example of a conversational prompt string
     # conversation_prompt = """
     # System: You are Niku, a helpful AI.
@@ -50,6 +357,16 @@ if __name__ == '__main__':
     # User: Tell me about large language models.
     # """
     # response = get_groq_completion(conversation_prompt)
-    
+
     response = get_groq_completion("Explain the importance of large language models in AI development.")
     print(response)
+    print(last_completion_stats)
+
+    async def stream_example():
+        stats = CompletionStats(DEFAULT_MODEL)
+        async for token in stream_groq_completion("Write a haiku about fast inference.", stats=stats):
+            print(token, end="", flush=True)
+        print(f"\n{stats}")
+        await close_clients()
+
+    asyncio.run(stream_example())
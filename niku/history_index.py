@@ -0,0 +1,206 @@
+import heapq
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+
+INDEXED_ROLES = ("user", "assistant") # System records are internal logs and are not searchable
+BM25_K1 = 1.2
+BM25_B = 0.75
+COMMON_TERM_FRACTION = 0.5 # Terms in more of the messages than this barely affect ranking
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    timestamp TEXT,
+    length INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_documents_timestamp ON documents (timestamp);
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT NOT NULL,
+    doc_id INTEGER NOT NULL,
+    tf INTEGER NOT NULL,
+    length INTEGER NOT NULL, -- Copy of the document length, so scoring needs no join
+    PRIMARY KEY (term, doc_id)
+) WITHOUT ROWID;
+"""
+
+_WORDS = re.compile(r"\w+")
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being below between both
+but by can could did do does doing down during each few for from further had has have having he her here hers
+him his how i if in into is it its itself just me more most my no nor not now of off on once only or other our
+ours out over own same she should so some such than that the their them then there these they this those
+through to too under until up very was we were what when where which while who whom why will with would you
+your yours
+""".split())
+
+def tokenize(text: str) -> list[str]:
+    """Splits a text into lowercase search terms, dropping stopwords and single characters."""
+    return [word for word in _WORDS.findall(text.lower()) if len(word) > 1 and word not in STOPWORDS]
+
+
+class HistoryIndex:
+    """
+    Full-text inverted index over conversation messages with BM25 ranking.
+
+    Messages are added one at a time as they are stored; each adds its postings
+    to a SQLite database, so the index survives restarts and never has to be
+    rebuilt. Searches read only the postings of the query's terms, which are
+    stored together by term.
+    """
+    def __init__(self, index_file: str | None, roles: tuple[str, ...] = INDEXED_ROLES):
+        """
+        Initializes the HistoryIndex.
+
+        Args:
+            index_file: SQLite file holding the index, or None to keep it in memory.
+            roles: Message roles that are indexed; others are ignored by `add`.
+        """
+        self.roles = roles
+        self._lock = threading.Lock()
+        if index_file:
+            index_file = os.path.abspath(index_file)
+            os.makedirs(os.path.dirname(index_file), exist_ok=True)
+        self.index_file = index_file
+        self._conn = sqlite3.connect(index_file or ":memory:", check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+        count, total_length = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(length), 0) FROM documents").fetchone()
+        self._documents = count # Corpus statistics for BM25, kept up to date by add()
+        self._total_length = total_length
+
+    def __len__(self) -> int:
+        return self._documents
+
+    def add(self, message: dict) -> bool:
+        """
+        Indexes one message ({"role", "content", "timestamp"}).
+
+        Returns:
+            True if the message was indexed, False if its role is not indexed.
+        """
+        return self.add_many([message]) == 1
+
+    def add_many(self, messages: list[dict]) -> int:
+        """
+        Indexes several messages in one transaction.
+
+        Returns:
+            The number of messages indexed.
+        """
+        indexed = added_length = 0
+        with self._lock:
+            try:
+                for message in messages:
+                    if message.get("role") not in self.roles:
+                        continue
+                    terms = Counter(tokenize(message["content"]))
+                    length = sum(terms.values())
+                    cursor = self._conn.execute(
+                        "INSERT INTO documents (role, content, timestamp, length) VALUES (?, ?, ?, ?)",
+                        (message["role"], message["content"], message.get("timestamp"), length),
+                    )
+                    self._conn.executemany(
+                        "INSERT INTO postings (term, doc_id, tf, length) VALUES (?, ?, ?, ?)",
+                        [(term, cursor.lastrowid, tf, length) for term, tf in terms.items()],
+                    )
+                    added_length += length
+                    indexed += 1
+                if indexed:
+                    self._conn.commit()
+            except BaseException:
+                self._conn.rollback() # Leave no half-indexed batch behind
+                raise
+            # The counters feed BM25 scoring, so they only change once the batch is stored
+            self._documents += indexed
+            self._total_length += added_length
+        return indexed
+
+    def search(self, query: str, k: int = 5, before: str | None = None) -> list[dict]:
+        """
+        Finds the messages most relevant to a query.
+
+        Args:
+            query: Free text; it is tokenized like the indexed messages.
+            k: Maximum number of results.
+            before: Optional ISO timestamp; only messages stored earlier are returned.
+
+        Returns:
+            Up to `k` message dictionaries, best match first, each with a "score".
+        """
+        terms = set(tokenize(query))
+        if not terms or k <= 0:
+            return []
+        with self._lock:
+            documents = self._documents
+            if not documents:
+                return []
+            average_length = self._total_length / documents
+            # Messages are indexed in time order, so a time bound is an id bound
+            end_id = None
+            if before is not None:
+                end_id = self._conn.execute("SELECT MIN(id) FROM documents WHERE timestamp >= ?", (before,)).fetchone()[0]
+            if end_id is None:
+                end_id = self._conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM documents").fetchone()[0]
+            frequencies = {}
+            for term in terms:
+                df = self._conn.execute("SELECT COUNT(*) FROM postings WHERE term = ?", (term,)).fetchone()[0]
+                if df:
+                    frequencies[term] = df
+            # Near-zero idf terms are skipped when the query has rarer ones, so their long
+            # postings lists are never read
+            rare = {term: df for term, df in frequencies.items() if df <= COMMON_TERM_FRACTION * documents}
+            scores: dict[int, float] = {}
+            for term, df in (rare or frequencies).items():
+                idf = math.log(1 + (documents - df + 0.5) / (df + 0.5))
+                rows = self._conn.execute(
+                    "SELECT doc_id, tf, length FROM postings WHERE term = ? AND doc_id < ?",
+                    (term, end_id),
+                ).fetchall()
+                for doc_id, tf, length in rows:
+                    norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (BM25_K1 + 1) / norm
+            # Ties go to the more recent message
+            best = heapq.nlargest(k, scores.items(), key=lambda item: (item[1], item[0]))
+            if not best:
+                return []
+            rows = self._conn.execute(
+                f"SELECT id, role, content, timestamp FROM documents WHERE id IN ({', '.join('?' * len(best))})",
+                [doc_id for doc_id, _ in best],
+            ).fetchall()
+        by_id = {row[0]: row for row in rows}
+        return [
+            {"role": by_id[doc_id][1], "content": by_id[doc_id][2], "timestamp": by_id[doc_id][3], "score": score}
+            for doc_id, score in best
+        ]
+
+    def clear(self):
+        """Removes every indexed message."""
+        with self._lock:
+            self._conn.execute("DELETE FROM postings")
+            self._conn.execute("DELETE FROM documents")
+            self._conn.commit()
+            self._documents = 0
+            self._total_length = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            terms = self._conn.execute("SELECT COUNT(DISTINCT term) FROM postings").fetchone()[0]
+        return {
+            "documents": self._documents,
+            "terms": terms,
+            "average_length": self._total_length / self._documents if self._documents else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
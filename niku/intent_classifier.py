@@ -0,0 +1,94 @@
+import re
+import zlib
+import numpy as np
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9']+")
+
+def _example_fields(example) -> tuple[str, str]:
+    """Reads (text, label) from a dict or a cohere.ClassifyExample."""
+    if isinstance(example, dict):
+        return example["text"], example["label"]
+    return example.text, example.label
+
+
+class LocalIntentClassifier:
+    """
+    Nearest-centroid intent classifier over hashed n-gram features.
+
+    The feature matrix and label centroids are built once from the example set;
+    predicting is a single hashed vectorization and a matrix-vector product.
+    """
+    def __init__(self, examples: list, n_features: int = 4096, temperature: float = 0.15):
+        """
+        Initializes the classifier from a set of labelled examples.
+
+        Args:
+            examples: Dicts with "text" and "label" keys, or cohere.ClassifyExample objects.
+            n_features: Size of the hashed feature space.
+            temperature: Softmax temperature used to turn centroid similarities
+                         into a confidence score. Similarities of this few-shot
+                         model are close together, so a low temperature makes
+                         near ties look certain; 0.15 keeps held-out mistakes
+                         below DecisionEngine's default threshold
+                         (see benchmarks/bench_intent_classifier.py).
+        """
+        if not examples:
+            raise ValueError("LocalIntentClassifier needs at least one example.")
+        self.n_features = n_features
+        self.temperature = temperature
+
+        texts, labels = zip(*(_example_fields(example) for example in examples))
+        self.labels = sorted(set(labels))
+        # IDF weights down n-grams shared by many examples ("what", "is", "it").
+        term_counts = np.vstack([self._term_frequencies(text) for text in texts])
+        document_frequency = (term_counts > 0).sum(axis=0)
+        self.idf = (np.log((1 + len(texts)) / (1 + document_frequency)) + 1).astype(np.float32)
+        self.features = np.vstack([self._normalize(tf * self.idf) for tf in term_counts]) # Cached example feature matrix
+        label_index = np.array([self.labels.index(label) for label in labels])
+
+        centroids = np.zeros((len(self.labels), n_features), dtype=np.float32)
+        np.add.at(centroids, label_index, self.features)
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        self.centroids = centroids / np.where(norms == 0, 1, norms)
+
+    def _feature_ids(self, text: str) -> list[int]:
+        """Hashes word unigrams, word bigrams and character trigrams to feature ids."""
+        words = _TOKEN_PATTERN.findall(text.lower())
+        grams = [f"w:{word}" for word in words]
+        grams += [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+        for word in words:
+            padded = f"<{word}>"
+            grams += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+        return [zlib.crc32(gram.encode('utf-8')) % self.n_features for gram in grams]
+
+    def _term_frequencies(self, text: str) -> np.ndarray:
+        """Returns the sublinear term-frequency vector of a text."""
+        vector = np.zeros(self.n_features, dtype=np.float32)
+        feature_ids = self._feature_ids(text)
+        if feature_ids:
+            ids, counts = np.unique(feature_ids, return_counts=True)
+            vector[ids] = 1 + np.log(counts)
+        return vector
+
+    @staticmethod
+    def _normalize(vector: np.ndarray) -> np.ndarray:
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def vectorize(self, text: str) -> np.ndarray:
+        """Returns the L2-normalized TF-IDF feature vector of a text."""
+        return self._normalize(self._term_frequencies(text) * self.idf)
+
+    def predict(self, text: str) -> tuple[str, float]:
+        """
+        Classifies a text.
+
+        Returns:
+            The predicted label and a confidence score between 0 and 1.
+        """
+        similarities = self.centroids @ self.vectorize(text)
+        scaled = (similarities - similarities.max()) / self.temperature
+        probabilities = np.exp(scaled)
+        probabilities /= probabilities.sum()
+        best = int(np.argmax(probabilities))
+        return self.labels[best], float(probabilities[best])
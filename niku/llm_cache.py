@@ -0,0 +1,126 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from niku.cache import LRUCache
+
+DEFAULT_CACHE_FILE = 'logs/llm_cache.sqlite3'
+DEFAULT_TTL = 24 * 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS completions (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    response TEXT NOT NULL,
+    expires_at REAL
+);
+"""
+
+def normalize_messages(messages: list[dict]) -> list[list[str]]:
+    """Reduces chat messages to (role, whitespace-collapsed content) pairs."""
+    return [[message["role"], " ".join(message["content"].split())] for message in messages]
+
+def completion_key(model: str, messages: list[dict], sampling_params: dict | None = None) -> str:
+    """Returns the content address of a completion request."""
+    payload = json.dumps(
+        [model, normalize_messages(messages), sorted((sampling_params or {}).items())],
+        ensure_ascii=False, default=str,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class CompletionCache:
+    """
+    Cache of LLM completions for prompts whose answer does not change, such as
+    parameter extraction. Lookups go to an in-memory LRU first and then to a
+    SQLite store, so entries survive restarts.
+
+    Callers opt in per call site and choose the TTL there; free-form chat is
+    never cached.
+    """
+    def __init__(self, cache_file: str = DEFAULT_CACHE_FILE, maxsize: int = 1024, default_ttl: float | None = DEFAULT_TTL):
+        """
+        Initializes the CompletionCache.
+
+        Args:
+            cache_file: SQLite file for the persistent store, or None for memory only.
+            maxsize: Entries kept in the in-memory LRU.
+            default_ttl: Lifetime of an entry in seconds when the call site gives none.
+                         None means entries never expire.
+        """
+        self.default_ttl = default_ttl
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = LRUCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._conn = None
+        if cache_file:
+            cache_file = os.path.abspath(cache_file)
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            self._conn = sqlite3.connect(cache_file, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+            self._conn.execute("DELETE FROM completions WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+            self._conn.commit()
+
+    def get(self, key: str) -> str | None:
+        """Returns the cached response for `key`, or None if missing or expired."""
+        response = self._memory.get(key)
+        if response is not None:
+            self.memory_hits += 1
+            return response
+        if self._conn is not None:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT response, expires_at FROM completions WHERE key = ?", (key,)
+                ).fetchone()
+            if row is not None:
+                response, expires_at = row
+                remaining = None if expires_at is None else expires_at - time.time()
+                if remaining is None or remaining > 0:
+                    self._memory.set(key, response, ttl=remaining)
+                    self.disk_hits += 1
+                    return response
+        self.misses += 1
+        return None
+
+    def put(self, key: str, model: str, response: str, ttl: float | None = None):
+        """Stores a response; `ttl` overrides the default lifetime for this entry."""
+        ttl = self.default_ttl if ttl is None else ttl
+        self._memory.set(key, response, ttl=ttl)
+        if self._conn is not None:
+            expires_at = time.time() + ttl if ttl is not None else None
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO completions (key, model, response, expires_at) VALUES (?, ?, ?, ?)",
+                    (key, model, response, expires_at),
+                )
+                self._conn.commit()
+
+    def clear(self):
+        """Removes all entries from memory and disk."""
+        self._memory.clear()
+        if self._conn is not None:
+            with self._lock:
+                self._conn.execute("DELETE FROM completions")
+                self._conn.commit()
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
+                self._conn = None
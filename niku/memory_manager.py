@@ -1,46 +1,288 @@
 import json
 import os
+import queue
+import sqlite3
+import threading
+import time
+import weakref
 from datetime import datetime
 
+from niku.history_index import HistoryIndex
+
 DEFAULT_LOG_FILE = 'logs/niku_chat_history.json'
+FSYNC_POLICIES = ("always", "batch", "never")
+
+class HistoryJournal:
+    """
+    Append-only JSONL journal with a background write-behind thread.
+
+    Each message is written as one JSON line. Writes are queued and flushed by a
+    single writer thread in batches, so callers never block on disk I/O. The
+    same thread adds each batch to the search index, if there is one.
+    """
+    def __init__(self, journal_file: str, fsync_policy: str = "batch", flush_interval: float = 0.05,
+                 index: HistoryIndex | None = None):
+        """
+        Initializes the journal and starts its writer thread.
+
+        Args:
+            journal_file: The path to the JSONL journal file.
+            fsync_policy: "always" fsyncs after every record, "batch" after every
+                          written batch, "never" leaves durability to the OS.
+            flush_interval: Seconds the writer waits after the first queued record
+                            to collect more records into the same batch.
+            index: Search index every appended record is added to.
+        """
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"fsync_policy must be one of {FSYNC_POLICIES}, got '{fsync_policy}'.")
+        self.journal_file = os.path.abspath(journal_file)
+        self.fsync_policy = fsync_policy
+        self.flush_interval = flush_interval
+        self.index = index
+        self._queue = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="niku-history-journal", daemon=True)
+        self._thread.start()
+
+    def read_records(self) -> list[dict]:
+        """Reads all records from the journal, skipping torn or malformed lines."""
+        records = []
+        if not os.path.exists(self.journal_file):
+            return records
+        try:
+            with open(self.journal_file, 'r', encoding='utf-8') as f:
+                for line_no, line in enumerate(f, start=1):
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        records.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        print(f"Warning: Skipping malformed journal line {line_no} in {self.journal_file}.")
+        except IOError as e:
+            print(f"Error reading journal {self.journal_file}: {e}")
+        return records
+
+    def append(self, record: dict):
+        """Queues a single record to be appended to the journal."""
+        if self._closed:
+            print(f"Error: Journal {self.journal_file} is closed; record dropped.")
+            return
+        self._queue.put(("append", record))
+
+    def rewrite(self, records: list[dict]):
+        """Queues a compaction that atomically replaces the journal with `records`."""
+        if self._closed:
+            return
+        self._queue.put(("rewrite", list(records)))
+
+    def reindex(self, records: list[dict]):
+        """Queues records that are already journaled to be added to the search index."""
+        if self._closed or self.index is None:
+            return
+        self._queue.put(("index", list(records)))
+
+    def clear_index(self):
+        """Queues emptying the search index, after the records queued so far."""
+        if self._closed or self.index is None:
+            return
+        self._queue.put(("clear_index", None))
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """
+        Blocks until every record queued so far has been written and indexed.
+
+        Returns:
+            True if the flush completed within the timeout.
+        """
+        if self._closed or not self._thread.is_alive():
+            return True
+        done = threading.Event()
+        self._queue.put(("flush", done))
+        return done.wait(timeout)
+
+    def close(self, timeout: float | None = 5.0):
+        """Flushes all pending records and stops the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(("close", None))
+        self._thread.join(timeout)
+
+    def _run(self):
+        """Writer thread: drains the queue in batches and writes them to disk."""
+        running = True
+        while running:
+            ops = [self._queue.get()]
+            if ops[0][0] == "append" and self.flush_interval > 0:
+                time.sleep(self.flush_interval)
+            while True:
+                try:
+                    ops.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            pending_lines = []
+            pending_index = []
+            waiters = []
+            for op, payload in ops:
+                if op == "append":
+                    pending_lines.append(json.dumps(payload, ensure_ascii=False))
+                    pending_index.append(payload)
+                elif op == "index":
+                    pending_index.extend(payload)
+                elif op == "clear_index":
+                    pending_index = []
+                    self._clear_index()
+                elif op == "rewrite":
+                    # Records queued before the compaction are already part of its snapshot.
+                    pending_lines = []
+                    self._write_atomic(payload)
+                elif op == "flush":
+                    waiters.append(payload)
+                elif op == "close":
+                    running = False
+            if pending_lines:
+                self._write_lines(pending_lines)
+            if pending_index and self.index is not None:
+                self._add_to_index(pending_index)
+            for waiter in waiters:
+                waiter.set()
+
+    def _write_lines(self, lines: list[str]):
+        """Appends lines to the journal, applying the fsync policy."""
+        try:
+            os.makedirs(os.path.dirname(self.journal_file), exist_ok=True)
+            with open(self.journal_file, 'a', encoding='utf-8') as f:
+                for line in lines:
+                    f.write(line + "\n")
+                    if self.fsync_policy == "always":
+                        f.flush()
+                        os.fsync(f.fileno())
+                if self.fsync_policy == "batch":
+                    f.flush()
+                    os.fsync(f.fileno())
+        except IOError as e:
+            print(f"Error writing to journal {self.journal_file}: {e}")
+
+    def _add_to_index(self, records: list[dict]):
+        try:
+            self.index.add_many(records)
+        except sqlite3.Error as e:
+            print(f"Error indexing history in {self.index.index_file}: {e}")
+
+    def _clear_index(self):
+        if self.index is None:
+            return
+        try:
+            self.index.clear()
+        except sqlite3.Error as e:
+            print(f"Error clearing history index {self.index.index_file}: {e}")
+
+    def _write_atomic(self, records: list[dict]):
+        """Replaces the journal with `records` via a temporary file and rename."""
+        tmp_file = self.journal_file + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(self.journal_file), exist_ok=True)
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                for record in records:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                f.flush()
+                if self.fsync_policy != "never":
+                    os.fsync(f.fileno())
+            os.replace(tmp_file, self.journal_file)
+        except IOError as e:
+            print(f"Error compacting journal {self.journal_file}: {e}")
+
+
+def _close_history(journal: HistoryJournal, index: HistoryIndex | None):
+    """Closes a ConversationHistory's journal, then its index."""
+    journal.close()
+    if index is not None:
+        index.close()
+
 
 class ConversationHistory:
     """
-    Manages the conversation history using a JSON file.
+    Manages the conversation history using an append-only JSONL journal.
     """
-    def __init__(self, log_file: str = DEFAULT_LOG_FILE, max_history_len: int | None = None):
+    def __init__(self, log_file: str | None = DEFAULT_LOG_FILE, max_history_len: int | None = None,
+                 fsync_policy: str = "batch", flush_interval: float = 0.05, search_index: bool = True):
         """
         Initializes the ConversationHistory.
 
         Args:
-            log_file: The path to the JSON file for storing conversation logs.
-            max_history_len: Optional. Maximum number of messages to keep in history.
-                               If None, all history is kept.
+            log_file: The path to the conversation log. A legacy `.json` path is
+                      journaled next to it as `.jsonl`; its contents are imported
+                      the first time the journal is created. None keeps the
+                      history (and its search index) in memory only.
+            max_history_len: Optional. Retention limit of this single session, like
+                             SessionStore's per-session retention: older messages
+                             are trimmed from the journal when a message is added,
+                             and reads never copy the whole history. If None, all
+                             history is kept.
+            fsync_policy: Journal durability policy ("always", "batch" or "never").
+            flush_interval: Seconds the journal writer waits to batch records.
+            search_index: Keep a full-text index of every message, next to the
+                          journal as `.index.sqlite3`, for `search`. Messages stay
+                          searchable after they are trimmed from the history, and
+                          become searchable once the journal writer has stored them.
         """
-        self.log_file = os.path.abspath(log_file)
         self.max_history_len = max_history_len
+        self._journaled_records = 0
+        if log_file is None:
+            self.log_file = self.journal_file = self.index_file = None
+            self.index = HistoryIndex(None) if search_index else None
+            self._journal = None
+            self._finalizer = None
+            self.history = []
+            return
+        self.log_file = os.path.abspath(log_file)
+        root, ext = os.path.splitext(self.log_file)
+        self.journal_file = self.log_file if ext == ".jsonl" else root + ".jsonl"
+        self.index_file = root + ".index.sqlite3" if search_index else None
+        self.index = HistoryIndex(self.index_file) if search_index else None
+        self._journal = HistoryJournal(self.journal_file, fsync_policy=fsync_policy, flush_interval=flush_interval,
+                                       index=self.index)
         self.history = self._load_history()
+        if self.index is not None and not len(self.index) and self.history:
+            self._journal.reindex(self.history) # Index history recorded before the index existed
+        # Closed at exit or when the instance is collected, whichever comes first; unlike
+        # atexit.register(self.close), this keeps no reference to the instance itself.
+        self._finalizer = weakref.finalize(self, _close_history, self._journal, self.index)
 
     def _load_history(self) -> list[dict]:
-        """Loads conversation history from the JSON file."""
-        if os.path.exists(self.log_file):
-            try:
-                with open(self.log_file, 'r', encoding= 'utf-8') as f:
-                    return json.load(f)
-            except (json.JSONDecodeError, IOError) as e:
-                print(f"Error loading history from {self.log_file}: {e}. Starting with empty history.")
-                return []
-        return []
-
-    def _save_history(self):
-        """Saves the current conversation history to the JSON file."""
+        """Loads conversation history from the journal, importing the legacy JSON log if needed."""
+        if os.path.exists(self.journal_file):
+            history = self._journal.read_records()
+        else:
+            history = self._load_legacy_history()
+            if history:
+                self._journal.rewrite(history)
+        self._journaled_records = len(history)
+
+        if self.max_history_len is not None and len(history) > self.max_history_len:
+            history = history[-self.max_history_len:]
+            self._save_history(history)
+        return history
+
+    def _load_legacy_history(self) -> list[dict]:
+        """Loads history from the pretty-printed JSON log used before the journal."""
+        if self.log_file == self.journal_file or not os.path.exists(self.log_file):
+            return []
         try:
-            # Create directory if it doesn't exist
-            os.makedirs(os.path.dirname(self.log_file), exist_ok=True)
-            with open(self.log_file, 'w', encoding='utf-8') as f:
-                json.dump(self.history, f, indent=4, ensure_ascii=False)
-        except IOError as e:
-            print(f"Error saving history to {self.log_file}: {e}")
+            with open(self.log_file, 'r', encoding= 'utf-8') as f:
+                return json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            print(f"Error loading history from {self.log_file}: {e}. Starting with empty history.")
+            return []
+
+    def _save_history(self, history: list[dict] | None = None):
+        """Compacts the journal in the background so it holds exactly the current history."""
+        history = self.history if history is None else history
+        if self._journal is not None:
+            self._journal.rewrite(history)
+        self._journaled_records = len(history)
 
     def add_message(self, role: str, content: str):
         """
@@ -60,11 +302,17 @@ class ConversationHistory:
             "timestamp": datetime.now().isoformat(), # ISO 8601 format
         }
         self.history.append(message)
+        if self._journal is not None:
+            self._journal.append(message) # Also indexes it, off the caller's thread
+        elif self.index is not None:
+            self.index.add(message) # Nothing touches the disk without a log file
+        self._journaled_records += 1
 
         if self.max_history_len is not None and len(self.history) > self.max_history_len:
-            self.history = self.history[-self.max_history_len:]
-
-        self._save_history()
+            del self.history[:-self.max_history_len]
+            # Compact once trimmed records make up half of the journal.
+            if self._journaled_records >= 2 * max(self.max_history_len, 1):
+                self._save_history()
 
     def get_history(self) -> list[dict]:
         """
@@ -75,11 +323,57 @@ class ConversationHistory:
         """
         return self.history.copy() # Return a copy to prevent external modification
 
+    async def load(self):
+        """The history is read when the instance is created; nothing is left to load."""
+
+    def get_recent(self, n: int) -> list[dict]:
+        """
+        Retrieves the last `n` messages without copying the whole history.
+
+        Returns:
+            A list of at most `n` message dictionaries, oldest first.
+        """
+        return self.history[-n:] if n > 0 else []
+
+    def search(self, query: str, k: int = 5, before: str | None = None) -> list[dict]:
+        """
+        Finds the stored messages most relevant to a query (BM25 ranking),
+        including messages already trimmed from the history.
+
+        Args:
+            query: Free text, e.g. "what did I ask about Paris".
+            k: Maximum number of results.
+            before: Optional ISO timestamp; only earlier messages are returned.
+
+        Returns:
+            Up to `k` message dictionaries with a "score", best match first.
+            Empty if the history has no search index.
+        """
+        if self.index is None:
+            return []
+        return self.index.search(query, k, before)
+
     def clear_history(self):
         """Clears the conversation history."""
         self.history = []
         self._save_history()
-        print(f"Conversation history cleared from {self.log_file}")
+        if self._journal is None:
+            if self.index is not None:
+                self.index.clear()
+            return
+        self._journal.clear_index()
+        print(f"Conversation history cleared from {self.journal_file}")
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Blocks until all queued history writes have reached the journal."""
+        return self._journal.flush(timeout) if self._journal is not None else True
+
+    def close(self):
+        """Flushes pending writes and stops the background journal writer."""
+        if self._finalizer is not None:
+            self._finalizer() # Runs once; later calls and the exit hook do nothing
+        elif self.index is not None:
+            self.index.close()
 
 if __name__ == "__main__":
     # Example Usage
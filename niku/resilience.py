@@ -0,0 +1,405 @@
+import asyncio
+import inspect
+import random
+import threading
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable
+from concurrent import futures
+from typing import Any, TypeVar
+
+T = TypeVar("T")
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a service whose circuit breaker is open."""
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Decides whether a failed call may succeed if repeated: client errors such
+    as a bad request or a rejected API key are final, everything else
+    (timeouts, connection errors, 5xx, 429) is worth another attempt.
+    """
+    if isinstance(error, CircuitOpenError):
+        return False
+    status_code = getattr(error, "status_code", None)
+    if isinstance(status_code, int) and 400 <= status_code < 500:
+        return status_code in (408, 409, 429)
+    return True
+
+
+class LatencyTracker:
+    """
+    Sliding window of recent call latencies, for percentile estimates.
+    """
+    def __init__(self, window: int = 256):
+        self._samples: deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> float | None:
+        """Nearest-rank percentile of the window, or None if it is empty."""
+        with self._lock:
+            ordered = sorted(self._samples)
+        if not ordered:
+            return None
+        return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))]
+
+
+class CircuitBreaker:
+    """
+    Fails fast after repeated errors, then lets a single trial call through
+    once `reset_timeout` has passed; its outcome closes or re-opens the circuit.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """
+        Args:
+            failure_threshold: Consecutive failures that open the circuit.
+            reset_timeout: Seconds the circuit stays open before a trial call.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened = 0 # Times the circuit has opened
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Returns whether a call may be made now."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial_running = False
+            if self.state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_running = False
+
+    def release(self):
+        """
+        Ends a call that was cancelled before it had an outcome. A half-open
+        trial is given back, so the next call can become the trial instead of
+        every call being rejected forever.
+        """
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.opened += 1
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._trial_running = False
+
+
+class ResilienceStats:
+    """
+    Counters of one ResiliencePolicy.
+    """
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0 # Calls that failed after every attempt
+        self.timeouts = 0 # Attempts abandoned at the adaptive timeout
+        self.retries = 0
+        self.hedges = 0 # Hedged requests sent
+        self.hedge_wins = 0 # Hedged requests that answered first
+        self.rejected = 0 # Calls refused by the open circuit breaker
+        self._lock = threading.Lock() # call_sync runs on many threads at once
+
+    def add(self, counter: str, amount: int = 1):
+        """Increments one counter."""
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {name: value for name, value in vars(self).items() if not name.startswith("_")}
+
+
+class ResiliencePolicy:
+    """
+    Timeouts, hedging, retries and a circuit breaker for calls to one service.
+
+    Each attempt gets a timeout derived from the observed latency (a multiple
+    of its p99, within bounds). If an attempt has not answered after the
+    observed p95, a second, hedged request is sent and whichever answers first
+    wins; the other is cancelled. Failed attempts are retried with full-jitter
+    exponential backoff, and consecutive failures open the circuit breaker so
+    later calls fail fast instead of waiting on a dead service.
+
+    Requests are created by a factory called with the request number within
+    the attempt (0 for the first request, 1 for the hedge), so a hedge can go
+    to a different model or endpoint.
+    """
+    def __init__(self, name: str, initial_timeout: float = 10.0, min_timeout: float = 1.0, max_timeout: float = 30.0,
+                 timeout_multiplier: float = 3.0, hedge: bool = True, hedge_quantile: float = 0.95,
+                 min_hedge_delay: float = 0.05, min_samples: int = 20, max_attempts: int = 3,
+                 backoff_base: float = 0.1, backoff_max: float = 2.0, breaker: CircuitBreaker | None = None,
+                 retryable: Callable[[BaseException], bool] = is_retryable, max_workers: int = 16):
+        """
+        Initializes the ResiliencePolicy.
+
+        Args:
+            name: Service name used in error messages.
+            initial_timeout: Attempt timeout (seconds) until enough latencies were observed.
+            min_timeout: Lower bound of the adaptive timeout.
+            max_timeout: Upper bound of the adaptive timeout.
+            timeout_multiplier: The adaptive timeout is this multiple of the observed p99.
+            hedge: Send a hedged request when the first one is slow.
+            hedge_quantile: Latency percentile after which the hedge is sent.
+            min_hedge_delay: Lower bound of the hedge delay in seconds.
+            min_samples: Observed latencies needed before timeouts adapt and hedging starts.
+            max_attempts: Attempts per call, including the first.
+            backoff_base: Backoff before the first retry (upper bound of the jitter).
+            backoff_max: Upper bound of any backoff.
+            breaker: Circuit breaker; one with default settings if None.
+            retryable: Decides whether an error is worth another attempt.
+            max_workers: Threads available to call_sync for concurrent requests.
+        """
+        self.name = name
+        self.initial_timeout = initial_timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.timeout_multiplier = timeout_multiplier
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.min_hedge_delay = min_hedge_delay
+        self.min_samples = min_samples
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.retryable = retryable
+        self.latency = LatencyTracker()
+        self.stats = ResilienceStats()
+        self._max_workers = max_workers
+        self._executor: futures.ThreadPoolExecutor | None = None
+        self._executor_lock = threading.Lock()
+
+    def timeout(self) -> float:
+        """Current per-attempt timeout in seconds."""
+        if len(self.latency) < self.min_samples:
+            return self.initial_timeout
+        p99 = self.latency.percentile(0.99)
+        return min(self.max_timeout, max(self.min_timeout, p99 * self.timeout_multiplier))
+
+    def hedge_delay(self) -> float | None:
+        """Seconds after which a hedged request is sent, or None if hedging is off."""
+        if not self.hedge or len(self.latency) < self.min_samples:
+            return None
+        return max(self.min_hedge_delay, self.latency.percentile(self.hedge_quantile))
+
+    def backoff(self, retry: int) -> float:
+        """Full-jitter exponential backoff before retry number `retry` (0-based)."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** retry))
+
+    def _start_call(self):
+        self.stats.add("calls")
+        if not self.breaker.allow():
+            self.stats.add("rejected")
+            raise CircuitOpenError(f"{self.name} circuit breaker is open after repeated failures")
+
+    def _give_up(self, error: BaseException, attempt: int) -> bool:
+        """Records a failed attempt and decides whether to stop retrying."""
+        self.breaker.record_failure()
+        if attempt + 1 >= self.max_attempts or not self.retryable(error) or not self.breaker.allow():
+            self.stats.add("failures")
+            return True
+        self.stats.add("retries")
+        return False
+
+    def _timed_out(self, timeout: float) -> TimeoutError:
+        self.stats.add("timeouts")
+        self.latency.observe(timeout) # A timeout is at least this slow; lets the timeout grow
+        return TimeoutError(f"{self.name} did not answer within {timeout:.2f}s")
+
+    async def call(self, request: Callable[[int], Awaitable[T]],
+                   discard: Callable[[T], Any] | None = None) -> T:
+        """
+        Runs an async request under the policy.
+
+        Args:
+            request: Called with the request number; returns the awaitable request.
+            discard: Optional. Releases the result of a request that lost the race
+                     (e.g. closes a response stream); may be a coroutine function.
+
+        Returns:
+            The first successful result.
+
+        Raises:
+            CircuitOpenError: If the circuit breaker is open.
+            The last attempt's error if every attempt failed.
+        """
+        self._start_call()
+        attempt = 0
+        try:
+            while True:
+                try:
+                    result = await self._attempt(request, discard)
+                    self.breaker.record_success()
+                    return result
+                except Exception as e:
+                    if self._give_up(e, attempt):
+                        raise
+                await asyncio.sleep(self.backoff(attempt))
+                attempt += 1
+        except BaseException: # E.g. cancelled mid-call; failures were already recorded
+            self.breaker.release()
+            raise
+
+    async def _attempt(self, request: Callable[[int], Awaitable[T]], discard: Callable[[T], Any] | None) -> T:
+        timeout = self.timeout()
+        delay = self.hedge_delay()
+        started = time.perf_counter()
+        tasks: dict[asyncio.Task, tuple[int, float]] = {asyncio.ensure_future(request(0)): (0, started)}
+        hedged = False
+        error: BaseException | None = None
+        try:
+            while tasks:
+                now = time.perf_counter()
+                remaining = started + timeout - now
+                if remaining <= 0:
+                    raise self._timed_out(timeout)
+                hedge_due = delay is not None and not hedged and not error
+                wait = min(remaining, max(0.0, started + delay - now)) if hedge_due else remaining
+                done, _ = await asyncio.wait(tasks, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    number, task_started = tasks.pop(task)
+                    if task.exception() is None:
+                        self.latency.observe(time.perf_counter() - task_started)
+                        self.stats.add("hedge_wins", number == 1)
+                        return task.result()
+                    error = task.exception()
+                if not done and hedge_due and time.perf_counter() >= started + delay:
+                    hedged = True
+                    self.stats.add("hedges")
+                    tasks[asyncio.ensure_future(request(1))] = (1, time.perf_counter())
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+                if discard is not None:
+                    task.add_done_callback(lambda task: self._discard_async(task, discard))
+
+    @staticmethod
+    def _discard_async(task: asyncio.Task, discard: Callable[[T], Any]):
+        if task.cancelled() or task.exception() is not None:
+            return
+        result = discard(task.result())
+        if inspect.isawaitable(result):
+            asyncio.ensure_future(result)
+
+    def call_sync(self, request: Callable[[int], T], discard: Callable[[T], Any] | None = None) -> T:
+        """
+        Runs a blocking request under the policy, like `call`. Requests run in
+        worker threads, which cannot be interrupted: a request that loses the
+        race or times out finishes in the background and its result is discarded.
+        """
+        self._start_call()
+        attempt = 0
+        try:
+            while True:
+                try:
+                    result = self._attempt_sync(request, discard)
+                    self.breaker.record_success()
+                    return result
+                except Exception as e:
+                    if self._give_up(e, attempt):
+                        raise
+                time.sleep(self.backoff(attempt))
+                attempt += 1
+        except BaseException: # E.g. cancelled mid-call; failures were already recorded
+            self.breaker.release()
+            raise
+
+    def _get_executor(self) -> futures.ThreadPoolExecutor:
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = futures.ThreadPoolExecutor(max_workers=self._max_workers,
+                                                                thread_name_prefix=f"niku-{self.name}")
+        return self._executor
+
+    def _attempt_sync(self, request: Callable[[int], T], discard: Callable[[T], Any] | None) -> T:
+        executor = self._get_executor()
+        timeout = self.timeout()
+        delay = self.hedge_delay()
+        started = time.perf_counter()
+        pending: dict[futures.Future, tuple[int, float]] = {executor.submit(request, 0): (0, started)}
+        hedged = False
+        error: BaseException | None = None
+        try:
+            while pending:
+                now = time.perf_counter()
+                remaining = started + timeout - now
+                if remaining <= 0:
+                    raise self._timed_out(timeout)
+                hedge_due = delay is not None and not hedged and not error
+                wait = min(remaining, max(0.0, started + delay - now)) if hedge_due else remaining
+                done, _ = futures.wait(pending, timeout=wait, return_when=futures.FIRST_COMPLETED)
+                for future in done:
+                    number, future_started = pending.pop(future)
+                    if future.exception() is None:
+                        self.latency.observe(time.perf_counter() - future_started)
+                        self.stats.add("hedge_wins", number == 1)
+                        return future.result()
+                    error = future.exception()
+                if not done and hedge_due and time.perf_counter() >= started + delay:
+                    hedged = True
+                    self.stats.add("hedges")
+                    pending[executor.submit(request, 1)] = (1, time.perf_counter())
+            raise error
+        finally:
+            for future in pending:
+                future.cancel()
+                if discard is not None:
+                    future.add_done_callback(
+                        lambda future: future.cancelled() or future.exception() is not None or discard(future.result())
+                    )
+
+    def to_dict(self) -> dict:
+        return {
+            **self.stats.to_dict(),
+            "timeout": self.timeout(),
+            "hedge_delay": self.hedge_delay(),
+            "p50": self.latency.percentile(0.50),
+            "p95": self.latency.percentile(0.95),
+            "p99": self.latency.percentile(0.99),
+            "circuit": self.breaker.state,
+        }
+
+    def __repr__(self) -> str:
+        stats = self.stats
+        return (f"ResiliencePolicy({self.name}: calls={stats.calls}, hedges={stats.hedges} (won {stats.hedge_wins}), "
+                f"retries={stats.retries}, timeouts={stats.timeouts}, failures={stats.failures}, "
+                f"rejected={stats.rejected}, circuit={self.breaker.state}, timeout={self.timeout():.2f}s)")
+
+    def close(self):
+        """Stops the worker threads used by call_sync."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
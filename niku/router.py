@@ -0,0 +1,206 @@
+import re
+import threading
+from collections.abc import Callable
+from datetime import datetime
+
+from niku.context_builder import count_tokens
+from niku.groq_client import DEFAULT_MODEL
+from niku.tracing import Histogram
+
+SMALL_MODEL = "llama-3.1-8b-instant"
+DEFAULT_LATENCY_BUDGET = 2.0 # Seconds a reply from the large model may be expected to take
+SMALL_TALK_INTENTS = {"general_chat", "tell_joke"}
+SHORT_INPUT_TOKENS = 16 # Small talk up to this long goes to the small model
+SMALL_MODEL_MAX_PROMPT_TOKENS = 512 # Longer prompts always go to the large model
+LATENCY_SMOOTHING = 0.2 # Weight of the newest observation in the moving average
+LATENCY_PROBE_INTERVAL = 10 # While over budget, every Nth reply still uses the large model to re-measure it
+LOCAL_CONFIDENCE = 0.8 # Local classifier confidence needed to answer an intent without a model
+
+def answer_time(user_input: str) -> str:
+    """Answers get_time from the local clock."""
+    now = datetime.now()
+    return f"It's {now.strftime('%I:%M %p').lstrip('0')} on {now.strftime('%A, %B')} {now.day}, {now.year}."
+
+def answer_identity(user_input: str) -> str:
+    """Answers identity_query with a fixed introduction."""
+    return ("I'm Niku, an AI assistant. I can chat with you, tell jokes, "
+            "and tell you the time or the weather anywhere in the world.")
+
+# Intents answered without any model call
+LOCAL_HANDLERS: dict[str, Callable[[str], str]] = {
+    "get_time": answer_time,
+    "identity_query": answer_identity,
+}
+
+# Wordings that are answered locally whatever the classifier's confidence. They
+# must match the whole input: "what time is it in tokyo" is not a local clock question.
+LOCAL_PATTERNS: dict[str, re.Pattern] = {
+    "get_time": re.compile(r"(what|what's) (is )?(the )?(current )?(time|day|date)( is it)?( now| right now| today)?( please)?"
+                           r"|(tell me |give me )?the (current )?(time|date)( please)?"),
+    "identity_query": re.compile(r"who are you|(what|what's) (is )?your name|who (built|made|created) you"
+                                 r"|are you (a |an )?(robot|bot|ai|human|person)"),
+}
+_NON_WORD = re.compile(r"[^\w\s']")
+
+def matches_local_pattern(pattern: re.Pattern | None, user_input: str) -> bool:
+    """Whether the whole input, lower-cased and without punctuation, matches a local wording."""
+    return pattern is not None and pattern.fullmatch(" ".join(_NON_WORD.sub(" ", user_input.lower()).split())) is not None
+
+class Route:
+    """
+    Where one reply is produced: "local" (a deterministic handler), "small" or
+    "large" (a model), and why.
+    """
+    def __init__(self, kind: str, reason: str, model: str | None = None,
+                 handler: Callable[[str], str] | None = None):
+        self.kind = kind
+        self.reason = reason
+        self.model = model
+        self.handler = handler
+
+    def __repr__(self) -> str:
+        target = self.model or getattr(self.handler, "__name__", "handler")
+        return f"Route({self.kind}: {target}, {self.reason})"
+
+
+class RouteStats:
+    """
+    Decision counts and reply latencies of one route.
+    """
+    def __init__(self):
+        self.decisions = 0
+        self.errors = 0
+        self.reasons: dict[str, int] = {}
+        self.latency = Histogram()
+        self.average_latency: float | None = None # Exponential moving average, in seconds
+
+    def to_dict(self) -> dict:
+        return {
+            "decisions": self.decisions,
+            "errors": self.errors,
+            "reasons": dict(self.reasons),
+            "average_latency": self.average_latency,
+            "latency": self.latency.to_dict(),
+        }
+
+
+class ModelRouter:
+    """
+    Chooses how to answer each turn that has no tool: a local handler for
+    intents with a deterministic answer when the intent can be trusted (Cohere
+    labelled it, the local classifier is confident, or the wording is one of the
+    handler's known phrasings), the small model for short small talk
+    and whenever the large model is running over the latency budget, and the
+    large model otherwise. Long prompts always go to the large model.
+
+    While the large model is over budget, an occasional reply is still sent to
+    it so its latency estimate can recover.
+    """
+    def __init__(self, large_model: str = DEFAULT_MODEL, small_model: str | None = SMALL_MODEL,
+                 latency_budget: float = DEFAULT_LATENCY_BUDGET,
+                 local_handlers: dict[str, Callable[[str], str]] | None = None,
+                 local_patterns: dict[str, re.Pattern] | None = None,
+                 local_confidence: float = LOCAL_CONFIDENCE,
+                 small_talk_intents: set[str] = SMALL_TALK_INTENTS,
+                 short_input_tokens: int = SHORT_INPUT_TOKENS,
+                 small_model_max_prompt_tokens: int = SMALL_MODEL_MAX_PROMPT_TOKENS):
+        """
+        Initializes the ModelRouter.
+
+        Args:
+            large_model: Model for everything that needs it.
+            small_model: Faster model for short or latency-critical replies; None
+                         sends every model call to the large model.
+            latency_budget: Expected reply time (seconds) of the large model above
+                            which short enough prompts are sent to the small model.
+            local_handlers: Maps intents to functions answering them locally
+                            (LOCAL_HANDLERS by default; pass {} to disable).
+            local_patterns: Maps intents to wordings answered locally regardless of
+                            confidence (LOCAL_PATTERNS by default).
+            local_confidence: Local classifier confidence needed to answer locally
+                              otherwise. A wrong label would give a confident wrong
+                              answer, so anything less goes to a model.
+            small_talk_intents: Intents whose short inputs go to the small model.
+            short_input_tokens: Maximum input length counted as short small talk.
+            small_model_max_prompt_tokens: Prompts longer than this always use the large model.
+        """
+        self.large_model = large_model
+        self.small_model = small_model
+        self.latency_budget = latency_budget
+        self.local_handlers = LOCAL_HANDLERS if local_handlers is None else local_handlers
+        self.local_patterns = LOCAL_PATTERNS if local_patterns is None else local_patterns
+        self.local_confidence = local_confidence
+        self.small_talk_intents = small_talk_intents
+        self.short_input_tokens = short_input_tokens
+        self.small_model_max_prompt_tokens = small_model_max_prompt_tokens
+        self.routes = {kind: RouteStats() for kind in ("local", "small", "large")}
+        self._over_budget = 0 # Replies sent to the small model because the large one was over budget
+        self._lock = threading.Lock()
+
+    def expected_latency(self, kind: str) -> float | None:
+        """Moving average of the observed reply latency of a route, if any were recorded."""
+        return self.routes[kind].average_latency
+
+    def route(self, intent: str, prompt_tokens: int, user_input: str,
+              confidence: float = 0.0, source: str | None = None) -> Route:
+        """
+        Chooses the route for a reply. The choice depends only on the arguments
+        and on replies recorded so far, so asking twice gives the same answer.
+
+        Args:
+            intent: The classified intent.
+            prompt_tokens: Size of the chat prompt the model would receive.
+            user_input: The user's message.
+            confidence: Confidence of the intent prediction.
+            source: Who predicted the intent ("local" or "cohere").
+        """
+        handler = self.local_handlers.get(intent)
+        if handler is not None and source == "cohere":
+            route = Route("local", "cohere intent", handler=handler)
+        elif handler is not None and source == "local" and confidence >= self.local_confidence:
+            route = Route("local", "confident local intent", handler=handler)
+        elif handler is not None and matches_local_pattern(self.local_patterns.get(intent), user_input):
+            route = Route("local", "known wording", handler=handler)
+        elif self.small_model is None or prompt_tokens > self.small_model_max_prompt_tokens:
+            route = Route("large", "long prompt" if self.small_model else "no small model", model=self.large_model)
+        elif intent in self.small_talk_intents and count_tokens(user_input) <= self.short_input_tokens:
+            route = Route("small", "short small talk", model=self.small_model)
+        elif (self.expected_latency("large") or 0.0) > self.latency_budget:
+            if self._over_budget % LATENCY_PROBE_INTERVAL == LATENCY_PROBE_INTERVAL - 1:
+                route = Route("large", "latency probe", model=self.large_model)
+            else:
+                route = Route("small", "large model over latency budget", model=self.small_model)
+        else:
+            route = Route("large", "default", model=self.large_model)
+        return route
+
+    def record(self, route: Route, seconds: float, error: bool = False):
+        """
+        Records a routing decision once its reply is complete, with how long the
+        reply took. Failed calls do not update the latency average.
+        """
+        with self._lock:
+            stats = self.routes[route.kind]
+            stats.decisions += 1
+            stats.reasons[route.reason] = stats.reasons.get(route.reason, 0) + 1
+            if route.reason in ("large model over latency budget", "latency probe"):
+                self._over_budget += 1
+            stats.latency.observe(seconds)
+            if error:
+                stats.errors += 1
+            elif stats.average_latency is None:
+                stats.average_latency = seconds
+            else:
+                stats.average_latency += LATENCY_SMOOTHING * (seconds - stats.average_latency)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {kind: stats.to_dict() for kind, stats in self.routes.items()}
+
+    def __repr__(self) -> str:
+        with self._lock:
+            parts = []
+            for kind, stats in self.routes.items():
+                average = f"{stats.average_latency * 1000:.0f} ms" if stats.average_latency is not None else "n/a"
+                parts.append(f"{kind}={stats.decisions} (avg {average})")
+        return f"ModelRouter({', '.join(parts)})"
@@ -0,0 +1,341 @@
+"""
+HTTP + WebSocket server running many Niku sessions concurrently.
+
+Endpoints:
+    POST /sessions/{session_id}/turns   {"text": "..."} -> newline-delimited JSON events
+    GET  /sessions/{session_id}/ws      WebSocket; send {"text": "..."} per turn and receive
+                                        JSON events, plus binary audio frames with ?audio=1
+    GET  /health                        Server counters
+    GET  /metrics                       Stage latency histograms (Prometheus text format)
+    GET  /metrics.json                  The same histograms as JSON
+
+Run from the repository root:
+    python -m niku.server --port 8765
+"""
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
+import os
+from collections import Counter, OrderedDict
+
+from aiohttp import web, WSMsgType
+
+from niku.groq_client import completion_policy
+from niku.session import NikuServices, NikuSession, TurnEvent
+from niku.session_store import SessionStore, DEFAULT_RETENTION
+from niku.tracing import Tracer
+from niku.tts_worker import TTSWorker, SpeechJob
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+MAX_INPUT_CHARS = 4000
+
+
+class ServerBusy(Exception):
+    """Raised when a turn cannot even be queued because the server is saturated."""
+
+
+class WebSocketAudioOutput:
+    """
+    Sends a reply's audio to a WebSocket client as binary frames, in sentence
+    order, with the same interface as AudioOutput.
+    """
+    def __init__(self, ws: web.WebSocketResponse, turn: int):
+        self.ws = ws
+        self.turn = turn
+        self.chunks = 0
+
+    async def write(self, audio: bytes | memoryview):
+        if self.ws.closed:
+            return
+        await self.ws.send_json({"type": "audio", "turn": self.turn, "index": self.chunks, "bytes": len(audio)})
+        await self.ws.send_bytes(bytes(audio))
+        self.chunks += 1
+
+    async def close(self, abort: bool = False):
+        if not self.ws.closed:
+            await self.ws.send_json({"type": "audio_end", "turn": self.turn, "chunks": self.chunks, "aborted": abort})
+
+
+class NikuServer:
+    """
+    Serves Niku sessions over HTTP and WebSocket.
+
+    Every session has its own history in a shared SessionStore and shares the
+    pooled API clients and caches in `services`. At most `max_concurrent_turns`
+    turns run at once; up to `max_waiting_turns` more wait for a slot and
+    anything beyond that is rejected straight away, so overload shows up as
+    fast 503s rather than ever-growing latency.
+    """
+    def __init__(self, services: NikuServices, store: SessionStore, max_concurrent_turns: int = 64,
+                 max_waiting_turns: int = 256, max_sessions: int = 10000):
+        """
+        Initializes the NikuServer.
+
+        Args:
+            services: Shared clients and caches used by every session.
+            store: Persistent per-session history.
+            max_concurrent_turns: Turns processed at the same time.
+            max_waiting_turns: Turns allowed to wait for a free slot.
+            max_sessions: Sessions kept in memory; the least recently used idle
+                          sessions are dropped (their history stays in the store).
+        """
+        self.services = services
+        self.store = store
+        self.max_concurrent_turns = max_concurrent_turns
+        self.max_waiting_turns = max_waiting_turns
+        self.max_sessions = max_sessions
+        self.active_turns = 0
+        self.waiting_turns = 0
+        self.completed_turns = 0
+        self.rejected_turns = 0
+        self._slots = asyncio.Semaphore(max_concurrent_turns)
+        self._sessions: OrderedDict[str, NikuSession] = OrderedDict()
+        self._leases: Counter[str] = Counter() # Requests and connections using each session
+
+    @contextlib.contextmanager
+    def use_session(self, session_id: str):
+        """
+        Holds the live session for an id while a request or connection uses it.
+        Sessions in use are never evicted, so a second request for the same id
+        gets the same session (and waits for its turn) rather than a new one.
+        """
+        self._leases[session_id] += 1
+        try:
+            yield self.get_session(session_id)
+        finally:
+            self._leases[session_id] -= 1
+            if not self._leases[session_id]:
+                del self._leases[session_id]
+
+    def get_session(self, session_id: str) -> NikuSession:
+        """Returns the live session for an id, creating it on first use."""
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._sessions[session_id] = NikuSession(self.store.session(session_id), self.services, session_id)
+            self._evict_idle_sessions()
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def _evict_idle_sessions(self):
+        """Drops the least recently used sessions beyond max_sessions that are not in use."""
+        excess = len(self._sessions) - self.max_sessions
+        if excess <= 0:
+            return
+        idle = (session_id for session_id in self._sessions if session_id not in self._leases)
+        for session_id in list(itertools.islice(idle, excess)):
+            del self._sessions[session_id]
+
+    @contextlib.asynccontextmanager
+    async def turn_slot(self):
+        """Holds one of the concurrent turn slots, raising ServerBusy if none can be waited for."""
+        if self.waiting_turns >= self.max_waiting_turns:
+            self.rejected_turns += 1
+            raise ServerBusy("Server busy, try again shortly.")
+        self.waiting_turns += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting_turns -= 1
+        self.active_turns += 1
+        try:
+            yield
+        finally:
+            self.active_turns -= 1
+            self._slots.release()
+
+    async def run_turn(self, session: NikuSession, text: str):
+        """Runs one turn within a slot, yielding its events."""
+        async with self.turn_slot():
+            async with contextlib.aclosing(session.respond(text)) as events:
+                async for event in events:
+                    yield event
+            self.completed_turns += 1
+
+    @staticmethod
+    def _parse_text(payload) -> str:
+        text = payload.get("text", "") if isinstance(payload, dict) else ""
+        if not isinstance(text, str) or not text.strip():
+            raise ValueError("Expected a JSON object with a non-empty \"text\".")
+        if len(text) > MAX_INPUT_CHARS:
+            raise ValueError(f"Text is longer than {MAX_INPUT_CHARS} characters.")
+        return text.strip()
+
+    async def handle_turn(self, request: web.Request) -> web.StreamResponse:
+        """POST /sessions/{session_id}/turns: streams the turn's events as NDJSON."""
+        try:
+            text = self._parse_text(await request.json())
+        except (ValueError, json.JSONDecodeError) as e:
+            return web.json_response({"error": str(e)}, status=400)
+        response = None
+        try:
+            with self.use_session(request.match_info["session_id"]) as session:
+                async with contextlib.aclosing(self.run_turn(session, text)) as events:
+                    async for event in events:
+                        if response is None:
+                            response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+                            await response.prepare(request)
+                        # write() waits for the socket to drain, so slow clients slow their own turn only
+                        await response.write((json.dumps(event.to_dict(), ensure_ascii=False) + "\n").encode('utf-8'))
+        except ServerBusy as e:
+            return web.json_response({"error": str(e)}, status=503, headers={"Retry-After": "1"})
+        if response is None:
+            return web.json_response({"error": "Turn produced no events."}, status=500)
+        await response.write_eof()
+        return response
+
+    async def handle_websocket(self, request: web.Request) -> web.WebSocketResponse:
+        """GET /sessions/{session_id}/ws: one turn per text message, events and audio streamed back."""
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+        with self.use_session(request.match_info["session_id"]) as session:
+            speak = request.query.get("audio") == "1" and self.services.synthesize is not None
+            tts_worker = TTSWorker(self.services.synthesize, tracer=self.services.tracer) if speak else None
+
+            try:
+                # Messages are handled one at a time; unread frames stay in the socket buffer.
+                async for message in ws:
+                    if message.type != WSMsgType.TEXT:
+                        continue
+                    try:
+                        text = self._parse_text(json.loads(message.data))
+                    except (ValueError, json.JSONDecodeError) as e:
+                        await ws.send_json(TurnEvent("error", str(e)).to_dict())
+                        continue
+
+                    speech_job = None
+                    try:
+                        async with contextlib.aclosing(self.run_turn(session, text)) as events:
+                            async for event in events:
+                                if event.kind == "token" and tts_worker is not None:
+                                    if speech_job is None:
+                                        tts_worker.cancel_pending() # A new reply interrupts stale audio
+                                        speech_job = SpeechJob(WebSocketAudioOutput(ws, session.turns + 1), trace=session.trace)
+                                        await tts_worker.submit(speech_job)
+                                    speech_job.feed(event.text)
+                                elif event.kind == "error" and speech_job is not None:
+                                    tts_worker.cancel(speech_job) # The reply was cut off
+                                await ws.send_json(event.to_dict())
+                    except ServerBusy as e:
+                        await ws.send_json(TurnEvent("error", str(e), source="Server").to_dict())
+                    finally:
+                        if speech_job is not None:
+                            speech_job.finish()
+            finally:
+                if tts_worker is not None:
+                    await tts_worker.drain(timeout=10)
+        return ws
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats())
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(text=self.services.tracer.prometheus_text(), content_type="text/plain")
+
+    async def handle_metrics_json(self, request: web.Request) -> web.Response:
+        return web.json_response(self.services.tracer.to_dict())
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self._sessions),
+            "active_turns": self.active_turns,
+            "waiting_turns": self.waiting_turns,
+            "completed_turns": self.completed_turns,
+            "rejected_turns": self.rejected_turns,
+            "max_concurrent_turns": self.max_concurrent_turns,
+            "routes": {kind: route["decisions"] for kind, route in self.services.router.stats().items()},
+            "llm_circuit": completion_policy.breaker.state,
+        }
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.add_routes([
+            web.post("/sessions/{session_id}/turns", self.handle_turn),
+            web.get("/sessions/{session_id}/ws", self.handle_websocket),
+            web.get("/health", self.handle_health),
+            web.get("/metrics", self.handle_metrics),
+            web.get("/metrics.json", self.handle_metrics_json),
+        ])
+        return app
+
+
+def build_services(log_dir: str, speak: bool, tracer: Tracer | None = None, llm_cache: bool = True) -> NikuServices:
+    """Creates the production services: Cohere/local intents, Groq, the completion and audio caches."""
+    from niku.decision_engine import DecisionEngine
+    from niku.llm_cache import CompletionCache
+    from niku.router import ModelRouter, SMALL_MODEL, DEFAULT_LATENCY_BUDGET
+    from niku.tools import CANNED_PHRASES
+    from niku.tts_cache import AudioCache
+
+    if speak:
+        # Only canned replies are cached on disk; LLM sentences are synthesized directly
+        audio_cache = AudioCache(cache_dir=os.path.join(log_dir, 'tts_cache'), phrases=CANNED_PHRASES)
+
+        async def synthesize(sentence: str) -> memoryview | None:
+            try:
+                return await audio_cache.synthesize(sentence)
+            except Exception as e:
+                print(f"Niku (Audio Error): Error during text-to-speech conversion: {e}")
+                return None
+    else:
+        synthesize = None
+
+    return NikuServices(
+        DecisionEngine(),
+        llm_cache=CompletionCache(cache_file=os.path.join(log_dir, 'llm_cache.sqlite3')) if llm_cache else None,
+        speculate=os.getenv("NIKU_SPECULATE", "1") != "0",
+        synthesize=synthesize,
+        token_budget=int(os.getenv("NIKU_PROMPT_TOKENS", "1024")),
+        tracer=tracer,
+        router=ModelRouter(
+            small_model=os.getenv("NIKU_SMALL_MODEL", SMALL_MODEL) or None,
+            latency_budget=float(os.getenv("NIKU_LATENCY_BUDGET", str(DEFAULT_LATENCY_BUDGET))),
+        ),
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--log-dir", default="logs", help="Directory for session history and caches")
+    parser.add_argument("--max-concurrent-turns", type=int, default=64)
+    parser.add_argument("--max-waiting-turns", type=int, default=256)
+    parser.add_argument("--history-retention", type=int, default=DEFAULT_RETENTION,
+                        help="Messages kept per session in the history store")
+    parser.add_argument("--no-audio", action="store_true", help="Never synthesize speech")
+    parser.add_argument("--no-trace", action="store_true", help="Disable per-stage latency tracing")
+    parser.add_argument("--trace-file", help="Append every span and turn summary to this JSONL file")
+    args = parser.parse_args()
+
+    from niku.env import load_env
+    from niku.groq_client import close_clients
+
+    load_env()
+    if not os.getenv("GROQ_API_KEY"):
+        print("Error: GROQ_API_KEY not found in environment variables. Please set it in a .env file.")
+        return
+    try:
+        tracer = Tracer(enabled=not args.no_trace, trace_file=args.trace_file)
+        services = build_services(args.log_dir, speak=not args.no_audio, tracer=tracer)
+    except ValueError as e:
+        print(f"Error initializing Decision Engine: {e}")
+        return
+    store = SessionStore(store_dir=os.path.join(args.log_dir, 'sessions'), retention=args.history_retention)
+    server = NikuServer(services, store, args.max_concurrent_turns, args.max_waiting_turns)
+
+    async def cleanup(app):
+        await close_clients()
+        if services.llm_cache is not None:
+            services.llm_cache.close()
+        store.close()
+        services.tracer.close()
+
+    app = server.make_app()
+    app.on_cleanup.append(cleanup)
+    web.run_app(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
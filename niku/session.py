@@ -0,0 +1,337 @@
+import asyncio
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+from typing import Any
+
+from niku.context_builder import ContextBuilder
+from niku.groq_client import get_groq_completion_async, stream_groq_completion, CompletionStats, DEFAULT_MODEL
+from niku.llm_cache import CompletionCache
+from niku.router import ModelRouter
+from niku.speculation import SpeculativeCompletion, SpeculationStats
+from niku.speech_pipeline import prepend, text_stream
+from niku.tools import ToolRegistry, tool_registry as default_tool_registry, merge_tool_results
+from niku.tracing import Tracer, TurnTrace
+
+# Intent-specific system instructions and rewrites of the latest user message
+INTENT_SYSTEM_PROMPTS = {
+    "tell_joke": "You are an AI that specializes in telling jokes.",
+}
+INTENT_USER_INSTRUCTIONS = {
+    "tell_joke": "Tell a joke related to: {}",
+}
+TOOL_EXTRACTION_CACHE_TTL = 7 * 24 * 3600 # The same query always names the same arguments
+HISTORY_WINDOW = 50 # History records considered for each prompt; the token budget decides how many are sent
+RECALL_MIN_SCORE = 0.5 # BM25 score below which a search hit is too weak to quote
+
+def build_chat_prompt(context_builder: ContextBuilder, history_messages: list[dict], intent: str,
+                      recalled: list[dict] | None = None, commit: bool = True) -> list[dict]:
+    """
+    Builds the Groq chat messages for a reply from history and the intent.
+
+    Internal system records are left out, the newest turns are kept within the
+    builder's token budget and older ones are quoted as truncated excerpts,
+    along with any recalled messages relevant to the latest one.
+    The intent rewrite of the latest user message applies to the prompt only,
+    not to the stored history. Speculative prompts pass commit=False so only
+    the final prompt of a turn updates the builder's excerpts.
+    """
+    return context_builder.build(
+        history_messages,
+        system_prompt=INTENT_SYSTEM_PROMPTS.get(intent),
+        last_user_instruction=INTENT_USER_INSTRUCTIONS.get(intent),
+        recalled=recalled,
+        commit=commit,
+    )
+
+
+class TurnEvent:
+    """
+    One step of a turn, reported to the console or to a server client.
+
+    Kinds: "status" (progress notes), "intent", "tool", "token" (a piece of the
+    reply), "error" (the turn failed) and "done" (the complete reply).
+    """
+    def __init__(self, kind: str, text: str = "", source: str | None = None, **data):
+        self.kind = kind
+        self.text = text
+        self.source = source
+        self.data = data
+
+    def to_dict(self) -> dict:
+        event = {"type": self.kind, "text": self.text}
+        if self.source:
+            event["source"] = self.source
+        event.update(self.data)
+        return event
+
+    def __repr__(self) -> str:
+        return f"TurnEvent({self.kind!r}, {self.text!r})"
+
+
+class NikuServices:
+    """
+    Clients, caches and statistics shared by every session in a process.
+
+    The completion functions and the intent classifier are injectable so the
+    same turn logic can run against stub backends.
+    """
+    def __init__(self, decision_engine, tools: ToolRegistry = default_tool_registry,
+                 llm_cache: CompletionCache | None = None, speculate: bool = True, model: str = DEFAULT_MODEL,
+                 stream_completion: Callable[..., AsyncIterator[str]] = stream_groq_completion,
+                 complete: Callable[..., Awaitable[str]] = get_groq_completion_async,
+                 synthesize: Callable[[str], Awaitable[Any]] | None = None, token_budget: int = 1024,
+                 tracer: Tracer | None = None, recall: int = 3, router: ModelRouter | None = None):
+        """
+        Initializes the shared services.
+
+        Args:
+            decision_engine: Anything with `classify_intent_detailed(text)` returning an IntentPrediction.
+            tools: Registry of tools bound to intents.
+            llm_cache: Optional cache for deterministic completions (tool argument extraction).
+            speculate: Start the general chat reply while the intent is being classified.
+            model: Model used for replies when no router is given.
+            stream_completion: Streams a completion; same signature as stream_groq_completion.
+            complete: Returns a full completion; same signature as get_groq_completion_async.
+            synthesize: Optional. Turns one sentence into audio (or None on error), for speaking replies.
+            token_budget: Prompt token budget of each session's ContextBuilder.
+            tracer: Optional. Records per-stage latencies; tracing is off by default.
+            recall: Older messages found by searching the history that may be added
+                    to each chat prompt (0 disables the search).
+            router: Chooses a local handler, the small or the large model for each
+                    reply; by default a ModelRouter with `model` as the large model.
+        """
+        self.decision_engine = decision_engine
+        self.tools = tools
+        self.llm_cache = llm_cache
+        self.speculate = speculate
+        self.model = model
+        self.stream_completion = stream_completion
+        self.complete = complete
+        self.synthesize = synthesize
+        self.token_budget = token_budget
+        self.speculation_stats = SpeculationStats()
+        self.tracer = tracer or Tracer(enabled=False)
+        self.recall = recall
+        self.router = router or ModelRouter(large_model=model)
+        self._prefetch: asyncio.Task | None = None
+        self._prefetch_next: str | None = None
+
+    def prefetch_intent(self, text: str):
+        """
+        Classifies a partial transcript in the background while the user is
+        still speaking, so the finished utterance's intent is usually already
+        in the DecisionEngine's cache when its turn starts. One classification
+        runs at a time; while it does, only the newest text is kept for the next.
+        """
+        if self.decision_engine is None or not text.strip():
+            return
+        if self._prefetch is not None and not self._prefetch.done():
+            self._prefetch_next = text
+            return
+        self._prefetch = asyncio.create_task(asyncio.to_thread(self.decision_engine.classify_intent_detailed, text))
+        self._prefetch.add_done_callback(self._prefetch_done)
+
+    def _prefetch_done(self, task: asyncio.Task):
+        if not task.cancelled():
+            task.exception() # Failures only cost the cache entry; the turn classifies again
+        text, self._prefetch_next = self._prefetch_next, None
+        if text is not None:
+            self.prefetch_intent(text)
+
+
+class NikuSession:
+    """
+    The turn logic of one conversation: intent classification, tool calls or a
+    streamed LLM reply, and history bookkeeping.
+
+    Turns of one session run one at a time; different sessions run concurrently.
+    """
+    def __init__(self, history, services: NikuServices, session_id: str | None = None):
+        """
+        Initializes the NikuSession.
+
+        Args:
+            history: The session's history (ConversationHistory or SessionHistory).
+            services: Shared clients and caches.
+            session_id: Optional identifier used in logs and by the server.
+        """
+        self.history = history
+        self.services = services
+        self.session_id = session_id
+        self.context_builder = ContextBuilder(token_budget=services.token_budget)
+        self.turns = 0
+        self.last_completion_stats: CompletionStats | None = None
+        self.trace: TurnTrace | None = None # Trace of the current (or last) turn
+        self._lock = asyncio.Lock()
+
+    async def respond(self, user_input: str) -> AsyncIterator[TurnEvent]:
+        """
+        Runs one turn, yielding its events as they happen.
+
+        The reply is streamed as "token" events and ends with a "done" (or
+        "error") event. Closing the iterator early cancels outstanding work.
+        """
+        async with self._lock:
+            async for event in self._respond(user_input):
+                yield event
+
+    def _add_message(self, role: str, content: str):
+        with self.services.tracer.span("history", self.trace):
+            self.history.add_message(role, content)
+
+    async def _recall(self, user_input: str, recent_history_messages: list[dict]) -> list[dict]:
+        """Searches the history for earlier messages relevant to the current input."""
+        if not self.services.recall or not recent_history_messages:
+            return []
+        with self.services.tracer.span("recall", self.trace):
+            # Only messages before the current one are recalled (it may not be indexed yet).
+            # The index is SQLite and shared with the journal writer, so it is searched in a worker thread.
+            hits = await asyncio.to_thread(self.history.search, user_input, k=self.services.recall,
+                                           before=recent_history_messages[-1].get("timestamp"))
+        return [hit for hit in hits if hit["score"] >= RECALL_MIN_SCORE]
+
+    async def _respond(self, user_input: str) -> AsyncIterator[TurnEvent]:
+        services = self.services
+        tracer = services.tracer
+        history = self.history
+        trace = self.trace = tracer.start_turn(self.session_id, self.turns + 1)
+        outcome = "aborted" # Closed early or failed with an exception
+        await history.load() # Reads the stored history off the event loop on a session's first turn
+        self._add_message("user", user_input)
+        # Captured before intent logging so the speculative and final chat prompts are identical
+        recent_history_messages = history.get_recent(HISTORY_WINDOW) # Includes current user input
+        recalled = await self._recall(user_input, recent_history_messages)
+        self.last_completion_stats = None
+
+        # --- Speculative chat completion, started alongside classification ---
+        speculation = None
+        speculative_prompt = speculative_stats = speculative_route = None
+        llm_tokens = None
+        if services.speculate:
+            speculative_prompt = build_chat_prompt(self.context_builder, recent_history_messages, "general_chat", recalled,
+                                                   commit=False)
+            speculative_route = services.router.route("general_chat", self.context_builder.last_metrics.prompt_tokens, user_input)
+            if speculative_route.model is not None:
+                speculative_stats = CompletionStats(speculative_route.model)
+                speculation = SpeculativeCompletion(
+                    services.stream_completion(prompt=speculative_prompt, model=speculative_route.model, stats=speculative_stats)
+                )
+
+        try:
+            # --- Intent Classification ---
+            yield TurnEvent("status", "Classifying intent...", source="Decision Engine")
+            with tracer.span("classify", trace):
+                prediction = await asyncio.to_thread(services.decision_engine.classify_intent_detailed, user_input)
+            intent = prediction.label
+            effective_intent_for_prompt = intent if intent and intent != "unknown_intent" else "general_chat"
+            tool = services.tools.for_intent(effective_intent_for_prompt)
+            final_prompt_to_llm = route = None
+            if tool is None:
+                # --- Construct a prompt for Groq using recent history and intent, and choose who answers it ---
+                final_prompt_to_llm = build_chat_prompt(self.context_builder, recent_history_messages, effective_intent_for_prompt, recalled)
+                route = services.router.route(effective_intent_for_prompt, self.context_builder.last_metrics.prompt_tokens, user_input,
+                                              confidence=prediction.confidence, source=prediction.source)
+
+            if speculation is not None and (tool is not None or final_prompt_to_llm != speculative_prompt
+                                            or route.model != speculative_route.model):
+                # Tool intents such as get_weather, tell_joke and locally answered intents need a
+                # different prompt or no model at all; throw the speculative reply away.
+                speculation.cancel()
+                speculation = None
+                services.speculation_stats.record(used=False)
+
+            if intent:
+                yield TurnEvent("intent", intent, source=prediction.source, confidence=round(prediction.confidence, 3))
+                self._add_message("system", f"Detected user intent: {intent}") # Log intent
+            else:
+                yield TurnEvent("status", "Could not determine intent or error occurred.", source="Decision Engine")
+                self._add_message("system", "Intent classification failed.") # Log failure
+
+            # --- Tool Usage or LLM Response ---
+            if tool is not None:
+                # Arguments are found locally first; only unrecognised queries need the LLM round trip.
+                tool_calls = tool.extract_calls(user_input)
+                if tool_calls:
+                    self._add_message("system", f"Local extraction for '{tool.name}' on query '{user_input}' -> arguments: {tool_calls}")
+                else:
+                    yield TurnEvent("status", f"Determining arguments for {tool.name}...", source="LLM for Tool Parameter Extraction")
+                    with tracer.span("param_extraction", trace):
+                        extraction_response = await services.complete(
+                            prompt=tool.extraction_prompt(user_input), cache=services.llm_cache,
+                            cache_ttl=TOOL_EXTRACTION_CACHE_TTL, temperature=0,
+                        )
+                    tool_calls = tool.parse_calls(extraction_response)
+                    self._add_message("system", f"LLM (param_extraction) for '{tool.name}' on query '{user_input}' -> arguments: {tool_calls}")
+
+                if tool_calls:
+                    yield TurnEvent("status", f"Running {tool.name} for {len(tool_calls)} call(s) in parallel...", source="Tool")
+                    with tracer.span("tool", trace):
+                        tool_results = await services.tools.dispatch([(tool.name, arguments) for arguments in tool_calls])
+                    assistant_response = merge_tool_results(tool_results)
+                    for result in tool_results:
+                        yield TurnEvent("tool", str(result), source=result.name, latency_ms=round(result.latency * 1000),
+                                        error=result.error)
+                        self._add_message("system", f"Tool used: {result.name}, input: {result.arguments}, latency: {result.latency * 1000:.0f} ms")
+                else:
+                    assistant_response = tool.missing_arguments_reply
+                    self._add_message("system", f"Tool {tool.name} skipped: No arguments identified for the query.")
+                reply_tokens = text_stream(assistant_response)
+            elif route.kind == "local":
+                yield TurnEvent("status", f"Answering locally ({route.reason})", source="Router")
+                started = time.perf_counter()
+                with tracer.span("route_local", trace):
+                    assistant_response = route.handler(user_input)
+                services.router.record(route, time.perf_counter() - started)
+                reply_tokens = text_stream(assistant_response)
+            else:
+                yield TurnEvent("status", str(self.context_builder.last_metrics), source="Context")
+                yield TurnEvent("status", f"Using {route.model} ({route.reason})", source="Router")
+                yield TurnEvent("status", "Niku is thinking...")
+                if speculation is not None:
+                    # The speculative prompt matches this intent's prompt, so its tokens can be used as-is.
+                    saved_seconds = speculation.head_start()
+                    services.speculation_stats.record(used=True, saved_seconds=saved_seconds)
+                    yield TurnEvent("status", f"Reusing reply started during classification, saved ~{saved_seconds * 1000:.0f} ms",
+                                    source="Speculation")
+                    llm_stats = speculative_stats
+                    llm_tokens = speculation.stream()
+                else:
+                    llm_stats = CompletionStats(route.model)
+                    llm_tokens = services.stream_completion(prompt=final_prompt_to_llm, model=route.model, stats=llm_stats)
+                self.last_completion_stats = llm_stats
+                with tracer.span("llm_first_token", trace):
+                    first_token = await anext(llm_tokens, "") # Read ahead so errors are not spoken
+                if llm_stats.error:
+                    services.router.record(route, time.perf_counter() - llm_stats.started_at, error=True)
+                    self._add_message("system", f"Error obtaining response from Groq: {llm_stats.error}")
+                    outcome = "error"
+                    yield TurnEvent("error", llm_stats.error, source="Groq")
+                    return
+                reply_tokens = prepend(first_token, llm_tokens)
+
+            reply_parts = []
+            async for token in reply_tokens:
+                reply_parts.append(token)
+                yield TurnEvent("token", token)
+            assistant_response = "".join(reply_parts)
+            if self.last_completion_stats is not None and self.last_completion_stats.total_time is not None:
+                tracer.record("llm", self.last_completion_stats.total_time, trace)
+                tracer.record(f"route_{route.kind}", self.last_completion_stats.total_time, trace)
+                services.router.record(route, self.last_completion_stats.total_time, error=bool(self.last_completion_stats.error))
+            if self.last_completion_stats is not None and self.last_completion_stats.error:
+                # The stream broke after the first token; the partial reply is not saved as an answer.
+                self._add_message("system", f"Groq response interrupted after {self.last_completion_stats.tokens} tokens "
+                                            f"({self.last_completion_stats.error}). Partial reply: {assistant_response}")
+                outcome = "error"
+                yield TurnEvent("error", self.last_completion_stats.error, source="Groq", partial=assistant_response)
+                return
+            self._add_message("assistant", assistant_response)
+            self.turns += 1
+            outcome = "ok"
+            yield TurnEvent("done", assistant_response)
+        finally:
+            tracer.finish_turn(trace, outcome)
+            if speculation is not None:
+                speculation.cancel() # No-op once the stream has been fully used
+            if llm_tokens is not None:
+                await llm_tokens.aclose()
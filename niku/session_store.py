@@ -0,0 +1,395 @@
+import asyncio
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+import time
+import zlib
+from collections import deque
+from datetime import datetime
+
+DEFAULT_STORE_DIR = 'logs/sessions'
+DEFAULT_RETENTION = 1000 # Messages kept per session; prompts only use the most recent
+DEFAULT_CACHED_MESSAGES = 64 # Recent messages each SessionHistory keeps in memory
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_messages_session_ts ON messages (session_id, timestamp, id);
+CREATE TABLE IF NOT EXISTS retention (
+    session_id TEXT PRIMARY KEY,
+    max_messages INTEGER
+);
+"""
+
+def _to_timestamp(value: datetime | str | None) -> str | None:
+    """Normalizes a datetime or ISO string to the stored ISO 8601 format."""
+    if value is None or isinstance(value, str):
+        return value
+    return value.isoformat()
+
+
+class _Shard:
+    """A single SQLite database holding the sessions that hash to it."""
+    def __init__(self, db_file: str):
+        self.db_file = db_file
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        self.conn.commit()
+
+
+class SessionStore:
+    """
+    Multi-session conversation store sharded across SQLite databases.
+
+    Messages are indexed by (session_id, timestamp), so recent-message and
+    time-range lookups touch only the rows they return.
+
+    Added messages are queued and written by a single writer thread in batches,
+    one transaction per shard, so callers on the event loop never wait on a
+    commit. Reads and other changes first wait for the queued messages.
+    """
+    def __init__(self, store_dir: str = DEFAULT_STORE_DIR, shards: int = 4, retention: int | None = None,
+                 flush_interval: float = 0.01):
+        """
+        Initializes the SessionStore.
+
+        Args:
+            store_dir: Directory holding the shard databases.
+            shards: Number of SQLite shards sessions are distributed across.
+            retention: Default maximum number of messages kept per session.
+                       If None, all messages are kept.
+            flush_interval: Seconds the writer waits after the first queued message
+                            to collect more messages into the same batch.
+        """
+        if shards < 1:
+            raise ValueError("shards must be at least 1.")
+        self.store_dir = os.path.abspath(store_dir)
+        os.makedirs(self.store_dir, exist_ok=True)
+        self.retention = retention
+        self._shards = [_Shard(os.path.join(self.store_dir, f"history_{i}.sqlite3")) for i in range(shards)]
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="niku-session-store", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _shard(self, session_id: str) -> _Shard:
+        """Returns the shard a session lives in (stable across restarts)."""
+        return self._shards[zlib.crc32(session_id.encode('utf-8')) % len(self._shards)]
+
+    def _retention_for(self, shard: _Shard, session_id: str) -> int | None:
+        row = shard.conn.execute(
+            "SELECT max_messages FROM retention WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return row["max_messages"] if row else self.retention
+
+    def add_message(self, session_id: str, role: str, content: str, timestamp: datetime | str | None = None) -> dict | None:
+        """
+        Queues a message to be added to a session; the writer applies the
+        session's retention limit when it stores it.
+
+        Args:
+            session_id: The session the message belongs to.
+            role: The role of the speaker (e.g., "user", "assistant", "system").
+            content: The content of the message.
+            timestamp: Optional. Defaults to the current time.
+
+        Returns:
+            The stored message dictionary, or None if the message was rejected.
+        """
+        if not role or not content:
+            print("Error: Role and content cannot be empty.")
+            return None
+
+        message = {
+            "role": role,
+            "content": content,
+            "timestamp": _to_timestamp(timestamp) or datetime.now().isoformat(),
+        }
+        if self._closed:
+            print(f"Error: Session store {self.store_dir} is closed; message dropped.")
+            return None
+        self._queue.put(("add", (session_id, message)))
+        return message
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """
+        Blocks until every message queued so far has been written.
+
+        Returns:
+            True if the flush completed within the timeout.
+        """
+        if self._closed or not self._thread.is_alive():
+            return True
+        done = threading.Event()
+        self._queue.put(("flush", done))
+        return done.wait(timeout)
+
+    def _run(self):
+        """Writer thread: drains the queue in batches and writes them shard by shard."""
+        running = True
+        while running:
+            ops = [self._queue.get()]
+            if ops[0][0] == "add" and self.flush_interval > 0:
+                time.sleep(self.flush_interval)
+            while True:
+                try:
+                    ops.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            by_shard: dict[_Shard, list[tuple[str, dict]]] = {}
+            waiters = []
+            for op, payload in ops:
+                if op == "add":
+                    by_shard.setdefault(self._shard(payload[0]), []).append(payload)
+                elif op == "flush":
+                    waiters.append(payload)
+                elif op == "close":
+                    running = False
+            for shard, messages in by_shard.items():
+                self._write(shard, messages)
+            for waiter in waiters:
+                waiter.set()
+
+    def _write(self, shard: _Shard, messages: list[tuple[str, dict]]):
+        """Inserts a batch of (session_id, message) pairs into one shard and applies retention."""
+        try:
+            with shard.lock:
+                shard.conn.executemany(
+                    "INSERT INTO messages (session_id, role, content, timestamp) VALUES (?, ?, ?, ?)",
+                    [(session_id, message["role"], message["content"], message["timestamp"])
+                     for session_id, message in messages],
+                )
+                for session_id in dict.fromkeys(session_id for session_id, _ in messages):
+                    max_messages = self._retention_for(shard, session_id)
+                    if max_messages is not None:
+                        # Walks the index from the newest row, so only the rows beyond the limit are visited.
+                        shard.conn.execute(
+                            "DELETE FROM messages WHERE id IN ("
+                            " SELECT id FROM messages WHERE session_id = ?"
+                            " ORDER BY timestamp DESC, id DESC LIMIT -1 OFFSET ?)",
+                            (session_id, max_messages),
+                        )
+                shard.conn.commit()
+        except sqlite3.Error as e:
+            print(f"Error writing to session store {shard.db_file}: {e}")
+
+    def get_recent(self, session_id: str, n: int) -> list[dict]:
+        """
+        Retrieves the last `n` messages of a session, oldest first.
+        """
+        if n <= 0:
+            return []
+        self.flush()
+        shard = self._shard(session_id)
+        with shard.lock:
+            rows = shard.conn.execute(
+                "SELECT role, content, timestamp FROM messages WHERE session_id = ?"
+                " ORDER BY timestamp DESC, id DESC LIMIT ?",
+                (session_id, n),
+            ).fetchall()
+        return [dict(row) for row in reversed(rows)]
+
+    def get_range(self, session_id: str, start: datetime | str | None = None, end: datetime | str | None = None,
+                  limit: int | None = None) -> list[dict]:
+        """
+        Retrieves a session's messages with start <= timestamp < end, oldest first.
+
+        Args:
+            session_id: The session to query.
+            start: Optional inclusive lower bound.
+            end: Optional exclusive upper bound.
+            limit: Optional maximum number of messages to return.
+        """
+        query = "SELECT role, content, timestamp FROM messages WHERE session_id = ?"
+        params: list = [session_id]
+        if start is not None:
+            query += " AND timestamp >= ?"
+            params.append(_to_timestamp(start))
+        if end is not None:
+            query += " AND timestamp < ?"
+            params.append(_to_timestamp(end))
+        query += " ORDER BY timestamp, id"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+
+        self.flush()
+        shard = self._shard(session_id)
+        with shard.lock:
+            rows = shard.conn.execute(query, params).fetchall()
+        return [dict(row) for row in rows]
+
+    def count(self, session_id: str) -> int:
+        """Returns the number of messages stored for a session."""
+        self.flush()
+        shard = self._shard(session_id)
+        with shard.lock:
+            return shard.conn.execute(
+                "SELECT COUNT(*) FROM messages WHERE session_id = ?", (session_id,)
+            ).fetchone()[0]
+
+    def set_retention(self, session_id: str, max_messages: int | None):
+        """
+        Overrides the retention limit for one session and trims it immediately.
+
+        Args:
+            session_id: The session to configure.
+            max_messages: Maximum number of messages to keep, or None to keep all.
+        """
+        self.flush()
+        shard = self._shard(session_id)
+        with shard.lock:
+            shard.conn.execute(
+                "INSERT OR REPLACE INTO retention (session_id, max_messages) VALUES (?, ?)",
+                (session_id, max_messages),
+            )
+            if max_messages is not None:
+                shard.conn.execute(
+                    "DELETE FROM messages WHERE id IN ("
+                    " SELECT id FROM messages WHERE session_id = ?"
+                    " ORDER BY timestamp DESC, id DESC LIMIT -1 OFFSET ?)",
+                    (session_id, max_messages),
+                )
+            shard.conn.commit()
+
+    def clear_session(self, session_id: str):
+        """Deletes every message of a session."""
+        self.flush()
+        shard = self._shard(session_id)
+        with shard.lock:
+            shard.conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            shard.conn.commit()
+
+    def session(self, session_id: str) -> "SessionHistory":
+        """Returns a ConversationHistory-compatible view bound to one session."""
+        return SessionHistory(self, session_id)
+
+    def close(self, timeout: float | None = 5.0):
+        """Writes pending messages, stops the writer thread and closes all shard connections."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(("close", None))
+        self._thread.join(timeout)
+        for shard in self._shards:
+            with shard.lock:
+                shard.conn.close()
+
+
+class SessionHistory:
+    """
+    A single session of a SessionStore, exposing the ConversationHistory interface.
+
+    The most recent messages are kept in memory, so the turn loop reads its
+    context window without touching the database or waiting for the writer.
+    """
+    def __init__(self, store: SessionStore, session_id: str, cached_messages: int = DEFAULT_CACHED_MESSAGES):
+        """
+        Initializes the SessionHistory.
+
+        Args:
+            store: The store holding the session.
+            session_id: The session this view is bound to.
+            cached_messages: Recent messages kept in memory (capped by the
+                             store's default retention).
+        """
+        self.store = store
+        self.session_id = session_id
+        if store.retention is not None:
+            cached_messages = min(cached_messages, store.retention)
+        self.cached_messages = cached_messages
+        # With the cache as large as the default retention limit, no older message is left in the store
+        self._holds_retained = store.retention is not None and cached_messages >= store.retention
+        self._recent: deque[dict] | None = None # Filled by load()
+
+    async def load(self):
+        """
+        Loads the cached recent messages in a worker thread.
+
+        Reading the store waits for the writer to drain its queue, so turn
+        loops await this before their first read instead of blocking the
+        event loop.
+        """
+        if self._recent is None:
+            recent = await asyncio.to_thread(self.store.get_recent, self.session_id, self.cached_messages)
+            if self._recent is None: # Not loaded by a concurrent call meanwhile
+                self._recent = deque(recent, maxlen=self.cached_messages)
+
+    def add_message(self, role: str, content: str):
+        """Adds a message to this session."""
+        message = self.store.add_message(self.session_id, role, content)
+        if message is not None and self._recent is not None:
+            self._recent.append(message) # Otherwise the next load() reads it from the store
+
+    def get_recent(self, n: int) -> list[dict]:
+        """
+        Retrieves the last `n` messages of this session.
+
+        Served from memory once load() has run and `n` fits the cache (or the
+        cache holds everything the store retains); otherwise this reads the
+        store and blocks until queued writes are done.
+        """
+        if n <= 0:
+            return []
+        if self._recent is not None and (n <= self.cached_messages or self._holds_retained):
+            return list(self._recent)[-n:]
+        return self.store.get_recent(self.session_id, n)
+
+    def get_range(self, start: datetime | str | None = None, end: datetime | str | None = None,
+                  limit: int | None = None) -> list[dict]:
+        """Retrieves this session's messages within a time range (blocks until queued writes are done)."""
+        return self.store.get_range(self.session_id, start, end, limit)
+
+    def search(self, query: str, k: int = 5, before: str | None = None) -> list[dict]:
+        """Server sessions keep no full-text index, so nothing is recalled."""
+        return []
+
+    def get_history(self) -> list[dict]:
+        """Retrieves every retained message of this session (blocks until queued writes are done)."""
+        return self.store.get_range(self.session_id)
+
+    def clear_history(self):
+        """Clears this session's history."""
+        self.store.clear_session(self.session_id)
+        self._recent = deque(maxlen=self.cached_messages)
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Blocks until this store's queued messages have been written."""
+        return self.store.flush(timeout)
+
+    def close(self):
+        """The underlying store is shared between sessions and closed by its owner."""
+
+
+if __name__ == "__main__":
+    # Example Usage
+    store = SessionStore(store_dir=DEFAULT_STORE_DIR, shards=2, retention=6)
+
+    for user in ("alice", "bob"):
+        store.add_message(user, "user", f"Hello Niku, I'm {user}!")
+        store.add_message(user, "assistant", f"Hi {user}! How can I help you today?")
+
+    store.set_retention("alice", 3)
+    store.add_message("alice", "user", "What is the capital of France?")
+    store.add_message("alice", "assistant", "The capital of France is Paris.")
+
+    for user in ("alice", "bob"):
+        print(f"Last messages for {user} ({store.count(user)} stored):")
+        for msg in store.get_recent(user, 5):
+            print(f"- [{msg['timestamp']}] {msg['role']}: {msg['content']}")
+
+    store.close()
@@ -0,0 +1,73 @@
+import asyncio
+import time
+from collections.abc import AsyncIterator
+
+_END = object()
+
+class SpeculativeCompletion:
+    """
+    Starts consuming a completion stream before it is known to be needed.
+
+    Tokens are buffered until the caller either streams them with `stream()`
+    or throws the work away with `cancel()`.
+    """
+    def __init__(self, tokens: AsyncIterator[str]):
+        self.started_at = time.perf_counter()
+        self.finished_at: float | None = None
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._pump(tokens))
+
+    async def _pump(self, tokens: AsyncIterator[str]):
+        try:
+            async for token in tokens:
+                self._queue.put_nowait(token)
+        finally:
+            self.finished_at = time.perf_counter()
+            self._queue.put_nowait(_END)
+
+    def head_start(self) -> float:
+        """Seconds of completion work done so far, i.e. latency saved if used now."""
+        end = self.finished_at if self.finished_at is not None else time.perf_counter()
+        return end - self.started_at
+
+    async def stream(self) -> AsyncIterator[str]:
+        """Yields the buffered tokens, then the rest of the completion as it arrives."""
+        while True:
+            token = await self._queue.get()
+            if token is _END:
+                break
+            yield token
+        await self._task # Surface errors from the underlying stream
+
+    def cancel(self):
+        """Discards the speculative completion."""
+        self._task.cancel()
+
+
+class SpeculationStats:
+    """
+    Counts how often speculative completions were used and the latency they saved.
+    """
+    def __init__(self):
+        self.attempted = 0
+        self.used = 0
+        self.discarded = 0
+        self.saved_seconds = 0.0
+
+    def record(self, used: bool, saved_seconds: float = 0.0):
+        """Records the outcome of one speculative completion."""
+        self.attempted += 1
+        if used:
+            self.used += 1
+            self.saved_seconds += saved_seconds
+        else:
+            self.discarded += 1
+
+    @property
+    def use_rate(self) -> float:
+        return self.used / self.attempted if self.attempted else 0.0
+
+    def __repr__(self) -> str:
+        average_ms = self.saved_seconds / self.used * 1000 if self.used else 0.0
+        return (f"SpeculationStats(attempted={self.attempted}, used={self.used}, discarded={self.discarded}, "
+                f"use_rate={self.use_rate:.0%}, avg_saved={average_ms:.0f} ms)")
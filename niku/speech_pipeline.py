@@ -0,0 +1,169 @@
+import asyncio
+import re
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+from typing import Any
+
+# A sentence ends at ., ! or ? (optionally followed by closing quotes/brackets) and
+# whitespace, or at a line break.
+_SENTENCE_BOUNDARY = re.compile(r"[.!?]+[\"')\]]*\s+|\n+")
+
+async def text_stream(text: str) -> AsyncIterator[str]:
+    """Wraps an already complete reply as a single-token stream."""
+    if text:
+        yield text
+
+async def prepend(first_token: str, tokens: AsyncIterator[str]) -> AsyncIterator[str]:
+    """Re-attaches a token that was read ahead of a stream (e.g. to check for errors)."""
+    if first_token:
+        yield first_token
+    async for token in tokens:
+        yield token
+
+def _take_sentences(buffer: str, min_chars: int) -> tuple[list[str], str]:
+    """Splits the complete sentences off the front of `buffer`; returns them and the rest."""
+    sentences = []
+    search_from = 0
+    while True:
+        match = _SENTENCE_BOUNDARY.search(buffer, search_from)
+        if not match:
+            return sentences, buffer
+        if match.end() < min_chars:
+            search_from = match.end()
+            continue
+        sentence = buffer[:match.end()].strip()
+        buffer = buffer[match.end():]
+        search_from = 0
+        if sentence:
+            sentences.append(sentence)
+
+def sentences_of(text: str, min_chars: int = 20) -> list[str]:
+    """Splits a complete text into the sentences split_sentences would yield for it."""
+    sentences, rest = _take_sentences(text, min_chars)
+    return sentences + [rest.strip()] if rest.strip() else sentences
+
+async def split_sentences(tokens: AsyncIterator[str], min_chars: int = 20) -> AsyncIterator[str]:
+    """
+    Groups a token stream into sentences as soon as each one is complete.
+
+    Args:
+        tokens: An async iterator of text fragments, e.g. LLM tokens.
+        min_chars: Sentences shorter than this are merged with the next one,
+                   so abbreviations and interjections don't become tiny TTS calls.
+
+    Yields:
+        Complete sentences, followed by any trailing text when the stream ends.
+    """
+    buffer = ""
+    async for token in tokens:
+        sentences, buffer = _take_sentences(buffer + token, min_chars)
+        for sentence in sentences:
+            yield sentence
+    if buffer.strip():
+        yield buffer.strip()
+
+
+class SpeechSegment:
+    """
+    One synthesized sentence of a reply.
+    """
+    def __init__(self, index: int, text: str, audio: Any, ready_at: float):
+        self.index = index
+        self.text = text
+        self.audio = audio # Whatever the synthesize callable returned
+        self.ready_at = ready_at # perf_counter() time at which the audio was available
+
+    def __repr__(self) -> str:
+        return f"SpeechSegment(index={self.index}, text={self.text!r})"
+
+
+class SentenceSpeechPipeline:
+    """
+    Streams LLM output into TTS one sentence at a time.
+
+    Sentences are synthesized concurrently, at most `max_pending` at a time, and
+    segments are yielded strictly in sentence order.
+    """
+    def __init__(self, synthesize: Callable[[str], Awaitable[Any]], max_pending: int = 3, min_chars: int = 20):
+        """
+        Initializes the pipeline.
+
+        Args:
+            synthesize: Coroutine function turning one sentence into audio.
+            max_pending: Maximum number of sentences being synthesized or waiting
+                         to be consumed at once.
+            min_chars: Minimum sentence length passed to split_sentences.
+        """
+        if max_pending < 1:
+            raise ValueError("max_pending must be at least 1.")
+        self.synthesize = synthesize
+        self.max_pending = max_pending
+        self.min_chars = min_chars
+        self.text = "" # Full reply text seen so far
+        self.started_at: float | None = None
+        self.time_to_first_audio: float | None = None
+
+    async def run(self, tokens: AsyncIterator[str],
+                  on_token: Callable[[str], None] | None = None) -> AsyncIterator[SpeechSegment]:
+        """
+        Runs the pipeline over a token stream.
+
+        Args:
+            tokens: An async iterator of text fragments.
+            on_token: Optional. Called with every token as it arrives, e.g. to echo it.
+
+        Yields:
+            SpeechSegment objects in sentence order.
+        """
+        self.text = ""
+        self.started_at = time.perf_counter()
+        self.time_to_first_audio = None
+        slots = asyncio.Semaphore(self.max_pending)
+        pending: asyncio.Queue = asyncio.Queue(maxsize=self.max_pending)
+        done = object()
+
+        async def observed_tokens():
+            async for token in tokens:
+                self.text += token
+                if on_token:
+                    on_token(token)
+                yield token
+
+        async def produce():
+            try:
+                index = 0
+                async for sentence in split_sentences(observed_tokens(), min_chars=self.min_chars):
+                    await slots.acquire()
+                    task = asyncio.create_task(self.synthesize(sentence))
+                    await pending.put((index, sentence, task))
+                    index += 1
+            finally:
+                await pending.put(done)
+
+        producer = asyncio.create_task(produce())
+        in_flight: list[asyncio.Task] = []
+        try:
+            while True:
+                item = await pending.get()
+                if item is done:
+                    break
+                index, sentence, task = item
+                in_flight.append(task)
+                try:
+                    audio = await task
+                finally:
+                    in_flight.remove(task)
+                    slots.release()
+                ready_at = time.perf_counter()
+                if self.time_to_first_audio is None:
+                    self.time_to_first_audio = ready_at - self.started_at
+                yield SpeechSegment(index, sentence, audio, ready_at)
+            await producer # Surface errors raised by the token stream
+        finally:
+            producer.cancel()
+            for task in in_flight:
+                task.cancel()
+            while not pending.empty():
+                item = pending.get_nowait()
+                if item is not done:
+                    item[2].cancel()
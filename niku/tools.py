@@ -1,37 +1,96 @@
+import asyncio
+import json
 import re
 import os
-import requests  # Added
-from dotenv import load_dotenv  # Added
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
 
-load_dotenv()  # Added to load .env variables like API keys
+from niku.cache import LRUCache, SingleFlight
+from niku.env import load_env
+from niku.gazetteer import get_default_gazetteer
+
+if TYPE_CHECKING: # requests is imported when the first HTTP session is created
+    import requests
+
+load_env()  # Load .env variables like API keys
 
 WEATHER_API_KEY = os.getenv("WEATHER_API_KEY")
 OPENWEATHERMAP_API_URL = "http://api.openweathermap.org/data/2.5/weather"
+WEATHER_CACHE_TTL = 600  # Seconds; current weather barely changes within minutes
+WEATHER_POOL_SIZE = 16
+
+_session: "requests.Session | None" = None
+_session_lock = threading.Lock()
+_weather_cache = LRUCache(maxsize=256, ttl=WEATHER_CACHE_TTL)  # canonical location -> API response
+_location_aliases = LRUCache(maxsize=1024, ttl=WEATHER_CACHE_TTL)  # normalized query -> canonical location
+_weather_requests = SingleFlight()
+
+def extract_location(query: str) -> str | None:
+    """
+    Extracts the first known city from a query using the bundled gazetteer.
+    Runs locally in microseconds; returns None when no known place is mentioned,
+    in which case the caller should fall back to LLM-based extraction.
+    """
+    return get_default_gazetteer().extract(query)
+
+def extract_locations(query: str) -> list[str]:
+    """Extracts every known city mentioned in a query, in order of appearance."""
+    return get_default_gazetteer().find_all(query)
+
 
-# def extract_location(query: str) -> str | None:
-#     """
-#     Very simple location extractor.
-#     Tries to find a capitalized word or a known city.
-#     This could be significantly improved, possibly using an LLM for entity extraction.
-#     """
-#     query_lower = query.lower()
-#     known_cities = ["london", "paris", "tokyo", "new york", "berlin", "moscow", "beijing", "sydney"]
-#     for city in known_cities:
-#         if city in query_lower:
-#             return city.capitalize()  # Return in a consistent format
-#
-#     # Fallback to regex for capitalized words (naive)
-#     match = re.search(r"in\\\\s+([A-Z][a-z]+(?:\\\\s[A-Z][a-z]+)*)", query)
-#     if match:
-#         return match.group(1)
-#     match = re.search(r"for\\\\s+([A-Z][a-z]+(?:\\\\s[A-Z][a-z]+)*)", query)
-#     if match:
-#         return match.group(1)
-#     match = re.search(r"([A-Z][a-z]+(?:\\\\s[A-Z][a-z]+)*)", query)  # General capitalized word
-#     if match:
-#         return match.group(1)
-#     return None
+def get_session() -> "requests.Session":
+    """Returns the shared HTTP session, whose keep-alive connections are reused across calls."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=WEATHER_POOL_SIZE)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+def normalize_location(location: str) -> str:
+    """Case- and whitespace-insensitive cache key for a location ('  new YORK ,us' -> 'new york, us')."""
+    return re.sub(r"\s*,\s*", ", ", " ".join(location.lower().split()))
+
+def _fetch_weather_json(location: str) -> dict:
+    """
+    Fetches raw weather data, answering from the TTL cache when possible and
+    coalescing concurrent requests for the same location into one upstream call.
+
+    Raises:
+        requests.exceptions.RequestException: If the upstream call fails.
+    """
+    key = normalize_location(location)
+    canonical_key = _location_aliases.get(key, key)
+    data = _weather_cache.get(canonical_key)
+    if data is not None:
+        return data
+
+    def fetch() -> dict:
+        params = {
+            'q': location,
+            'appid': WEATHER_API_KEY,
+            'units': 'metric'  # For Celsius
+        }
+        response = get_session().get(OPENWEATHERMAP_API_URL, params=params, timeout=10)
+        response.raise_for_status()  # Raises an HTTPError for bad responses (4XX or 5XX)
+        data = response.json()
+        if data.get("cod") == 200:  # Only successful lookups are cached
+            # Cache under the canonical city name from the API so different spellings share the entry.
+            city_key = normalize_location(f"{data.get('name', location)}, {data.get('sys', {}).get('country', '')}".rstrip(", "))
+            _weather_cache.set(city_key, data)
+            _location_aliases.set(key, city_key)
+        return data
 
+    return _weather_requests.do(canonical_key, fetch)
 
 def fetch_weather_data(location: str) -> str:  # Changed argument from location_query to location
     """
@@ -40,21 +99,14 @@ def fetch_weather_data(location: str) -> str:  # Changed argument from location_
     """
     if not WEATHER_API_KEY:
         return "Error: WEATHER_API_KEY not found. Please set it in the .env file."
+    import requests
 
     # Location is now directly provided, no need to call extract_location here
     if not location or location.lower() == "none": # Check if location is valid
         return "I couldn't figure out the location for the weather. Please specify a city, like 'weather in London'."
 
-    params = {
-        'q': location,
-        'appid': WEATHER_API_KEY,
-        'units': 'metric'  # For Celsius
-    }
-
     try:
-        response = requests.get(OPENWEATHERMAP_API_URL, params=params, timeout=10)
-        response.raise_for_status()  # Raises an HTTPError for bad responses (4XX or 5XX)
-        data = response.json()
+        data = _fetch_weather_json(location)
 
         if data.get("cod") != 200:  # Check OpenWeatherMap specific status code
             error_message = data.get("message", "Unknown error from weather API.")
@@ -81,6 +133,241 @@ def fetch_weather_data(location: str) -> str:  # Changed argument from location_
     except Exception as e: # Added a more general exception catch at the end
         return f"An unexpected error occurred while processing the weather request for {location}: {e}"
 
+def fetch_weather_many(locations: list[str], max_workers: int = 8) -> list[str]:
+    """
+    Fetches the weather for several locations in parallel.
+
+    Returns:
+        One weather report (or error message) per location, in input order.
+    """
+    if not locations:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(locations)), thread_name_prefix="niku-weather") as executor:
+        return list(executor.map(fetch_weather_data, locations))
+
+def get_weather_cache_stats() -> dict:
+    """Returns hit/miss counters of the weather cache and how many calls were coalesced."""
+    return {
+        "cache_hits": _weather_cache.hits,
+        "cache_misses": _weather_cache.misses,
+        "cache_hit_rate": _weather_cache.hit_rate,
+        "coalesced_requests": _weather_requests.coalesced,
+    }
+
+def warm_up_weather() -> bool:
+    """
+    Opens a pooled keep-alive connection to the weather API ahead of the first
+    lookup (blocking; run it in a background thread).
+
+    Returns:
+        True if the server answered.
+    """
+    if not WEATHER_API_KEY:
+        return False
+    try:
+        get_session().head(OPENWEATHERMAP_API_URL, timeout=5)
+        return True
+    except Exception:
+        return False # Errors surface on the first real lookup
+
+
+class ToolResult:
+    """
+    The outcome of one tool call.
+    """
+    def __init__(self, name: str, arguments: dict, output: str | None, latency: float, error: str | None = None):
+        self.name = name
+        self.arguments = arguments
+        self.output = output
+        self.latency = latency # Seconds, including time spent waiting for a worker
+        self.error = error
+
+    def __repr__(self) -> str:
+        status = f"error={self.error!r}" if self.error else "ok"
+        return f"ToolResult(name={self.name}, arguments={self.arguments}, {status}, latency={self.latency * 1000:.0f} ms)"
+
+
+class Tool:
+    """
+    A function the assistant can call, described by a parameter schema.
+    """
+    def __init__(self, name: str, description: str, parameters: dict, func: Callable[..., str],
+                 intent: str | None = None, timeout: float = 10.0,
+                 extract_calls: Callable[[str], list[dict]] | None = None, missing_arguments_reply: str | None = None):
+        """
+        Initializes the Tool.
+
+        Args:
+            name: Unique tool name.
+            description: What the tool does, shown to the LLM.
+            parameters: Maps each parameter name to a schema dict with "type" and
+                        "description" keys (and optionally "required": False).
+            func: The synchronous function implementing the tool; it is called with
+                  the arguments as keyword arguments and returns a reply string.
+            intent: Optional. The DecisionEngine intent this tool handles.
+            timeout: Seconds a single call may take before it is abandoned.
+            extract_calls: Optional. Fast local extractor returning argument dicts
+                           for every call a query asks for.
+            missing_arguments_reply: Reply used when no arguments can be found.
+        """
+        self.name = name
+        self.description = description
+        self.parameters = parameters
+        self.func = func
+        self.intent = intent
+        self.timeout = timeout
+        self._extract_calls = extract_calls
+        self.missing_arguments_reply = missing_arguments_reply or f"I need more details to use {name}."
+
+    def describe(self) -> dict:
+        """Returns the tool's schema, as shown to the LLM."""
+        return {"tool_name": self.name, "description": self.description, "parameters": self.parameters}
+
+    def validate(self, arguments: dict) -> str | None:
+        """Returns an error message if `arguments` do not match the schema, else None."""
+        for parameter, schema in self.parameters.items():
+            if schema.get("required", True) and parameter not in arguments:
+                return f"missing required parameter '{parameter}'"
+        unknown = set(arguments) - set(self.parameters)
+        if unknown:
+            return f"unknown parameters {sorted(unknown)}"
+        for parameter, value in arguments.items():
+            if self.parameters[parameter].get("type") == "string" and not isinstance(value, str):
+                return f"parameter '{parameter}' must be a string"
+        return None
+
+    def extract_calls(self, query: str) -> list[dict]:
+        """Finds call arguments locally, without an LLM round trip."""
+        return self._extract_calls(query) if self._extract_calls else []
+
+    def extraction_prompt(self, query: str) -> str:
+        """Builds the LLM prompt asking for this tool's arguments, from its schema."""
+        parameter_lines = "\n".join(
+            f"- '{parameter}' ({schema.get('type', 'string')}): {schema.get('description', '')}"
+            for parameter, schema in self.parameters.items()
+        )
+        example = json.dumps([{parameter: "..." for parameter in self.parameters}])
+        return (
+            f"You need to determine the parameters for a tool based on the user's query.\n"
+            f"Tool Name: {self.name}\n"
+            f"Tool Description: {self.description}\n"
+            f"Parameters to Extract:\n{parameter_lines}\n\n"
+            f"User Query: '{query}'\n\n"
+            f"The query may ask for several calls (e.g. two different cities). "
+            f"Respond with only a JSON list with one object of arguments per call, like {example}. "
+            f"If the required parameters are not clearly mentioned or inferable, respond with []."
+        )
+
+    def parse_calls(self, response: str) -> list[dict]:
+        """Parses the LLM's answer to extraction_prompt into valid argument dicts."""
+        match = re.search(r"\[.*\]", response, re.DOTALL)
+        if not match:
+            return []
+        try:
+            calls = json.loads(match.group(0))
+        except json.JSONDecodeError:
+            return []
+        return [call for call in calls if isinstance(call, dict) and self.validate(call) is None]
+
+
+class ToolRegistry:
+    """
+    Registry of available tools and a dispatcher that runs a turn's tool calls concurrently.
+    """
+    def __init__(self, max_concurrency: int = 8):
+        """
+        Args:
+            max_concurrency: Maximum number of tool calls running at once.
+        """
+        self._tools: dict[str, Tool] = {}
+        self.max_concurrency = max_concurrency
+
+    def register(self, tool: Tool) -> Tool:
+        """Adds a tool to the registry."""
+        if tool.name in self._tools:
+            raise ValueError(f"A tool named '{tool.name}' is already registered.")
+        self._tools[tool.name] = tool
+        return tool
+
+    def get(self, name: str) -> Tool | None:
+        return self._tools.get(name)
+
+    def for_intent(self, intent: str | None) -> Tool | None:
+        """Returns the tool that handles an intent, if any."""
+        for tool in self._tools.values():
+            if tool.intent is not None and tool.intent == intent:
+                return tool
+        return None
+
+    def describe(self) -> list[dict]:
+        """Returns the schemas of all registered tools."""
+        return [tool.describe() for tool in self._tools.values()]
+
+    async def _run_call(self, name: str, arguments: dict, slots: asyncio.Semaphore) -> ToolResult:
+        started = time.perf_counter()
+        tool = self._tools.get(name)
+        if tool is None:
+            return ToolResult(name, arguments, None, 0.0, f"unknown tool '{name}'")
+        error = tool.validate(arguments)
+        if error:
+            return ToolResult(name, arguments, None, 0.0, error)
+        try:
+            async with slots:
+                # The worker thread can't be interrupted; on timeout its result is discarded.
+                output = await asyncio.wait_for(asyncio.to_thread(tool.func, **arguments), tool.timeout)
+            return ToolResult(name, arguments, output, time.perf_counter() - started)
+        except asyncio.TimeoutError:
+            return ToolResult(name, arguments, None, time.perf_counter() - started, f"timed out after {tool.timeout:g}s")
+        except Exception as e:
+            return ToolResult(name, arguments, None, time.perf_counter() - started, str(e))
+
+    async def dispatch(self, calls: list[tuple[str, dict]]) -> list[ToolResult]:
+        """
+        Runs tool calls concurrently, each with its tool's timeout.
+
+        Args:
+            calls: (tool name, arguments) pairs.
+
+        Returns:
+            One ToolResult per call, in input order. Cancelling the dispatch
+            cancels every call still waiting.
+        """
+        slots = asyncio.Semaphore(self.max_concurrency)
+        return list(await asyncio.gather(*(self._run_call(name, arguments, slots) for name, arguments in calls)))
+
+
+def merge_tool_results(results: list[ToolResult]) -> str:
+    """Combines the outputs of a turn's tool calls into one reply."""
+    replies = []
+    for result in results:
+        if result.error:
+            replies.append(f"Sorry, {result.name} failed for {', '.join(map(str, result.arguments.values()))}: {result.error}.")
+        else:
+            replies.append(result.output)
+    return " ".join(replies)
+
+
+WEATHER_LOCATION_PROMPT = "I can get the weather for you, but I need to know the city. Could you please tell me which city you're interested in?"
+# Fixed replies, the only speech worth keeping in the TTS disk cache
+CANNED_PHRASES = [WEATHER_LOCATION_PROMPT]
+
+tool_registry = ToolRegistry()
+tool_registry.register(Tool(
+    name="fetch_weather_data",
+    description="Fetches the current weather for a specified location.",
+    parameters={
+        "location": {
+            "type": "string",
+            "description": "The city and state, or city and country for which to get the weather (e.g., 'San Francisco, CA', 'London, UK').",
+        }
+    },
+    func=fetch_weather_data,
+    intent="get_weather",
+    timeout=12.0, # Slightly above the HTTP timeout so the request's own error wins
+    extract_calls=lambda query: [{"location": location} for location in extract_locations(query)],
+    missing_arguments_reply=WEATHER_LOCATION_PROMPT,
+))
+
 
 if __name__ == '__main__':
     # To test this, set your WEATHER_API_KEY in a .env file first
@@ -98,3 +385,5 @@ if __name__ == '__main__':
         print(fetch_weather_data("NonExistentCity")) # Should give API error or 'city not found'
         print(fetch_weather_data("None")) # Test with "None" as location
         print(fetch_weather_data("")) # Test with empty string as location
+        print(fetch_weather_many(["london", "  LONDON ", "Paris", "Tokyo"])) # Parallel, cached and coalesced
+        print(get_weather_cache_stats())
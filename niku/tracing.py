@@ -0,0 +1,228 @@
+import bisect
+import json
+import os
+import threading
+import time
+import uuid
+
+from niku.memory_manager import HistoryJournal
+
+# Upper bounds of the latency histogram buckets, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class Histogram:
+    """
+    Cumulative-bucket latency histogram in the Prometheus style.
+    """
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # The last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> float | None:
+        """Estimates a quantile as the upper bound of the bucket it falls in."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for upper, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(upper, self.max)
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else None,
+            "max": self.max,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": {str(upper): count for upper, count in zip(self.buckets + ("+Inf",), self.counts)},
+        }
+
+
+class TurnTrace:
+    """
+    Identifies one turn; spans recorded with it share its trace id.
+    """
+    def __init__(self, session_id: str | None, turn: int):
+        self.trace_id = uuid.uuid4().hex
+        self.session_id = session_id
+        self.turn = turn
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+        self.stages: dict[str, float] = {} # stage -> total seconds within this turn
+
+
+class Span:
+    """
+    Times a block of code as one stage; use as a context manager.
+    """
+    __slots__ = ("tracer", "name", "trace", "started")
+
+    def __init__(self, tracer: "Tracer", name: str, trace: TurnTrace | None):
+        self.tracer = tracer
+        self.name = name
+        self.trace = trace
+        self.started = 0.0
+
+    def __enter__(self) -> "Span":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.tracer.record(self.name, time.perf_counter() - self.started, self.trace,
+                           error=exc_type.__name__ if exc_type else None, started=self.started)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Tracer:
+    """
+    Per-stage latency tracing for turns.
+
+    Stage latencies go into in-process histograms that can be exported as
+    Prometheus text or JSON. With a trace file, every span and a summary of each
+    turn are also appended as JSON lines (written by a background thread).
+    A disabled tracer hands out a shared no-op span and records nothing.
+    """
+    def __init__(self, enabled: bool = True, trace_file: str | None = None):
+        """
+        Initializes the Tracer.
+
+        Args:
+            enabled: Record spans at all.
+            trace_file: Optional JSONL file receiving every span and turn summary.
+        """
+        self.enabled = enabled
+        self.histograms: dict[str, Histogram] = {}
+        self.errors: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._journal = HistoryJournal(trace_file, fsync_policy="never") if enabled and trace_file else None
+
+    def start_turn(self, session_id: str | None = None, turn: int = 0) -> TurnTrace | None:
+        """Starts the trace of a turn, or returns None when disabled."""
+        if not self.enabled:
+            return None
+        return TurnTrace(session_id, turn)
+
+    def span(self, name: str, trace: TurnTrace | None = None) -> Span | _NoopSpan:
+        """Returns a context manager timing one stage."""
+        if not self.enabled:
+            return _NOOP_SPAN
+        return Span(self, name, trace)
+
+    def record(self, name: str, seconds: float, trace: TurnTrace | None = None,
+               error: str | None = None, started: float | None = None):
+        """Records a stage latency measured elsewhere (e.g. time to first token)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+            if error:
+                self.errors[name] = self.errors.get(name, 0) + 1
+            if trace is not None:
+                trace.stages[name] = trace.stages.get(name, 0.0) + seconds
+        if self._journal is not None:
+            record = {"span": name, "duration_ms": round(seconds * 1000, 3)}
+            if trace is not None:
+                record.update(trace_id=trace.trace_id, session_id=trace.session_id, turn=trace.turn)
+                if started is not None:
+                    record["offset_ms"] = round((started - trace.started) * 1000, 3)
+            if error:
+                record["error"] = error
+            self._journal.append(record)
+
+    def finish_turn(self, trace: TurnTrace | None, outcome: str = "ok"):
+        """Records the turn's total latency and writes its summary line."""
+        if trace is None:
+            return
+        seconds = time.perf_counter() - trace.started
+        with self._lock:
+            histogram = self.histograms.get("turn")
+            if histogram is None:
+                histogram = self.histograms["turn"] = Histogram()
+            histogram.observe(seconds)
+        if self._journal is not None:
+            self._journal.append({
+                "span": "turn",
+                "trace_id": trace.trace_id,
+                "session_id": trace.session_id,
+                "turn": trace.turn,
+                "started_at": trace.started_at,
+                "duration_ms": round(seconds * 1000, 3),
+                "outcome": outcome,
+                "stages_ms": {name: round(value * 1000, 3) for name, value in trace.stages.items()},
+            })
+
+    def prometheus_text(self) -> str:
+        """Renders the histograms in the Prometheus text exposition format."""
+        lines = [
+            "# HELP niku_stage_latency_seconds Latency of each turn stage.",
+            "# TYPE niku_stage_latency_seconds histogram",
+        ]
+        with self._lock:
+            for name, histogram in sorted(self.histograms.items()):
+                cumulative = 0
+                for upper, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                    cumulative += count
+                    le = "+Inf" if upper == float("inf") else repr(upper)
+                    lines.append(f'niku_stage_latency_seconds_bucket{{stage="{name}",le="{le}"}} {cumulative}')
+                lines.append(f'niku_stage_latency_seconds_sum{{stage="{name}"}} {histogram.sum}')
+                lines.append(f'niku_stage_latency_seconds_count{{stage="{name}"}} {histogram.count}')
+            lines.append("# HELP niku_stage_errors_total Spans that ended with an exception.")
+            lines.append("# TYPE niku_stage_errors_total counter")
+            for name, count in sorted(self.errors.items()):
+                lines.append(f'niku_stage_errors_total{{stage="{name}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "stages": {name: histogram.to_dict() for name, histogram in sorted(self.histograms.items())},
+                "errors": dict(self.errors),
+            }
+
+    def dump_json(self, path: str):
+        """Writes the histograms to a JSON file."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def summary(self) -> str:
+        """One line per stage with count and latency percentiles, for console output."""
+        lines = []
+        for name, stats in self.to_dict()["stages"].items():
+            lines.append(f"{name:<18} n={stats['count']:<5} p50={stats['p50'] * 1000:8.1f} ms  "
+                         f"p95={stats['p95'] * 1000:8.1f} ms  max={stats['max'] * 1000:8.1f} ms")
+        return "\n".join(lines)
+
+    def close(self):
+        """Flushes and closes the trace file."""
+        if self._journal is not None:
+            self._journal.close()
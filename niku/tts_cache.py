@@ -0,0 +1,201 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+
+from niku.speech_pipeline import sentences_of
+from niku.tts_client import DEFAULT_VOICE, synthesize_to_buffer
+
+DEFAULT_CACHE_DIR = 'logs/tts_cache'
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+def normalize_text(text: str) -> str:
+    """Collapses whitespace so trivially different spellings share a cache entry."""
+    return " ".join(text.split())
+
+def cache_key(text: str, voice: str = DEFAULT_VOICE, tts_params: dict | None = None) -> str:
+    """Returns the content address of a synthesis request."""
+    payload = json.dumps([normalize_text(text), voice, sorted((tts_params or {}).items())], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class AudioCache:
+    """
+    Disk-backed cache of synthesized audio with LRU eviction under a byte budget.
+
+    Only fixed phrases are cached: replies that recur word for word, split into
+    the sentences the speech pipeline synthesizes. Any other text (LLM replies,
+    which hardly ever repeat) is synthesized without touching the disk.
+
+    Entries are stored as `<sha256>.mp3` files; a file's mtime records its last
+    use, so the LRU order survives restarts. File I/O runs in a worker thread.
+    """
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES,
+                 synthesize: Callable[..., Awaitable[bytes | memoryview]] = synthesize_to_buffer,
+                 phrases: list[str] | None = None):
+        """
+        Initializes the AudioCache and indexes any existing entries.
+
+        Args:
+            cache_dir: Directory holding the cached audio files.
+            max_bytes: Total size the cache may occupy before evicting entries.
+            synthesize: Coroutine function called on a miss with (text, voice, **tts_params).
+            phrases: Fixed replies whose sentences are cached; more can be added by `prewarm`.
+        """
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_bytes = max_bytes
+        self.synthesize_fn = synthesize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.uncached = 0 # Texts synthesized without caching, as they are not fixed phrases
+        self._sentences: set[str] = set() # Normalized sentences of the fixed phrases
+        self.add_phrases(phrases or [])
+        self._entries: OrderedDict[str, int] = OrderedDict() # key -> size, least recently used first
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load_index()
+
+    def add_phrases(self, phrases: list[str]) -> list[str]:
+        """
+        Marks fixed replies as cacheable.
+
+        Returns:
+            Their sentences, the units that are synthesized and cached.
+        """
+        sentences = [normalize_text(sentence) for phrase in phrases for sentence in sentences_of(phrase)]
+        self._sentences.update(sentences)
+        return sentences
+
+    def cacheable(self, text: str) -> bool:
+        """Whether `text` is a sentence of a fixed phrase."""
+        return normalize_text(text) in self._sentences
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.mp3")
+
+    def _load_index(self):
+        """Rebuilds the LRU order from the files already in the cache directory."""
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith(".mp3"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name[:-4], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+            self._total_bytes += size
+        self._evict()
+
+    def _evict(self):
+        """Removes least recently used entries until the cache fits its budget."""
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(key))
+            except OSError as e:
+                print(f"Error evicting cached audio {key}: {e}")
+
+    def get(self, key: str) -> memoryview | None:
+        """
+        Looks up cached audio by key.
+
+        Returns:
+            The audio, or None on a miss.
+        """
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+        try:
+            with open(self._path(key), "rb") as f:
+                audio = f.read()
+            os.utime(self._path(key)) # Persist the recency for the next startup
+        except OSError:
+            with self._lock:
+                self._total_bytes -= self._entries.pop(key, 0)
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return memoryview(audio)
+
+    def put(self, key: str, audio: bytes | memoryview):
+        """Stores audio under a key and evicts old entries if over budget."""
+        tmp_path = self._path(key) + ".tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(audio)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            print(f"Error writing cached audio {key}: {e}")
+            return
+        with self._lock:
+            self._total_bytes += len(audio) - self._entries.pop(key, 0)
+            self._entries[key] = len(audio)
+            self._evict()
+
+    async def synthesize(self, text: str, voice: str = DEFAULT_VOICE, **tts_params) -> memoryview:
+        """
+        Returns audio for `text`. Sentences of fixed phrases are served from the
+        cache, and synthesized and cached on a miss; other text is just synthesized.
+
+        Errors from the synthesize function are raised to the caller.
+        """
+        if not self.cacheable(text):
+            with self._lock:
+                self.uncached += 1
+            return memoryview(await self.synthesize_fn(normalize_text(text), voice, **tts_params))
+        key = cache_key(text, voice, tts_params)
+        audio = await asyncio.to_thread(self.get, key)
+        if audio is not None:
+            return audio
+        audio = await self.synthesize_fn(normalize_text(text), voice, **tts_params)
+        await asyncio.to_thread(self.put, key, audio)
+        return memoryview(audio)
+
+    async def prewarm(self, phrases: list[str] | None = None, voice: str = DEFAULT_VOICE, concurrency: int = 4,
+                      **tts_params) -> int:
+        """
+        Marks `phrases` as cacheable and synthesizes the sentences of all fixed
+        phrases that are not cached yet, a few at a time.
+
+        Returns:
+            The number of sentences that were newly synthesized.
+        """
+        self.add_phrases(phrases or [])
+        slots = asyncio.Semaphore(concurrency)
+        pending = [sentence for sentence in sorted(self._sentences)
+                   if cache_key(sentence, voice, tts_params) not in self._entries]
+
+        async def warm(sentence: str) -> bool:
+            async with slots:
+                try:
+                    await self.synthesize(sentence, voice, **tts_params)
+                    return True
+                except Exception as e:
+                    print(f"Error pre-warming audio cache for '{sentence}': {e}")
+                    return False
+
+        results = await asyncio.gather(*(warm(sentence) for sentence in pending))
+        return sum(results)
+
+    def stats(self) -> dict:
+        """Returns hit/miss counters and the current cache size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "uncached": self.uncached,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+            }
@@ -1,9 +1,162 @@
 import asyncio
-import edge_tts
+import shlex
+from collections.abc import AsyncIterator
 import os
 
 output_file = "logs/response.mp3"
-async def text_to_speech(text: str, voice: str = "en-US-AriaNeural", output_file: str = output_file) -> str:
+DEFAULT_VOICE = "en-US-AriaNeural"
+MAX_AUDIO_FILES = 50 # Rotation limits for saved audio responses
+MAX_AUDIO_BYTES = 50 * 1024 * 1024
+
+async def stream_speech(text: str, voice: str = DEFAULT_VOICE, **tts_params) -> AsyncIterator[bytes]:
+    """
+    Streams synthesized speech as MP3 chunks as soon as Edge TTS produces them.
+
+    Args:
+        text: The text to convert to speech.
+        voice: The voice to use for speech synthesis.
+        tts_params: Optional Edge TTS prosody settings (rate, volume, pitch).
+
+    Yields:
+        Raw MP3 audio chunks. Errors from Edge TTS are raised to the caller.
+    """
+    import edge_tts # Imported on first use; it is slow to load
+    communicate = edge_tts.Communicate(text, voice, **tts_params)
+    async for chunk in communicate.stream():
+        if chunk["type"] == "audio":
+            yield chunk["data"]
+
+async def synthesize_to_buffer(text: str, voice: str = DEFAULT_VOICE, **tts_params) -> memoryview:
+    """
+    Synthesizes speech fully in memory.
+
+    Returns:
+        A read-only memoryview over the MP3 bytes, which can be written to a
+        file, player or socket without further copies.
+    """
+    buffer = bytearray()
+    async for data in stream_speech(text, voice, **tts_params):
+        buffer += data
+    return memoryview(buffer).toreadonly()
+
+def prune_audio_dir(audio_dir: str, max_files: int | None = MAX_AUDIO_FILES, max_bytes: int | None = MAX_AUDIO_BYTES) -> int:
+    """
+    Deletes the oldest .mp3 files in a directory until it is within the limits.
+
+    Args:
+        audio_dir: The directory holding saved audio responses.
+        max_files: Maximum number of files to keep, or None for no limit.
+        max_bytes: Maximum total size in bytes, or None for no limit.
+
+    Returns:
+        The number of files deleted.
+    """
+    try:
+        entries = [entry for entry in os.scandir(audio_dir) if entry.is_file() and entry.name.endswith(".mp3")]
+    except FileNotFoundError:
+        return 0
+    files = sorted(((entry.stat().st_mtime, entry.stat().st_size, entry.path) for entry in entries), reverse=True)
+
+    kept_bytes = 0
+    deleted = 0
+    for position, (_, size, path) in enumerate(files):
+        kept_bytes += size
+        if (max_files is not None and position >= max_files) or (max_bytes is not None and position > 0 and kept_bytes > max_bytes):
+            try:
+                os.remove(path)
+                deleted += 1
+            except OSError as e:
+                print(f"Error removing old audio file {path}: {e}")
+    return deleted
+
+class AudioPlayer:
+    """
+    Pipes MP3 audio into the stdin of an external player command,
+    e.g. "ffplay -nodisp -autoexit -loglevel quiet -" or "mpv --no-terminal -".
+    """
+    def __init__(self, command: str):
+        self.command = shlex.split(command)
+        self._process: asyncio.subprocess.Process | None = None
+
+    async def write(self, data: bytes | memoryview):
+        """Sends audio to the player, starting it on first use."""
+        if self._process is None:
+            self._process = await asyncio.create_subprocess_exec(
+                *self.command,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.DEVNULL,
+            )
+        self._process.stdin.write(data)
+        await self._process.stdin.drain()
+
+    async def close(self):
+        """Signals end of audio and waits for playback to finish."""
+        if self._process is None:
+            return
+        self._process.stdin.close()
+        await self._process.wait()
+        self._process = None
+
+    def terminate(self):
+        """Stops playback immediately."""
+        if self._process is not None and self._process.returncode is None:
+            self._process.terminate()
+        self._process = None
+
+def _save_audio(output_file: str, audio: bytes, max_files: int | None, max_bytes: int | None):
+    with open(output_file, "wb") as f:
+        f.write(audio)
+    if max_files is not None or max_bytes is not None:
+        prune_audio_dir(os.path.dirname(os.path.abspath(output_file)), max_files, max_bytes)
+
+class AudioOutput:
+    """
+    Delivers one reply's audio to an optional player and an optional file.
+    """
+    def __init__(self, player_command: str | None = None, output_file: str | None = None):
+        self.player = AudioPlayer(player_command) if player_command else None
+        self.output_file = output_file
+        self.bytes_written = 0
+        self._file = None
+
+    def _open_file(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.output_file)), exist_ok=True)
+        return open(self.output_file, "wb")
+
+    def _close_file(self, file):
+        file.close()
+        prune_audio_dir(os.path.dirname(os.path.abspath(self.output_file))) # Keep the directory within its size cap
+
+    async def write(self, audio: bytes | memoryview):
+        """Sends an audio segment to the player and appends it to the file."""
+        if self.player:
+            await self.player.write(audio)
+        if self.output_file:
+            # File I/O runs in a worker thread so a slow disk never stalls the event loop
+            if self._file is None:
+                self._file = await asyncio.to_thread(self._open_file)
+            await asyncio.to_thread(self._file.write, audio) # MP3 segments can simply be concatenated
+        self.bytes_written += len(audio)
+
+    async def close(self, abort: bool = False):
+        """
+        Finishes playback, closes the file and rotates the audio directory.
+
+        Args:
+            abort: Stop playback immediately instead of letting it finish.
+        """
+        if self._file:
+            file, self._file = self._file, None
+            await asyncio.to_thread(self._close_file, file)
+        if self.player:
+            if abort:
+                self.player.terminate()
+            else:
+                await self.player.close()
+
+async def text_to_speech(text: str, voice: str = DEFAULT_VOICE, output_file: str = output_file,
+                         max_files: int | None = None, max_bytes: int | None = None) -> str:
     """
     Converts text to speech using Edge TTS and saves it to an audio file.
 
@@ -11,13 +164,15 @@ async def text_to_speech(text: str, voice: str = "en-US-AriaNeural", output_file
         text: The text to convert to speech.
         voice: The voice to use for speech synthesis.
         output_file: The path to save the audio file.
+        max_files: Optional. Rotate the output directory down to this many files.
+        max_bytes: Optional. Rotate the output directory down to this many bytes.
 
     Returns:
         The path to the saved audio file, or an error message.
     """
     try:
-        communicate = edge_tts.Communicate(text, voice)
-        await communicate.save(output_file)
+        audio = await synthesize_to_buffer(text, voice)
+        await asyncio.to_thread(_save_audio, output_file, audio, max_files, max_bytes)
         return os.path.abspath(output_file)
     except Exception as e:
         return f"Error during text-to-speech conversion: {e}"
@@ -36,6 +191,12 @@ async def main():
     else:
         print(output_path)
 
+    # Streaming example: count audio bytes as they arrive without touching the disk
+    received = 0
+    async for chunk in stream_speech(text_to_speak):
+        received += len(chunk)
+    print(f"Streamed {received} bytes of audio in memory.")
+
 if __name__ == "__main__":
     # Ensure the script is run in a directory where it can write the output file
     # Or provide an absolute path for output_file
@@ -0,0 +1,164 @@
+import asyncio
+from collections.abc import AsyncIterator, Awaitable, Callable
+from typing import Any
+
+from niku.speech_pipeline import SentenceSpeechPipeline
+from niku.tts_client import AudioOutput
+from niku.tracing import Tracer, TurnTrace
+
+_END = object()
+
+class SpeechJob:
+    """
+    The speech for one reply. Tokens are fed in as the reply streams, and the
+    worker synthesizes them into the job's AudioOutput.
+    """
+    def __init__(self, output: AudioOutput, trace: TurnTrace | None = None):
+        self.output = output
+        self.trace = trace # The turn this speech belongs to, for latency tracing
+        self.time_to_first_audio: float | None = None
+        self.cancelled = False
+        self.done = asyncio.Event()
+        self._tokens: asyncio.Queue = asyncio.Queue()
+
+    def feed(self, token: str):
+        """Adds reply text to be spoken."""
+        self._tokens.put_nowait(token)
+
+    def finish(self):
+        """Marks the end of the reply text."""
+        self._tokens.put_nowait(_END)
+
+    async def tokens(self) -> AsyncIterator[str]:
+        while True:
+            token = await self._tokens.get()
+            if token is _END:
+                break
+            yield token
+
+
+class TTSWorker:
+    """
+    Synthesizes and plays replies in the background, one job at a time, so the
+    next prompt is not blocked on audio.
+    """
+    def __init__(self, synthesize: Callable[[str], Awaitable[Any]], max_queue: int = 4, max_pending: int = 3,
+                 tracer: Tracer | None = None):
+        """
+        Initializes the worker.
+
+        Args:
+            synthesize: Coroutine function turning one sentence into audio (or None on error).
+            max_queue: Maximum number of replies waiting for synthesis; submit() waits when full.
+            max_pending: Sentences synthesized concurrently within one reply.
+            tracer: Optional. Records time to first audio and total speech time per job.
+        """
+        self.synthesize = synthesize
+        self.max_pending = max_pending
+        self.tracer = tracer or Tracer(enabled=False)
+        self._jobs: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._current: SpeechJob | None = None
+        self._current_task: asyncio.Task | None = None
+        self._worker: asyncio.Task | None = None
+        self._stopping = False
+
+    def start(self):
+        """Starts the worker task; must be called from the running event loop."""
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+
+    async def submit(self, job: SpeechJob):
+        """Queues a job, waiting if the queue is full."""
+        self.start()
+        await self._jobs.put(job)
+
+    async def _run(self):
+        while True:
+            job = await self._jobs.get()
+            try:
+                if job.cancelled:
+                    continue
+                self._current = job
+                self._current_task = asyncio.create_task(self._speak(job))
+                try:
+                    await self._current_task
+                except asyncio.CancelledError:
+                    if self._stopping or not job.cancelled:
+                        raise # The worker itself is being stopped
+            finally:
+                self._current = self._current_task = None
+                job.done.set()
+                self._jobs.task_done()
+
+    async def _speak(self, job: SpeechJob):
+        pipeline = SentenceSpeechPipeline(self.synthesize, max_pending=self.max_pending)
+        try:
+            with self.tracer.span("tts", job.trace):
+                async for segment in pipeline.run(job.tokens()):
+                    if segment.audio is not None:
+                        await job.output.write(segment.audio)
+            job.time_to_first_audio = pipeline.time_to_first_audio
+            if job.time_to_first_audio is not None:
+                self.tracer.record("tts_first_audio", job.time_to_first_audio, job.trace)
+        except asyncio.CancelledError:
+            await job.output.close(abort=True)
+            raise
+        except Exception as e:
+            print(f"\nNiku (Audio Error): {e}")
+        await job.output.close()
+
+    def cancel(self, job: SpeechJob):
+        """Stops one job, e.g. when its reply was cut off and should not be spoken to the end."""
+        job.cancelled = True # Skipped by the worker if still queued
+        if self._current is job and not job.done.is_set():
+            self._current_task.cancel()
+
+    def cancel_pending(self) -> int:
+        """
+        Cancels queued jobs and the one being spoken, e.g. when a new turn starts.
+
+        Returns:
+            The number of jobs cancelled.
+        """
+        cancelled = 0
+        while not self._jobs.empty():
+            job = self._jobs.get_nowait()
+            job.cancelled = True
+            job.done.set()
+            self._jobs.task_done()
+            cancelled += 1
+        if self._current is not None and not self._current.done.is_set():
+            self._current.cancelled = True
+            self._current_task.cancel()
+            cancelled += 1
+        return cancelled
+
+    async def drain(self, timeout: float | None = None) -> bool:
+        """
+        Waits for all queued speech to finish, then stops the worker.
+
+        Returns:
+            True if everything finished within the timeout.
+        """
+        finished = True
+        if self._worker is not None:
+            try:
+                await asyncio.wait_for(self._jobs.join(), timeout)
+            except asyncio.TimeoutError:
+                finished = False
+                self.cancel_pending()
+        await self.stop()
+        return finished
+
+    async def stop(self):
+        """Stops the worker immediately, cancelling any speech in progress."""
+        self._stopping = True
+        self.cancel_pending()
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        self._stopping = False